@@ -0,0 +1,78 @@
+# Manejo de las claves de firma JWT del servidor de autenticacion
+import hashlib, os
+
+
+def _kid_for(material):
+    """Identificador corto de una clave (cambia automaticamente al rotarla)"""
+    if isinstance(material, str):
+        material = material.encode('utf-8')
+    return hashlib.sha256(material).hexdigest()[:16]
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class KeyRing:
+    """Conjunto de claves JWT: una clave activa para firmar y claves
+    anteriores que se siguen aceptando durante una rotacion.
+
+    - HS256: la clave es el SECRET_KEY compartido. Las claves anteriores se
+      indican en JWT_PREVIOUS_SECRET_KEYS (separadas por comas).
+    - RS256/ES256: se firma con JWT_PRIVATE_KEY_PATH y se publica la clave
+      publica de JWT_PUBLIC_KEY_PATH. Las claves publicas anteriores van en
+      JWT_PREVIOUS_PUBLIC_KEY_PATHS.
+    """
+
+    def __init__(self, algorithm, signing_key, verification_keys):
+        self.algorithm = algorithm
+        self.signing_key = signing_key
+        # kid -> clave de verificacion (la activa va primero)
+        self.verification_keys = verification_keys
+        self.active_kid = next(iter(verification_keys))
+
+    @property
+    def is_symmetric(self):
+        return self.algorithm.startswith('HS')
+
+    @classmethod
+    def from_env(cls, secret_key):
+        algorithm = os.getenv('JWT_ALGORITHM', 'HS256').upper()
+        keys = {}
+        if algorithm.startswith('HS'):
+            if not secret_key:
+                raise ValueError('SECRET_KEY es requerido para firmar tokens HS256')
+            signing_key = secret_key
+            keys[_kid_for(secret_key)] = secret_key
+            for old in os.getenv('JWT_PREVIOUS_SECRET_KEYS', '').split(','):
+                if old.strip():
+                    keys[_kid_for(old.strip())] = old.strip()
+        else:
+            signing_key = _read_file(os.environ['JWT_PRIVATE_KEY_PATH'])
+            public_key = _read_file(os.environ['JWT_PUBLIC_KEY_PATH']).decode('utf-8')
+            keys[_kid_for(public_key)] = public_key
+            for path in os.getenv('JWT_PREVIOUS_PUBLIC_KEY_PATHS', '').split(','):
+                if path.strip():
+                    old = _read_file(path.strip()).decode('utf-8')
+                    keys[_kid_for(old)] = old
+        return cls(algorithm, signing_key, keys)
+
+    def key_for(self, kid):
+        """Clave de verificacion para un kid; los tokens antiguos sin kid
+        se validan con la clave activa"""
+        if kid is None:
+            return self.verification_keys[self.active_kid]
+        return self.verification_keys.get(kid)
+
+    def export(self, include_secrets=False):
+        """Material de claves que consumen otros servicios para validar
+        tokens localmente. Los secretos HS256 solo se entregan a llamadas
+        internas autenticadas."""
+        if self.is_symmetric and not include_secrets:
+            return None
+        return {
+            'algorithm': self.algorithm,
+            'active_kid': self.active_kid,
+            'keys': [{'kid': kid, 'key': key} for kid, key in self.verification_keys.items()]
+        }
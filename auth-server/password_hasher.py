@@ -0,0 +1,226 @@
+# Hash y verificacion de contrasenas con bcrypt fuera del hilo de la peticion
+# bcrypt ocupa la CPU decenas o cientos de milisegundos; en el proceso de
+# Flask eso retiene el GIL y frena a /auth/verify. Aqui el trabajo se envia a
+# un pool de procesos con una cola acotada: si esta llena se rechaza (503)
+# en lugar de acumular latencia. El costo (rounds) es configurable o se
+# calibra al iniciar para acercarse a una latencia objetivo, y los hashes
+# guardados con un costo menor se actualizan en el siguiente login.
+# Los procesos se crean con forkserver (spawn donde no existe), nunca por
+# fork del proceso de Flask: ese proceso ya tiene hilos (MongoDB,
+# revocaciones, salud) y el pool se recrea en caliente si un proceso muere.
+import multiprocessing, os, threading, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+from observability import tracing
+
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+
+
+class HasherBusy(Exception):
+    """La cola de trabajos de bcrypt esta llena o el trabajo no termino a tiempo"""
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _hash_batch(passwords, rounds):
+    return [bcrypt.hashpw(password, bcrypt.gensalt(rounds)) for password in passwords]
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+def _noop():
+    return os.getpid()
+
+
+def pool_context():
+    """Contexto de multiprocessing del pool: forkserver con bcrypt precargado,
+    o spawn en plataformas sin forkserver"""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def _as_bytes(value):
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+
+def rounds_of(hashed):
+    """Costo con el que se genero un hash ($2b$12$... -> 12)"""
+    try:
+        return int(_as_bytes(hashed).split(b'$')[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+def calibrate(target_ms, min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS):
+    """Mayor costo cuyo hash tarda como mucho target_ms en esta maquina
+    (nunca menos de min_rounds). Cada round extra duplica el tiempo."""
+    started = time.perf_counter()
+    bcrypt.hashpw(b'calibracion', bcrypt.gensalt(min_rounds))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    rounds = min_rounds
+    while rounds < max_rounds and elapsed_ms * 2 <= target_ms:
+        rounds += 1
+        elapsed_ms *= 2
+    return rounds
+
+
+class PasswordHasher:
+    def __init__(self, rounds=12, workers=None, max_pending=None, timeout=10.0):
+        self.rounds = rounds
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 8
+        self.timeout = timeout
+        self._pool = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self.busy_rejections = 0
+        self.rehashed = 0
+        # operacion -> [llamadas, segundos acumulados]
+        self._timings = {'hash': [0, 0.0], 'verify': [0, 0.0]}
+        # Funcion opcional (operacion, segundos, contrasenas) para metricas
+        self.observer = None
+
+    @classmethod
+    def from_env(cls):
+        setting = os.getenv('BCRYPT_ROUNDS', 'auto').lower()
+        if setting == 'auto':
+            rounds = calibrate(float(os.getenv('BCRYPT_TARGET_MS', 250)),
+                               min_rounds=int(os.getenv('BCRYPT_MIN_ROUNDS', MIN_ROUNDS)))
+        else:
+            rounds = int(setting)
+        workers = int(os.getenv('BCRYPT_WORKERS', 0)) or None
+        max_pending = int(os.getenv('BCRYPT_MAX_QUEUE', 0)) or None
+        return cls(rounds, workers, max_pending, float(os.getenv('BCRYPT_TIMEOUT', 10)))
+
+    def start(self):
+        """Crea el pool y espera a que arranque el primer proceso"""
+        pool = ProcessPoolExecutor(self.workers, mp_context=pool_context())
+        pool.submit(_noop).result()
+        self._pool = pool
+        return self
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.busy_rejections += 1
+                raise HasherBusy('Demasiadas solicitudes de autenticacion en cola, intente de nuevo')
+            self._pending += 1
+
+    def _release(self, operation, started, count=1):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._pending -= 1
+            timing = self._timings[operation]
+            timing[0] += count
+            timing[1] += elapsed
+        if self.observer is not None and count:
+            self.observer(operation, elapsed, count)
+
+    def _submit(self, fn, *args):
+        """(pool, future) del trabajo; crea el pool si no existe"""
+        with self._start_lock:
+            if self._pool is None:
+                self.start()
+            pool = self._pool
+        try:
+            return pool, pool.submit(fn, *args)
+        except BrokenProcessPool:
+            self._discard(pool)
+            raise HasherBusy('El pool de hash se reinicio, intente de nuevo')
+
+    def _result(self, job, timeout):
+        pool, future = job
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            raise HasherBusy('El calculo de la contrasena no termino a tiempo')
+        except BrokenProcessPool:
+            # Un proceso del pool murio: se recrea (en la siguiente peticion) para las demas
+            self._discard(pool)
+            raise HasherBusy('El pool de hash se reinicio, intente de nuevo')
+
+    def _discard(self, pool):
+        # Solo si sigue siendo el pool actual: otro hilo pudo haberlo recreado ya
+        with self._start_lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, operation, fn, *args):
+        with tracing.span(f"bcrypt {operation}", rounds=self.rounds):
+            self._acquire()
+            started = time.perf_counter()
+            try:
+                return self._result(self._submit(fn, *args), self.timeout)
+            finally:
+                self._release(operation, started)
+
+    def hash(self, password):
+        return self._run('hash', _hash, _as_bytes(password), self.rounds)
+
+    def verify(self, password, hashed):
+        return self._run('verify', _check, _as_bytes(password), _as_bytes(hashed))
+
+    def hash_many(self, passwords, batch_size=8):
+        """Hashea muchas contrasenas (alta masiva) y devuelve los hashes en
+        orden. Usa como mucho la mitad de los procesos a la vez para que los
+        logins sigan entrando en la cola."""
+        passwords = [_as_bytes(password) for password in passwords]
+        batches = [passwords[i:i + batch_size] for i in range(0, len(passwords), batch_size)]
+        window = max(1, self.workers // 2)
+        hashes, in_flight = [], deque()
+        try:
+            for batch in batches:
+                if len(in_flight) >= window:
+                    hashes.extend(self._finish_batch(in_flight.popleft(), batch_size))
+                self._acquire()
+                in_flight.append((self._submit(_hash_batch, batch, self.rounds), time.perf_counter(), len(batch)))
+            while in_flight:
+                hashes.extend(self._finish_batch(in_flight.popleft(), batch_size))
+        finally:
+            for (_, future), started, count in in_flight:
+                future.cancel()
+                self._release('hash', started, 0)
+        return hashes
+
+    def _finish_batch(self, batch, batch_size):
+        job, started, count = batch
+        try:
+            return self._result(job, self.timeout * batch_size)
+        finally:
+            self._release('hash', started, count)
+
+    def needs_rehash(self, hashed):
+        return rounds_of(hashed) < self.rounds
+
+    def stats(self):
+        with self._lock:
+            timings = {operation: {'count': count, 'avg_ms': round(total * 1000 / count, 2) if count else None}
+                       for operation, (count, total) in self._timings.items()}
+            pending = self._pending
+        return {
+            'rounds': self.rounds,
+            'workers': self.workers,
+            'queue': {'pending': pending, 'max': self.max_pending},
+            'busy_rejections': self.busy_rejections,
+            'rehashed': self.rehashed,
+            'timings': timings
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,90 @@
+# Refresh tokens rotativos para renovar sesiones sin volver a ejecutar bcrypt
+# Solo se guarda el SHA-256 del token (auth_db.refresh_tokens) con un indice
+# TTL sobre expires_at. Cada uso marca el token como consumido y entrega uno
+# nuevo de la misma familia (la sesion iniciada en un login). Si un token ya
+# consumido vuelve a presentarse fuera del margen de gracia, se asume que fue
+# filtrado y se revoca la familia completa.
+import hashlib, secrets, uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, ReturnDocument
+
+COLLECTION = 'refresh_tokens'
+
+
+class InvalidRefreshToken(Exception):
+    """Token inexistente, expirado o revocado"""
+
+
+class RefreshTokenReused(InvalidRefreshToken):
+    """Se presento un token ya rotado: la familia quedo revocada"""
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class RefreshTokenStore:
+    def __init__(self, collection, ttl_seconds=30 * 24 * 3600, reuse_grace_seconds=10):
+        self.collection = collection
+        self.ttl = timedelta(seconds=ttl_seconds)
+        # Peticiones simultaneas (varias pestanas) pueden rotar el mismo token
+        self.reuse_grace = timedelta(seconds=reuse_grace_seconds)
+
+    def ensure_indexes(self):
+        self.collection.create_index([('expires_at', ASCENDING)], expireAfterSeconds=0)
+        self.collection.create_index([('family', ASCENDING)])
+        self.collection.create_index([('username', ASCENDING)])
+
+    def issue(self, username, family=None, now=None):
+        """Crea un refresh token (nueva familia si no se indica) y devuelve
+        el valor en claro, que solo conoce el cliente"""
+        now = now or datetime.now(timezone.utc)
+        token = secrets.token_urlsafe(32)
+        self.collection.insert_one({
+            '_id': _digest(token),
+            'family': family or uuid.uuid4().hex,
+            'username': username,
+            'created_at': now,
+            'expires_at': now + self.ttl,
+            'used_at': None
+        })
+        return token
+
+    def rotate(self, token):
+        """Consume el token y devuelve (username, nuevo_token). Lanza
+        InvalidRefreshToken o RefreshTokenReused."""
+        now = datetime.now(timezone.utc)
+        digest = _digest(token or '')
+        # Una sola operacion indexada: solo un llamador puede consumir el token
+        current = self.collection.find_one_and_update(
+            {'_id': digest, 'used_at': None, 'expires_at': {'$gt': now}},
+            {'$set': {'used_at': now}},
+            projection={'family': 1, 'username': 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if current is not None:
+            return current['username'], self.issue(current['username'], current['family'], now)
+
+        # Camino de error: distinguir entre expirado/desconocido y reutilizado
+        stale = self.collection.find_one({'_id': digest}, {'family': 1, 'used_at': 1, 'expires_at': 1})
+        if stale is None or stale.get('used_at') is None:
+            raise InvalidRefreshToken('Refresh token invalido o expirado')
+        used_at = stale['used_at']
+        if used_at.tzinfo is None:
+            used_at = used_at.replace(tzinfo=timezone.utc)
+        if now - used_at <= self.reuse_grace:
+            raise InvalidRefreshToken('Refresh token ya renovado')
+        self.revoke_family(stale['family'])
+        raise RefreshTokenReused('Refresh token reutilizado; la sesion fue revocada')
+
+    def revoke(self, token):
+        """Revoca la sesion (familia) a la que pertenece un refresh token"""
+        current = self.collection.find_one({'_id': _digest(token or '')}, {'family': 1})
+        return self.revoke_family(current['family']) if current else 0
+
+    def revoke_family(self, family):
+        return self.collection.delete_many({'family': family}).deleted_count
+
+    def revoke_user(self, username):
+        return self.collection.delete_many({'username': username}).deleted_count
@@ -0,0 +1,144 @@
+# Revocacion de tokens de acceso (logout y cierre de todas las sesiones)
+# Cada revocacion se guarda en auth_db.revocations con un indice TTL (se
+# borra cuando el token revocado ya habria expirado) y se refleja en la
+# Denylist en memoria (token_revocation, compartida con el web-server). Las
+# revocaciones por usuario invalidan los tokens emitidos antes de cierto
+# instante, con milisegundos: un login en el mismo segundo que la revocacion
+# (pero posterior) sigue siendo valido. Las demas instancias leen los cambios
+# de forma incremental por _id, con un solapamiento para tolerar relojes desfasados.
+import math, threading
+from datetime import datetime, timedelta, timezone
+
+import jwt
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+from token_revocation.denylist import KIND_TOKEN, KIND_USER
+
+COLLECTION = 'revocations'
+
+
+class TokenRevoked(jwt.InvalidTokenError):
+    """El token fue revocado (logout o cierre de sesiones del usuario)"""
+
+
+def _epoch(value):
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def _timestamp(value):
+    """Epoch con milisegundos (la precision de las fechas en MongoDB)"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return round(value.timestamp(), 3)
+
+
+def issued_at(now):
+    """iat de un token nuevo: epoch truncado al milisegundo"""
+    return math.floor(now.timestamp() * 1000) / 1000
+
+
+def _next_millisecond(now):
+    """Primer milisegundo posterior a now: un token emitido hasta now tiene
+    iat menor y uno emitido en un milisegundo siguiente, igual o mayor"""
+    return now.replace(microsecond=now.microsecond // 1000 * 1000) + timedelta(milliseconds=1)
+
+
+class RevocationStore:
+    def __init__(self, collection, denylist, max_token_ttl, poll_seconds=5.0, overlap_seconds=30):
+        self.collection = collection
+        self.denylist = denylist
+        # Una revocacion por usuario debe durar lo que el token mas largo emitido antes
+        self.max_token_ttl = timedelta(seconds=max_token_ttl)
+        self.poll_seconds = poll_seconds
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self._cursor = None
+        self._stop = threading.Event()
+        self.status = 'disabled'
+
+    def ensure_indexes(self):
+        self.collection.create_index([('expires_at', ASCENDING)], expireAfterSeconds=0)
+
+    def _record(self, kind, value, expires_at, not_before=None):
+        now = datetime.now(timezone.utc)
+        self.collection.insert_one({
+            'kind': kind, 'value': value, 'not_before': not_before,
+            'expires_at': expires_at, 'created_at': now
+        })
+        # Efecto inmediato en esta instancia; las demas lo leen al sincronizar
+        self.denylist.add(kind, value, _epoch(expires_at), _timestamp(not_before))
+
+    def revoke_token(self, claims):
+        """Revoca un token concreto hasta su 'exp'. Devuelve False si el
+        token no tiene jti (emitido antes de existir la revocacion)."""
+        if not claims.get('jti'):
+            return False
+        expires_at = datetime.fromtimestamp(claims['exp'], timezone.utc)
+        self._record(KIND_TOKEN, claims['jti'], expires_at)
+        return True
+
+    def revoke_user(self, username):
+        """Revoca todos los tokens del usuario emitidos hasta ahora"""
+        now = datetime.now(timezone.utc)
+        self._record(KIND_USER, username, now + self.max_token_ttl, _next_millisecond(now))
+
+    def changes(self, since=None, limit=1000, overlap=True):
+        """Revocaciones vigentes posteriores al cursor. Con overlap se
+        retrocede un margen (relojes desfasados entre instancias); sin el,
+        continua exactamente donde termino la pagina anterior.
+        Devuelve (entradas, nuevo_cursor, hay_mas)."""
+        query = {'expires_at': {'$gt': datetime.now(timezone.utc)}}
+        if since:
+            try:
+                cursor = ObjectId(since)
+            except (InvalidId, TypeError):
+                raise ValueError('Cursor de revocaciones invalido')
+            lower = ObjectId.from_datetime(cursor.generation_time - self.overlap) if overlap else cursor
+            query['_id'] = {'$gt': lower}
+        docs = list(self.collection.find(query).sort('_id', ASCENDING).limit(limit))
+        entries = [{
+            'id': str(doc['_id']),
+            'kind': doc['kind'],
+            'value': doc['value'],
+            'not_before': _timestamp(doc.get('not_before')),
+            'expires_at': _epoch(doc['expires_at'])
+        } for doc in docs]
+        new_cursor = since
+        if docs and (not since or docs[-1]['_id'] > ObjectId(since)):
+            new_cursor = str(docs[-1]['_id'])
+        return entries, new_cursor, len(docs) == limit
+
+    def sync(self):
+        """Aplica las revocaciones nuevas de otras instancias"""
+        entries, cursor, more = self.changes(self._cursor)
+        while True:
+            for entry in entries:
+                self.denylist.add(entry['kind'], entry['value'], entry['expires_at'], entry['not_before'])
+            self._cursor = cursor
+            if not more:
+                break
+            entries, cursor, more = self.changes(cursor, overlap=False)
+        self.denylist.prune(int(datetime.now(timezone.utc).timestamp()))
+
+    def start(self):
+        threading.Thread(target=self._poll, daemon=True, name='revocation-sync').start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll(self):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+                self.status = 'synced'
+            except PyMongoError as e:
+                self.status = f"error: {e}"
+            self._stop.wait(self.poll_seconds)
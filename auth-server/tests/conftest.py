@@ -0,0 +1,33 @@
+# Las pruebas no tienen servidor MongoDB: el cliente que crea la app es de
+# mongomock. Debe aplicarse antes de importar auth_app.
+import os
+import types
+
+import mongomock
+import pymongo
+import pytest
+
+pymongo.MongoClient = mongomock.MongoClient
+if not hasattr(mongomock.MongoClient, 'topology_description'):
+    # MongoMetrics.watch() consulta los miembros del replica set
+    mongomock.MongoClient.topology_description = property(
+        lambda self: types.SimpleNamespace(server_descriptions=lambda: {}))
+
+
+@pytest.fixture(scope='session')
+def auth():
+    """Modulo auth_app con la base en memoria y un pool de bcrypt minimo"""
+    os.environ.update(DB3_URL='mongodb://db3', SECRET_KEY='secreto-de-pruebas', INTERNAL_API_KEY='',
+                      BCRYPT_ROUNDS='4', BCRYPT_WORKERS='1', METRICS_ENABLED='False', TRACING_ENABLED='False')
+    import auth_app
+    yield auth_app
+    auth_app.password_hasher.shutdown()
+
+
+@pytest.fixture
+def call(auth):
+    """Despacha una peticion por la app y devuelve la respuesta"""
+    def call(method, path, headers=None, **kwargs):
+        with auth.app.test_request_context(path, method=method, headers=headers or {}, **kwargs):
+            return auth.app.full_dispatch_request()
+    return call
@@ -0,0 +1,50 @@
+import os
+import signal
+import time
+
+import pytest
+
+import password_hasher
+from password_hasher import HasherBusy, PasswordHasher, rounds_of
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=4, workers=1, timeout=30).start()
+    yield hasher
+    hasher.shutdown()
+
+
+def test_pool_is_not_forked_from_the_app_process(hasher):
+    assert password_hasher.pool_context().get_start_method() in ('forkserver', 'spawn')
+    assert hasher._pool._mp_context.get_start_method() != 'fork'
+
+
+def test_hash_and_verify(hasher):
+    hashed = hasher.hash('secreto')
+    assert rounds_of(hashed) == 4
+    assert hasher.verify('secreto', hashed)
+    assert not hasher.verify('otro', hashed)
+    assert not hasher.needs_rehash(hashed)
+
+
+def test_hash_many_keeps_order(hasher):
+    passwords = [f'clave{i}' for i in range(5)]
+    hashes = hasher.hash_many(passwords, batch_size=2)
+    assert [hasher.verify(password, hashed) for password, hashed in zip(passwords, hashes)] == [True] * 5
+
+
+def test_pool_is_rebuilt_after_a_worker_dies(hasher):
+    _, future = hasher._submit(password_hasher._noop)
+    os.kill(future.result(timeout=30), signal.SIGKILL)
+    broken = hasher._pool
+    deadline = time.monotonic() + 30
+    with pytest.raises(HasherBusy):
+        # El pool se marca como roto al detectar el proceso muerto
+        while time.monotonic() < deadline:
+            hasher.hash('secreto')
+            time.sleep(0.05)
+    assert hasher._pool is None
+
+    assert hasher.verify('secreto', hasher.hash('secreto'))
+    assert hasher._pool is not broken
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+import pytest
+
+from refresh_tokens import InvalidRefreshToken, RefreshTokenReused, RefreshTokenStore, _digest
+
+
+@pytest.fixture
+def store():
+    store = RefreshTokenStore(mongomock.MongoClient().auth_db.refresh_tokens, ttl_seconds=60, reuse_grace_seconds=10)
+    store.ensure_indexes()
+    return store
+
+
+def test_only_the_digest_is_stored(store):
+    token = store.issue('johndoe')
+    assert store.collection.find_one({'_id': _digest(token)})['username'] == 'johndoe'
+    assert store.collection.find_one({'_id': token}) is None
+
+
+def test_rotation_keeps_the_family_and_consumes_the_token(store):
+    token = store.issue('johndoe')
+    username, renewed = store.rotate(token)
+    assert username == 'johndoe' and renewed != token
+    families = {doc['family'] for doc in store.collection.find()}
+    assert len(families) == 1
+    # Dentro del margen de gracia (pestanas simultaneas) solo se rechaza
+    with pytest.raises(InvalidRefreshToken) as error:
+        store.rotate(token)
+    assert not isinstance(error.value, RefreshTokenReused)
+    assert store.rotate(renewed)[0] == 'johndoe'
+
+
+def test_reuse_after_the_grace_period_revokes_the_family(store):
+    token = store.issue('johndoe')
+    _, renewed = store.rotate(token)
+    store.collection.update_one({'_id': _digest(token)},
+                                {'$set': {'used_at': datetime.now(timezone.utc) - timedelta(seconds=30)}})
+    with pytest.raises(RefreshTokenReused):
+        store.rotate(token)
+    with pytest.raises(InvalidRefreshToken):
+        store.rotate(renewed)
+
+
+def test_expired_or_unknown_tokens_are_invalid(store):
+    token = store.issue('johndoe', now=datetime.now(timezone.utc) - timedelta(seconds=120))
+    for value in (token, 'desconocido', None):
+        with pytest.raises(InvalidRefreshToken):
+            store.rotate(value)
+
+
+def test_revoke_session_and_user(store):
+    first, second = store.issue('johndoe'), store.issue('johndoe')
+    store.issue('otro')
+    assert store.revoke(first) == 1
+    assert store.revoke('desconocido') == 0
+    assert store.revoke_user('johndoe') == 1
+    assert store.rotate(store.issue('otro'))[0] == 'otro'
+    with pytest.raises(InvalidRefreshToken):
+        store.rotate(second)
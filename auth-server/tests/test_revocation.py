@@ -0,0 +1,78 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+import pytest
+
+from revocation import RevocationStore, TokenRevoked, issued_at
+from token_revocation.denylist import KIND_USER, Denylist
+
+REVOKED_AT = datetime.now(timezone.utc).replace(microsecond=500000)
+
+
+def _store():
+    return RevocationStore(mongomock.MongoClient().auth_db.revocations, Denylist(), max_token_ttl=3600)
+
+
+def _claims(issued):
+    return {'username': 'johndoe', 'jti': 'x', 'iat': issued_at(issued)}
+
+
+def test_issued_at_keeps_milliseconds():
+    issued = datetime(2026, 1, 1, 12, 0, 0, 500999, tzinfo=timezone.utc)
+    assert issued_at(issued) == 1767268800.5
+
+
+@pytest.mark.parametrize('offset_ms, revoked', [
+    (-1000, True),   # segundo anterior
+    (-400, True),    # mismo segundo, antes
+    (0, True),       # mismo milisegundo
+    (1, False),      # milisegundo siguiente
+    (400, False),    # mismo segundo, despues
+    (1000, False),   # segundo siguiente
+])
+def test_user_revocation_boundary(monkeypatch, offset_ms, revoked):
+    store = _store()
+
+    class Clock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return REVOKED_AT
+    monkeypatch.setattr('revocation.datetime', Clock)
+    store.revoke_user('johndoe')
+    monkeypatch.undo()
+
+    claims = _claims(REVOKED_AT + timedelta(milliseconds=offset_ms))
+    assert store.denylist.is_revoked(claims) is revoked
+    # Otra instancia que sincroniza desde la base decide igual
+    other = RevocationStore(store.collection, Denylist(), max_token_ttl=3600)
+    entries, _, _ = other.changes()
+    for entry in entries:
+        other.denylist.add(entry['kind'], entry['value'], entry['expires_at'], entry['not_before'])
+    assert other.denylist.is_revoked(claims) is revoked
+
+
+def test_tokens_without_iat_are_revoked_by_user():
+    denylist = Denylist()
+    denylist.add(KIND_USER, 'johndoe', 2e9, 1767268800.501)
+    assert denylist.is_revoked({'username': 'johndoe'})
+    assert not denylist.is_revoked({'username': 'otro', 'iat': 0})
+
+
+def test_revocations_require_internal_key(auth, call, monkeypatch):
+    assert call('GET', '/auth/revocations').status_code == 403
+    assert call('GET', '/auth/revocations', headers={'X-Internal-Key': ''}).status_code == 403
+    monkeypatch.setattr(auth, 'INTERNAL_API_KEY', 'clave')
+    assert call('GET', '/auth/revocations', headers={'X-Internal-Key': 'otra'}).status_code == 403
+    response = call('GET', '/auth/revocations', headers={'X-Internal-Key': 'clave'})
+    assert response.status_code == 200 and 'revocations' in response.get_json()
+
+
+def test_login_right_after_revoke_is_accepted(auth):
+    old_token = auth.issue_access_token('johndoe')
+    auth.revocations.revoke_user('johndoe')
+    time.sleep(0.002)
+    claims = auth.decode_access_token(auth.issue_access_token('johndoe'))
+    assert claims['username'] == 'johndoe'
+    with pytest.raises(TokenRevoked):
+        auth.decode_access_token(old_token)
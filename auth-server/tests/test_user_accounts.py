@@ -0,0 +1,61 @@
+import mongomock
+import pytest
+
+import user_accounts
+
+
+@pytest.fixture
+def users():
+    collection = mongomock.MongoClient().auth_db.users
+    user_accounts.ensure_user_indexes(collection)
+    return collection
+
+
+def test_validate_user_normalizes_the_email():
+    assert user_accounts.validate_user({'username': 'ana', 'email': ' Ana@Example.COM ', 'password': 'x'}) == \
+        ('ana', 'ana@example.com', 'x')
+    for data, message in [(None, 'objeto JSON'), ({'email': 'a', 'password': 'x'}, 'usuario'),
+                          ({'username': 'a', 'password': 'x'}, 'correo'), ({'username': 'a', 'email': 'a'}, 'contraseña')]:
+        with pytest.raises(ValueError, match=message):
+            user_accounts.validate_user(data)
+
+
+@pytest.mark.parametrize('details, message', [
+    ({'keyPattern': {'email': 1}}, 'Correo ya registrado'),
+    ({'errmsg': 'E11000 duplicate key error index: username_unique'}, 'Usuario ya existe'),
+    ({}, 'Usuario o correo ya registrado'),
+])
+def test_duplicate_message(details, message):
+    assert user_accounts.duplicate_message(details) == message
+
+
+def test_insert_users_reports_each_row(users):
+    users.insert_one(user_accounts.new_user('ana', 'ana@example.com', b'hash'))
+    rows = [(0, user_accounts.new_user('beto', 'beto@example.com', b'hash')),
+            (1, user_accounts.new_user('ana', 'otra@example.com', b'hash')),
+            (2, user_accounts.new_user('carla', 'carla@example.com', b'hash'))]
+    results = user_accounts.insert_users(users, rows, batch_size=2)
+    assert [result['status'] for result in results] == ['created', 'error', 'created']
+    assert results[1]['row'] == 1
+    assert users.count_documents({}) == 3
+
+
+def test_register_and_bulk_register(auth, call, monkeypatch):
+    auth.users_collection.delete_many({})
+    user = {'username': 'dora', 'email': 'Dora@example.com', 'password': 'secreto'}
+    assert call('POST', '/auth/register', json=user).status_code == 201
+    duplicate = call('POST', '/auth/register', json={**user, 'username': 'dora2'})
+    assert duplicate.status_code == 400
+
+    assert call('POST', '/auth/register/bulk', json={'users': [user]}).status_code == 401
+    monkeypatch.setattr(auth, 'INTERNAL_API_KEY', 'clave')
+    response = call('POST', '/auth/register/bulk', headers={'X-Internal-Key': 'clave'}, json={'users': [
+        {'username': 'eva', 'email': 'eva@example.com', 'password': 'x'},
+        {'username': 'eva', 'email': 'eva2@example.com', 'password': 'x'},
+        {'username': 'dora', 'email': 'nueva@example.com', 'password': 'x'},
+        {'username': 'fer'}
+    ]})
+    body = response.get_json()
+    assert response.status_code == 200 and body['summary'] == {'created': 1, 'error': 3}
+    assert [result['status'] for result in body['results']] == ['created', 'error', 'error', 'error']
+    assert 'repetido en la solicitud' in body['results'][1]['message']
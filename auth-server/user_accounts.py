@@ -0,0 +1,89 @@
+# Alta de usuarios apoyada en indices unicos de auth_db.users
+# username y email (normalizado: sin espacios y en minusculas) tienen
+# indices unicos, asi que el registro es un solo insert: el duplicado lo
+# detecta MongoDB (DuplicateKeyError) en lugar de dos consultas previas con
+# una carrera entre ellas. El alta masiva inserta por lotes desordenados.
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError, OperationFailure
+
+USER_INDEXES = {
+    'username': [('username', ASCENDING)],
+    'email': [('email', ASCENDING)]
+}
+DUPLICATE_MESSAGES = {
+    'username': 'Usuario ya existe',
+    'email': 'Correo ya registrado'
+}
+DUPLICATE_KEY = 11000
+DEFAULT_BATCH_SIZE = 1000
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def ensure_user_indexes(collection):
+    """Crea los indices unicos. Si ya hay duplicados el indice no se puede
+    crear: se informa y el servicio sigue (el registro sigue detectando los
+    duplicados nuevos en los campos que si tengan indice)."""
+    for field, keys in USER_INDEXES.items():
+        try:
+            collection.create_index(keys, unique=True, name=f'{field}_unique')
+        except OperationFailure as e:
+            print(f"No se pudo crear el indice unico de {field}: {e}")
+
+
+def validate_user(data):
+    """Valida los campos de registro y devuelve (username, email, password).
+    Lanza ValueError con el mismo mensaje que el registro individual."""
+    if not isinstance(data, dict):
+        raise ValueError('Cada usuario debe ser un objeto JSON')
+    if not data.get('username'):
+        raise ValueError('El nombre de usuario es requerido')
+    if not data.get('email'):
+        raise ValueError('El correo electrónico es requerido')
+    if not data.get('password'):
+        raise ValueError('La contraseña es requerida')
+    return data['username'], normalize_email(data['email']), data['password']
+
+
+def new_user(username, email, hashed_password, now=None):
+    return {
+        'username': username,
+        'email': email,
+        'password': hashed_password,
+        'created_at': now or datetime.now(timezone.utc)
+    }
+
+
+def duplicate_message(details):
+    """Mensaje para un error de clave duplicada segun el indice violado"""
+    fields = list((details or {}).get('keyPattern') or {})
+    if not fields:
+        # Servidores antiguos solo informan el nombre del indice en errmsg
+        errmsg = (details or {}).get('errmsg', '')
+        fields = [field for field in USER_INDEXES if f'{field}_unique' in errmsg]
+    return DUPLICATE_MESSAGES.get(fields[0] if fields else None, 'Usuario o correo ya registrado')
+
+
+def insert_users(collection, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """Inserta (indice, documento) en lotes desordenados. Devuelve los
+    resultados por fila."""
+    results = []
+    for start in range(0, len(rows), batch_size):
+        chunk = rows[start:start + batch_size]
+        failed = {}
+        try:
+            collection.insert_many([doc for _, doc in chunk], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                failed[error['index']] = duplicate_message(error) if error.get('code') == DUPLICATE_KEY \
+                    else error.get('errmsg', 'Error de escritura')
+        for position, (index, doc) in enumerate(chunk):
+            if position in failed:
+                results.append({'row': index, 'status': 'error', 'message': failed[position]})
+            else:
+                results.append({'row': index, 'status': 'created', 'username': doc['username']})
+    return results
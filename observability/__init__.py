@@ -0,0 +1,4 @@
+# Observabilidad comun al web-server y al auth-server: metricas Prometheus
+# (metrics), trazas distribuidas y operaciones lentas (tracing) y estado de
+# salud en segundo plano (health_probe). Cada servicio la importa desde la
+# carpeta superior (ver el ajuste de sys.path en app.py / auth_app.py).
@@ -0,0 +1,99 @@
+# Estado de salud calculado en segundo plano
+# Un hilo ejecuta periodicamente las comprobaciones (ping a cada replica set,
+# auth-server, pool de bcrypt...) y guarda el resultado; /health/ready
+# responde con esa instantanea sin tocar MongoDB, de modo que un balanceador
+# puede consultar con mucha frecuencia sin generar carga. La latencia y el tipo de cada
+# miembro del replica set salen del monitor del driver (sus heartbeats), y
+# el ping de la comprobacion va por el pool de conexiones normal.
+import threading, time
+
+import pymongo
+
+
+def describe_topology(client):
+    """Miembros conocidos por el driver: direccion, rol, latencia (promedio
+    de los heartbeats) y error, mas el primario actual"""
+    description = client.topology_description
+    members = []
+    for (host, port), server in description.server_descriptions().items():
+        members.append({
+            'address': f"{host}:{port}",
+            'type': server.server_type_name,
+            'rtt_ms': round(server.round_trip_time * 1000, 2) if server.round_trip_time is not None else None,
+            'error': str(server.error) if server.error else None
+        })
+    primary = next((m['address'] for m in members if m['type'] in ('RSPrimary', 'Standalone', 'Mongos')), None)
+    return {
+        'replica_set': description.replica_set_name,
+        'topology': description.topology_type_name,
+        'primary': primary,
+        'members': members
+    }
+
+
+def mongo_check(client, timeout):
+    """Comprobacion de un cliente MongoDB: ping al primario acotado por timeout"""
+    def check():
+        with pymongo.timeout(timeout):
+            client.admin.command('ping')
+        return describe_topology(client)
+    return check
+
+
+class HealthProber:
+    def __init__(self, interval=5.0, stale_after=None):
+        self.interval = interval
+        # Una instantanea vieja (hilo bloqueado) no se considera lista
+        self.stale_after = stale_after or interval * 3
+        self._checks = []  # (nombre, funcion, requerida)
+        self._results = {}
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def add_check(self, name, fn, required=True):
+        self._checks.append((name, fn, required))
+        return self
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True, name='health-probe').start()
+
+    def stop(self):
+        self._stop.set()
+
+    def probe(self):
+        results = {}
+        for name, fn, required in self._checks:
+            started = time.perf_counter()
+            try:
+                detail = fn()
+                result = {'ok': True}
+                if detail:
+                    result['detail'] = detail
+            except Exception as e:
+                result = {'ok': False, 'error': str(e)}
+            result['required'] = required
+            result['latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            results[name] = result
+        with self._lock:
+            self._results = results
+            self._checked_at = time.time()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe()
+            self._stop.wait(self.interval)
+
+    def snapshot(self):
+        with self._lock:
+            results, checked_at = self._results, self._checked_at
+        age = time.time() - checked_at if checked_at else None
+        stale = age is None or age > self.stale_after
+        ready = not stale and all(r['ok'] for r in results.values() if r['required'])
+        return {
+            'ready': ready,
+            'stale': stale,
+            'checked_at': checked_at,
+            'age_seconds': round(age, 2) if age is not None else None,
+            'checks': results
+        }
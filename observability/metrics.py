@@ -0,0 +1,291 @@
+# Metricas en formato de texto de Prometheus (/metrics)
+# Contadores e histogramas en memoria con un lock por metrica: registrar una
+# observacion es una busqueda binaria del bucket y unas sumas, asi que puede
+# quedar activo en produccion. Las metricas que ya mantienen otros
+# componentes (cache, verificador de tokens...) se leen al generar la salida.
+# MongoMetrics escucha los comandos y el pool de conexiones de pymongo (un
+# listener por cliente) y los agrupa por shard.
+import threading, time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import g, request
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def lines(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_labels(self.labels, key)} {_number(value)}" for key, value in values]
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # valores de etiquetas -> [conteos por bucket, suma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def lines(self):
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = []
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Callback:
+    """Metrica leida al generar la salida: fn devuelve {valores_etiquetas: valor}"""
+
+    def __init__(self, name, help, type, fn, labels=()):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.fn = fn
+        self.labels = tuple(labels)
+
+    def lines(self):
+        try:
+            values = self.fn()
+        except Exception:
+            return []
+        return [f"{self.name}{_labels(self.labels, key)} {_number(value)}"
+                for key, value in values.items() if value is not None]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def callback(self, name, help, type, fn, labels=()):
+        return self._add(Callback(name, help, type, fn, labels))
+
+    def render(self):
+        output = []
+        for metric in self._metrics:
+            output.append(f"# HELP {metric.name} {metric.help}")
+            output.append(f"# TYPE {metric.name} {metric.type}")
+            output.extend(metric.lines())
+        return '\n'.join(output) + '\n'
+
+
+class RequestMetrics:
+    """Peticiones HTTP por ruta (la regla de Flask, no la URL, para acotar
+    las series), metodo y codigo. En las respuestas en streaming se mide
+    hasta enviar las cabeceras."""
+
+    def __init__(self, registry):
+        self.requests = registry.histogram('http_request_duration_seconds',
+                                           'Duracion de las peticiones HTTP', ('method', 'route', 'status'))
+
+    def init_app(self, app):
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def init_async_app(self, app):
+        """Los mismos hooks en la app Quart (app_async.py), como corrutinas"""
+        from quart import g as quart_g, request as quart_request
+
+        async def before_request():
+            quart_g.request_started = time.perf_counter()
+
+        async def after_request(response):
+            return self._observe(quart_request, quart_g, response)
+
+        app.before_request(before_request)
+        app.after_request(after_request)
+
+    @staticmethod
+    def before_request():
+        g.request_started = time.perf_counter()
+
+    def after_request(self, response):
+        return self._observe(request, g, response)
+
+    def _observe(self, request, g, response):
+        started = g.get('request_started')
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            self.requests.observe(time.perf_counter() - started, request.method, route, str(response.status_code))
+        return response
+
+
+class MongoMetrics:
+    """Latencia de comandos y uso del pool de los clientes MongoDB,
+    etiquetados por nombre (shard). Cada cliente recibe su propio listener
+    con listener(name) en event_listeners; asi el nombre no depende de la
+    direccion del servidor (dos clientes pueden compartir direccion y los
+    miembros que el driver descubre despues quedan bien etiquetados desde
+    el primer evento). watch() asocia el cliente para leer su maxPoolSize."""
+
+    def __init__(self, registry, prefix='mongo'):
+        self.commands = registry.histogram(f'{prefix}_command_duration_seconds',
+                                           'Duracion de los comandos MongoDB', ('database', 'command'))
+        self.failures = registry.counter(f'{prefix}_command_failures_total',
+                                         'Comandos MongoDB fallidos', ('database', 'command'))
+        self.checkout_failures = registry.counter(f'{prefix}_pool_checkout_failures_total',
+                                                  'Conexiones que no se pudieron obtener del pool',
+                                                  ('database', 'reason'))
+        registry.callback(f'{prefix}_pool_max_size', 'Tamano maximo del pool por servidor', 'gauge',
+                          self._max_sizes, ('database',))
+        registry.callback(f'{prefix}_pool_checked_out', 'Conexiones del pool en uso', 'gauge',
+                          lambda: self._gauge('checked_out'), ('database', 'address'))
+        registry.callback(f'{prefix}_pool_open_connections', 'Conexiones abiertas del pool', 'gauge',
+                          lambda: self._gauge('open'), ('database', 'address'))
+        self._clients = []
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def listener(self, name):
+        """Listener para event_listeners de un cliente nuevo"""
+        listener = ClientMetrics(self, name)
+        with self._lock:
+            self._listeners.append(listener)
+        return listener
+
+    def watch(self, name, client):
+        self._clients.append((name, client))
+        return client
+
+    def _max_sizes(self):
+        return {(name,): client.options.pool_options.max_pool_size for name, client in self._clients}
+
+    def _gauge(self, counter):
+        # Varios clientes del mismo shard se suman
+        with self._lock:
+            listeners = list(self._listeners)
+        totals = defaultdict(int)
+        for listener in listeners:
+            for (host, port), value in listener.snapshot(counter).items():
+                totals[(listener.name, f"{host}:{port}")] += value
+        return dict(totals)
+
+
+class ClientMetrics(monitoring.CommandListener, monitoring.ConnectionPoolListener):
+    """Eventos de un cliente MongoDB. Llegan desde hilos del driver, a veces
+    con locks internos tomados: solo se actualizan contadores."""
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self._counts = {'checked_out': defaultdict(int), 'open': defaultdict(int)}  # -> (host, port) -> conexiones
+        self._lock = threading.Lock()
+
+    def snapshot(self, counter):
+        with self._lock:
+            return dict(self._counts[counter])
+
+    # ---------- Comandos ----------
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.metrics.commands.observe(event.duration_micros / 1e6, self.name, event.command_name)
+
+    def failed(self, event):
+        self.metrics.commands.observe(event.duration_micros / 1e6, self.name, event.command_name)
+        self.metrics.failures.inc(self.name, event.command_name)
+
+    # ---------- Pool de conexiones ----------
+
+    def _count(self, counter, address, delta):
+        with self._lock:
+            self._counts[counter][address] += delta
+
+    def connection_created(self, event):
+        self._count('open', event.address, 1)
+
+    def connection_closed(self, event):
+        self._count('open', event.address, -1)
+
+    def connection_checked_out(self, event):
+        self._count('checked_out', event.address, 1)
+
+    def connection_checked_in(self, event):
+        self._count('checked_out', event.address, -1)
+
+    def connection_check_out_failed(self, event):
+        self.metrics.checkout_failures.inc(self.name, event.reason)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
@@ -0,0 +1,327 @@
+# Trazas distribuidas y registro de operaciones lentas
+# Cada peticion HTTP abre un span raiz con un trace id (W3C traceparent; se
+# respeta el que llegue en la peticion). El span actual vive en un
+# ContextVar: las llamadas al auth-server lo propagan en la cabecera
+# traceparent, los hilos del scatter-gather reciben una copia del contexto y
+# cada comando MongoDB queda como span hijo (CommandListener). Los spans
+# muestreados se escriben como JSON por linea desde un hilo en segundo plano;
+# los que superan el umbral se registran ademas en el log 'slow_operations'.
+import atexit, contextvars, json, logging, os, queue, random, secrets, threading, time
+from contextlib import contextmanager
+
+from flask import g, request
+from pymongo import monitoring
+
+TRACEPARENT = 'traceparent'
+
+_current = contextvars.ContextVar('current_span', default=None)
+slow_log = logging.getLogger('slow_operations')
+
+
+def current_span():
+    return _current.get()
+
+
+def parse_traceparent(value):
+    """(trace_id, parent_id, sampled) de una cabecera traceparent o None"""
+    parts = (value or '').strip().split('-')
+    if len(parts) != 4 or parts[0] != '00' or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16), int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == '0' * 32 or parts[2] == '0' * 16:
+        return None
+    return parts[1], parts[2], bool(int(parts[3], 16) & 1)
+
+
+class Span:
+    def __init__(self, tracer, name, trace_id, parent_id=None, sampled=True, kind='internal', attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.error = None
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def finish(self, duration=None):
+        if self.duration is None:
+            self.duration = duration if duration is not None else time.perf_counter() - self._started
+            self.tracer.finished(self)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'service': self.tracer.service,
+            'kind': self.kind,
+            'start': round(self.start, 6),
+            'duration_ms': round(self.duration * 1000, 3),
+            'error': self.error,
+            'attributes': self.attributes
+        }
+
+
+@contextmanager
+def span(name, kind='internal', **attributes):
+    """Span hijo del actual. Sin traza activa (hilos de fondo, trazas
+    desactivadas) no hace nada y devuelve None."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.tracer.child(parent, name, kind, attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        child.finish()
+
+
+def inject(headers=None):
+    """Cabeceras con el traceparent del span actual (para llamadas salientes)"""
+    headers = dict(headers or {})
+    current = _current.get()
+    if current is not None:
+        headers[TRACEPARENT] = current.traceparent()
+    return headers
+
+
+def run_in_context(fn):
+    """Envuelve fn para ejecutarla en otro hilo con una copia del contexto
+    actual (span incluido)"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+class JsonlExporter:
+    """Escribe los spans como JSON por linea. Las peticiones solo encolan;
+    un hilo agrupa las escrituras. Si la cola se llena se descartan spans."""
+
+    def __init__(self, path, max_queue=10000, flush_seconds=1.0):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.dropped = 0
+        self.exported = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=self._run, daemon=True, name='trace-export').start()
+        atexit.register(self.close)
+
+    def export(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self):
+        records = []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                return records
+
+    def flush(self):
+        records = self._drain()
+        if records:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(record, default=str) + '\n' for record in records))
+            self.exported += len(records)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"No se pudieron exportar las trazas a {self.path}: {e}")
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+    def stats(self):
+        return {'path': self.path, 'exported': self.exported, 'dropped': self.dropped,
+                'queued': self._queue.qsize()}
+
+
+class Tracer:
+    def __init__(self, service, exporter=None, sample_rate=1.0, slow_ms=500.0):
+        self.service = service
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        # None desactiva el registro de operaciones lentas
+        self.slow_seconds = slow_ms / 1000 if slow_ms else None
+        self.slow_operations = 0
+
+    @classmethod
+    def from_env(cls, service):
+        path = os.getenv('TRACE_EXPORT_FILE', '')
+        return cls(
+            service,
+            exporter=JsonlExporter(path) if path else None,
+            sample_rate=float(os.getenv('TRACE_SAMPLE_RATE', 1.0)),
+            slow_ms=float(os.getenv('SLOW_OPERATION_MS', 500))
+        )
+
+    def root(self, name, traceparent=None, kind='server', **attributes):
+        """Span raiz de una peticion; continua la traza entrante si la hay"""
+        incoming = parse_traceparent(traceparent)
+        if incoming:
+            trace_id, parent_id, sampled = incoming
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+            sampled = random.random() < self.sample_rate
+        return Span(self, name, trace_id, parent_id, sampled, kind, attributes)
+
+    def child(self, parent, name, kind='internal', attributes=None):
+        return Span(self, name, parent.trace_id, parent.span_id, parent.sampled, kind, attributes)
+
+    def finished(self, span):
+        if self.slow_seconds is not None and span.duration >= self.slow_seconds:
+            self.slow_operations += 1
+            slow_log.warning(json.dumps({'event': 'slow_operation', **span.to_dict()}, default=str))
+        if span.sampled and self.exporter is not None:
+            self.exporter.export(span.to_dict())
+
+    def stats(self):
+        return {
+            'service': self.service,
+            'sample_rate': self.sample_rate,
+            'slow_ms': self.slow_seconds * 1000 if self.slow_seconds is not None else None,
+            'slow_operations': self.slow_operations,
+            'exporter': self.exporter.stats() if self.exporter else None
+        }
+
+    # ---------- Integracion con Flask y Quart ----------
+
+    def init_app(self, app):
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+
+    def init_async_app(self, app):
+        """Los mismos hooks en la app Quart (app_async.py). Son corrutinas:
+        Quart ejecuta las funciones sincronas en un hilo y el span no
+        quedaria en el contexto de la peticion."""
+        from quart import g as quart_g, request as quart_request
+
+        async def before_request():
+            self._open(quart_request, quart_g)
+
+        async def after_request(response):
+            return self._tag(quart_request, quart_g, response)
+
+        async def teardown_request(exc):
+            self._close(quart_g, exc)
+
+        app.before_request(before_request)
+        app.after_request(after_request)
+        app.teardown_request(teardown_request)
+
+    def before_request(self):
+        self._open(request, g)
+
+    @staticmethod
+    def after_request(response):
+        return Tracer._tag(request, g, response)
+
+    @staticmethod
+    def teardown_request(exc):
+        Tracer._close(g, exc)
+
+    def _open(self, request, g):
+        root = self.root(f"{request.method} {request.path}", request.headers.get(TRACEPARENT),
+                         method=request.method, path=request.path)
+        g.trace_span = root
+        g.trace_token = _current.set(root)
+
+    @staticmethod
+    def _tag(request, g, response):
+        root = g.get('trace_span')
+        if root is not None:
+            root.set(route=request.url_rule.rule if request.url_rule else 'unmatched',
+                     status=response.status_code)
+            response.headers['X-Trace-Id'] = root.trace_id
+        return response
+
+    @staticmethod
+    def _close(g, exc):
+        root = g.pop('trace_span', None)
+        if root is None:
+            return
+        if exc is not None:
+            root.error = f"{type(exc).__name__}: {exc}"
+        try:
+            _current.reset(g.pop('trace_token'))
+        except ValueError:
+            # El cierre corre en otro contexto (tarea distinta): ese contexto se descarta
+            pass
+        root.finish()
+
+
+class MongoTracing(monitoring.CommandListener):
+    """Un span por comando MongoDB, hijo del span activo en el hilo que lo
+    ejecuta. Los comandos sin traza (hilos de fondo) solo pasan por el
+    registro de operaciones lentas. Uno por cliente: `name` es el shard
+    al que pertenece el cliente."""
+
+    def __init__(self, tracer, name=None):
+        self.tracer = tracer
+        self.name = name
+        self._parents = {}  # (request_id, connection_id) -> span padre
+
+    def started(self, event):
+        parent = _current.get()
+        if parent is not None:
+            self._parents[(event.request_id, event.connection_id)] = parent
+
+    def _finish(self, event, error=None):
+        parent = self._parents.pop((event.request_id, event.connection_id), None)
+        duration = event.duration_micros / 1e6
+        if parent is None and (self.tracer.slow_seconds is None or duration < self.tracer.slow_seconds):
+            return
+        host, port = event.connection_id
+        attributes = {
+            'db.system': 'mongodb',
+            'db.name': event.database_name,
+            'db.operation': event.command_name,
+            'server': f"{host}:{port}"
+        }
+        if self.name is not None:
+            attributes['shard'] = self.name
+        if parent is not None:
+            command_span = self.tracer.child(parent, f"mongo {event.command_name}", 'client', attributes)
+        else:
+            command_span = self.tracer.root(f"mongo {event.command_name}", kind='client', **attributes)
+            command_span.sampled = False
+        command_span.start = time.time() - duration
+        command_span.error = error
+        command_span.finish(duration)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, str(event.failure))
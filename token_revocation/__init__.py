@@ -0,0 +1,4 @@
+# Revocacion de tokens comun al web-server y al auth-server: la lista de
+# revocaciones vigentes en memoria (denylist) y la vigencia de los tokens de
+# acceso. Cada servicio la importa desde la carpeta superior, como
+# observability (ver el ajuste de sys.path en app.py / auth_app.py).
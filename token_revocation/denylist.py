@@ -0,0 +1,104 @@
+# Revocaciones vigentes en memoria
+# El auth-server la llena desde auth_db.revocations y el web-server desde
+# /auth/revocations; los dos comprueban cada token igual. Un filtro de Bloom
+# de los jti revocados descarta en el camino comun sin tomar locks y un
+# conjunto exacto confirma los positivos. Las revocaciones por usuario
+# invalidan los tokens emitidos antes de cierto instante, con milisegundos.
+import hashlib, math, os, threading
+
+KIND_TOKEN = 'jti'
+KIND_USER = 'user'
+
+
+def access_token_ttl():
+    """Vigencia del token de acceso en segundos (ACCESS_TOKEN_TTL). El
+    auth-server la usa al emitir; una revocacion por usuario debe durar lo
+    mismo, porque el token mas largo emitido antes vive hasta entonces."""
+    return int(os.getenv("ACCESS_TOKEN_TTL", 3600))
+
+
+def millis(epoch):
+    return round((epoch or 0) * 1000)
+
+
+class BloomFilter:
+    """Filtro de Bloom de tamano fijo (doble hash sobre blake2b)"""
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * step) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class Denylist:
+    """Revocaciones vigentes en memoria"""
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._tokens = {}  # jti -> expira (epoch)
+        self._users = {}   # username -> (revocado antes de (epoch con ms), expira (epoch))
+        self._lock = threading.Lock()
+        self.false_positives = 0
+
+    def add(self, kind, value, expires_at, not_before=None):
+        with self._lock:
+            if kind == KIND_TOKEN:
+                self._tokens[value] = expires_at
+                self._bloom.add(value)
+            elif kind == KIND_USER:
+                current = self._users.get(value)
+                if current is None or current[0] < not_before:
+                    self._users[value] = (not_before, expires_at)
+
+    def is_revoked(self, claims):
+        jti = claims.get('jti')
+        # Camino comun: el filtro descarta sin lock
+        if jti and jti in self._bloom:
+            if jti in self._tokens:
+                return True
+            self.false_positives += 1
+        revoked_user = self._users.get(claims.get('username'))
+        # Los tokens sin iat son anteriores a la revocacion; se compara en
+        # milisegundos enteros para no depender del redondeo de los float
+        return revoked_user is not None and millis(claims.get('iat')) < millis(revoked_user[0])
+
+    def prune(self, now):
+        """Descarta las revocaciones de tokens que ya expiraron y reconstruye
+        el filtro (un filtro de Bloom no admite borrados)"""
+        with self._lock:
+            expired = [jti for jti, expires in self._tokens.items() if expires <= now]
+            for jti in expired:
+                del self._tokens[jti]
+            for username in [u for u, (_, expires) in self._users.items() if expires <= now]:
+                del self._users[username]
+            if expired:
+                bloom = BloomFilter(self._bloom.capacity, self._bloom.error_rate)
+                for jti in self._tokens:
+                    bloom.add(jti)
+                self._bloom = bloom
+            return len(expired)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tokens': len(self._tokens),
+                'users': len(self._users),
+                'bloom_bits': self._bloom.size,
+                'bloom_hashes': self._bloom.hashes,
+                'false_positives': self.false_positives
+            }
@@ -1,50 +1,329 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, send_from_directory
-from pymongo import MongoClient
-import requests, os
+from flask import Flask, render_template, request, jsonify, session, redirect, send_from_directory, g, Response, stream_with_context
+import requests, os, sys, threading, time, atexit
+from urllib.parse import quote
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import DuplicateKeyError, PyMongoError
 from flask_cors import CORS
+# Paquetes observability y token_revocation compartidos con el auth-server (carpeta superior)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from token_verifier import TokenVerifier, InvalidToken, VerifierUnavailable
+from auth_client import AuthClient, CircuitOpenError, AuthClientBusy
+from revocations import RevocationSync
+from observability import metrics, tracing
+from observability.health_probe import HealthProber, mongo_check
+import pagination
+import catalog_export
+import product_query
+import product_search
+import product_bulk
+import product_requests
+import inventory
+import etags
+import json_provider
+import mongo_clients
+from user_directory import UserDirectory
+from compression import Compressor
+from scatter_gather import ScatterGather, ShardUnavailable
+from product_ids import public_id, parse_public_id
+from shard_router import ShardRouter
+from read_routing import ReadRouter, DEFAULT_SECONDARY_ENDPOINTS
+from product_cache import ProductCache, ChangeStreamInvalidator
+from shard_migration import (relocate, find_redirect, ensure_redirect_indexes, Rebalancer, MigrationSweeper,
+                             MigrationError, NOT_MIGRATING, MIGRATING_FIELD)
+from pagination import InvalidCursor
 
 load_dotenv()  # Cargar variables de entorno desde el archivo .env
 
 app = Flask(__name__)
 CORS(app)  # Habilitar CORS
 app.secret_key = os.getenv("SECRET_KEY")
+# Serializacion JSON (orjson si esta instalado) y compresion gzip/brotli negociada
+JSON_SERIALIZER = json_provider.configure(
+    app,
+    serializer=os.getenv("JSON_SERIALIZER", "orjson").lower(),
+    datetime_format=os.getenv("JSON_DATETIME_FORMAT", "http").lower()
+)
+if os.getenv("RESPONSE_COMPRESSION", "True").lower() == "true":
+    Compressor(
+        min_size=int(os.getenv("COMPRESSION_MIN_SIZE", 1024)),
+        gzip_level=int(os.getenv("COMPRESSION_GZIP_LEVEL", 6)),
+        brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))
+    ).init_app(app)
 AUTH_SERVER_URL = os.getenv("AUTH_SERVER_URL", "http://localhost:5000")
 WEB_SERVER_URL = os.getenv("WEB_SERVER_URL", "http://localhost:3000")
-DB1_URL = os.getenv("DB1_URL")  # Conexion a la base de datos MongoDB 
-DB2_URL = os.getenv("DB2_URL")  # Conexion a la base de datos MongoDB
 
-# Conexion a la base datos MongoDB de productos
-db1_client = MongoClient(DB1_URL)
-db2_client = MongoClient(DB2_URL)
+# Metricas Prometheus en /metrics: peticiones por ruta, comandos y pools de
+# MongoDB por shard, verificacion de tokens y caches
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+metrics_registry = metrics.Registry()
+mongo_metrics = metrics.MongoMetrics(metrics_registry)
+request_metrics = metrics.RequestMetrics(metrics_registry)
+if METRICS_ENABLED:
+    request_metrics.init_app(app)
+# Trazas distribuidas: trace id por peticion propagado al auth-server (traceparent),
+# spans de comandos MongoDB y log de operaciones lentas (SLOW_OPERATION_MS)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "True").lower() == "true"
+tracer = tracing.Tracer.from_env('web-server') if TRACING_ENABLED else tracing.Tracer('web-server')
+if TRACING_ENABLED:
+    tracer.init_app(app)
 
-db1 = db1_client['products_db']
-db2 = db2_client['products_db']
+def mongo_listeners(name):
+    """Listeners de metricas y trazas para un cliente MongoDB nuevo del shard name"""
+    return ([mongo_metrics.listener(name)] if METRICS_ENABLED else []) + \
+        ([tracing.MongoTracing(tracer, name)] if TRACING_ENABLED else [])
 
-products_collection_db1 = db1['products']
-products_collection_db2 = db2['products']
+# Conexion a los shards MongoDB de productos: un cliente (pool) por shard,
+# compartido con el modo asincrono si lo hay (mongo_clients).
+# El mapa se lee de SHARD_MAP_FILE/SHARD_MAP; por defecto DB1_URL (A-M) y DB2_URL (N-Z)
+shard_router = ShardRouter.from_env(mongo_clients.create,
+                                    maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", 100)),
+                                    listeners_for=mongo_listeners)
 
-print(f"Conexiones a las bases de datos MongoDB establecidas")
-print(f"DB1: {DB1_URL}")
-print(f"DB2: {DB2_URL}")
+print(f"Conexiones a las bases de datos MongoDB establecidas ({shard_router.strategy})")
+for shard in shard_router.shards:
+    print(f"{shard.label}: {shard.url}")
+    mongo_metrics.watch(shard.name, shard.client)
+
+# Shards de productos en el orden en que se combinan los listados
+PRODUCT_SHARDS = shard_router.targets()
+# Lecturas tolerantes a retraso (listados, busqueda, exportacion) van a los
+# secundarios con staleness acotado; las demas se quedan en el primario
+read_router = ReadRouter(
+    shard_router,
+    secondary_endpoints=[e.strip() for e in os.getenv(
+        "SECONDARY_READ_ENDPOINTS", ",".join(DEFAULT_SECONDARY_ENDPOINTS)).split(",") if e.strip()],
+    max_staleness=int(os.getenv("READ_MAX_STALENESS_SECONDS", 90))
+)
+# Segundos que se conserva la redireccion de un producto migrado de shard
+PRODUCT_REDIRECT_TTL = int(os.getenv("PRODUCT_REDIRECT_TTL", 7 * 24 * 3600))
+# Segundos tras los que una marca de migracion se considera huerfana (proceso caido)
+MIGRATION_MARKER_TIMEOUT = float(os.getenv("MIGRATION_MARKER_TIMEOUT", 300))
+
+# Cache de lecturas de productos (LRU + TTL limitada en bytes; 0 la desactiva)
+product_cache = ProductCache(
+    max_bytes=int(os.getenv("PRODUCT_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+    product_ttl=float(os.getenv("PRODUCT_CACHE_TTL", 30)),
+    page_ttl=float(os.getenv("PRODUCT_CACHE_PAGE_TTL", 10))
+)
+# Los change streams invalidan la cache ante escrituras de otras instancias
+cache_invalidator = ChangeStreamInvalidator(product_cache, shard_router.shards)
+CACHE_CHANGE_STREAMS = bool(product_cache.max_bytes) and \
+    os.getenv("CACHE_CHANGE_STREAMS", "True").lower() == "true"
+
+# Redistribucion en segundo plano tras cambios del mapa de shards; cada
+# producto movido se invalida en la cache
+rebalancer = Rebalancer(shard_router, on_moved=product_cache.invalidate, max_marker_age=MIGRATION_MARKER_TIMEOUT)
+# Al arrancar y periodicamente: terminar o deshacer migraciones interrumpidas
+migration_sweeper = MigrationSweeper(shard_router, MIGRATION_MARKER_TIMEOUT,
+                                     interval=float(os.getenv("MIGRATION_SWEEP_SECONDS", 60)),
+                                     on_change=product_cache.invalidate)
+
+# Pool acotado para consultar todos los shards a la vez (timeout por shard)
+shard_executor = ScatterGather(
+    max_workers=int(os.getenv("SCATTER_MAX_WORKERS", 16)),
+    timeout=float(os.getenv("SHARD_TIMEOUT", 5)),
+    queue_timeout=float(os.getenv("SHARD_QUEUE_TIMEOUT", os.getenv("SHARD_TIMEOUT", 5)))
+)
+# Reservas de stock por shard (recuerdan si el shard admite transacciones)
+shard_reservations = {shard.name: inventory.ShardReservations(shard) for shard in shard_router.shards}
+RESERVE_TIMEOUT = float(os.getenv("RESERVE_TIMEOUT", 30))
+RESERVATION_RECORD_TTL = int(os.getenv("RESERVATION_RECORD_TTL", 86400))
+# Compensaciones que no se pudieron aplicar: se reintentan en segundo plano
+release_retrier = inventory.ReleaseRetrier(
+    shard_reservations, interval=float(os.getenv("RESERVE_RELEASE_RETRY_SECONDS", 10))
+)
+# Limites de la importacion masiva (/products/bulk)
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", 50000))
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 1000))
+BULK_TIMEOUT = float(os.getenv("BULK_TIMEOUT", 120))
+# Cliente compartido de DB3 (usuarios) para el panel; se cierra al terminar el proceso
+user_directory = UserDirectory(os.getenv("DB3_URL"), maxPoolSize=int(os.getenv("DB3_MAX_POOL_SIZE", 10)),
+                               event_listeners=mongo_listeners('DB3'))
+mongo_metrics.watch('DB3', user_directory.client)
+atexit.register(user_directory.close)
+
+def find_product_shard(query, projection=None, endpoint='get_product'):
+    """Busca un documento en todos los shards a la vez y devuelve
+    (shard, coleccion, documento) del primero que lo tenga. Si ningun shard
+    lo tiene pero alguno no respondio, lanza ShardUnavailable."""
+    targets = read_router.targets(endpoint)
+    collections = dict(targets)
+    shard, product, result = shard_executor.first(
+        targets, lambda collection: collection.find_one(query, projection)
+    )
+    if shard is None:
+        if result.partial:
+            raise ShardUnavailable(result.errors)
+        return None, None, None
+    return shard, collections[shard], product
+
+def locate_product(product_id, projection=None):
+    """Resuelve un ID publico de producto. Los IDs con prefijo de shard se
+    consultan solo en ese shard (y en el destino de su redireccion); los
+    ObjectId antiguos sin prefijo, o los que no aparecen donde indican el
+    prefijo y la redireccion, se buscan en todos los shards a la vez."""
+    tag, object_id = parse_public_id(product_id)
+    shard = shard_router.get(tag)
+    if shard is not None:
+        product = read_router.collection('get_product', shard).find_one({'_id': object_id}, projection)
+        if not product:
+            # El producto pudo haberse migrado a otro shard tras un cambio de nombre
+            shard = find_redirect(shard_router, shard, object_id)
+            product = read_router.collection('get_product', shard).find_one({'_id': object_id}, projection) \
+                if shard else None
+        if product:
+            return shard.name, shard.collection, product
+        # Redireccion expirada o perdida (o rebalanceo sin ella): el _id es
+        # unico entre shards, asi que se busca en todos
+    return find_product_shard({'_id': object_id}, projection)
+
+def ensure_product_indexes():
+    """Crea en cada shard los indices compuestos que respaldan los filtros y
+    ordenes del listado, el de busqueda por prefijo y el TTL de las
+    redirecciones de migracion. Completa el nombre normalizado de los
+    productos antiguos y luego crea el indice unico de nombres."""
+    for shard in shard_router.shards:
+        try:
+            for keys in product_query.PRODUCT_INDEXES:
+                shard.collection.create_index(keys)
+            shard.collection.create_index(product_search.SEARCH_INDEX)
+            ensure_redirect_indexes(shard, PRODUCT_REDIRECT_TTL)
+            inventory.ensure_reservation_indexes(shard, RESERVATION_RECORD_TTL)
+            backfilled = product_search.backfill_names(shard.collection)
+            if backfilled:
+                print(f"{shard.name}: nombre normalizado completado en {backfilled} productos")
+        except Exception as e:
+            print(f"No se pudieron crear los indices en {shard.name}: {e}")
+            continue
+        try:
+            # Despues del completado: falla si ya hay nombres repetidos en el shard
+            shard.collection.create_index(product_search.UNIQUE_NAME_INDEX, **product_search.UNIQUE_NAME_OPTIONS)
+        except Exception as e:
+            print(f"No se pudo crear el indice unico de nombres en {shard.name}: {e}")
+
+
+# Cliente compartido hacia el auth-server (pool keep-alive + circuit breaker)
+auth_client = AuthClient(
+    AUTH_SERVER_URL,
+    pool_size=int(os.getenv("AUTH_POOL_SIZE", 20)),
+    connect_timeout=float(os.getenv("AUTH_CONNECT_TIMEOUT", 2)),
+    read_timeout=float(os.getenv("AUTH_READ_TIMEOUT", 5)),
+    max_concurrency=int(os.getenv("AUTH_MAX_CONCURRENCY", 50)),
+    acquire_timeout=float(os.getenv("AUTH_ACQUIRE_TIMEOUT", 1)),
+    failure_threshold=int(os.getenv("AUTH_BREAKER_THRESHOLD", 5)),
+    reset_timeout=float(os.getenv("AUTH_BREAKER_RESET", 30))
+)
+
+# Verificacion de tokens: 'local' valida la firma en proceso con las claves
+# del auth-server; 'remote' consulta /auth/verify en cada peticion
+token_verifier = TokenVerifier(
+    auth_client,
+    mode=os.getenv("AUTH_VERIFY_MODE", "local").lower(),
+    internal_key=os.getenv("INTERNAL_API_KEY"),
+    cache_size=int(os.getenv("TOKEN_CACHE_SIZE", 10000)),
+    refresh_seconds=int(os.getenv("JWT_KEYS_REFRESH_SECONDS", 300)),
+    leeway=int(os.getenv("JWT_LEEWAY_SECONDS", 0)),
+    fallback=os.getenv("AUTH_VERIFY_FALLBACK", "True").lower() == "true"
+)
+# Tokens revocados en el auth-server (logout, usuarios eliminados); 0 desactiva la sincronizacion
+revocation_sync = RevocationSync(
+    auth_client, token_verifier.revocations,
+    internal_key=token_verifier.internal_key,
+    poll_seconds=float(os.getenv("REVOCATION_POLL_SECONDS", 5))
+)
+
+# Estado de salud en segundo plano: /health/ready responde con la ultima instantanea
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", 2))
+
+def auth_server_check():
+    response = auth_client.get('/health/live', timeout=HEALTH_PROBE_TIMEOUT)
+    if response.status_code != 200:
+        raise RuntimeError(f'auth-server respondio {response.status_code}')
+    return {'url': AUTH_SERVER_URL}
+
+def jwt_keys_check():
+    if not token_verifier.refresh_keys():
+        raise RuntimeError('Claves de verificacion no disponibles')
+    return {'keys_loaded': token_verifier.stats()['keys_loaded']}
+
+health_prober = HealthProber(interval=float(os.getenv("HEALTH_PROBE_SECONDS", 5)))
+for shard in shard_router.shards:
+    health_prober.add_check(shard.name, mongo_check(shard.client, HEALTH_PROBE_TIMEOUT))
+# Usuarios (DB3) solo se usan en el panel de administracion: no bloquean la disponibilidad
+health_prober.add_check('DB3', mongo_check(user_directory.client, HEALTH_PROBE_TIMEOUT), required=False)
+# Con verificacion local el auth-server solo es imprescindible para login; se exigen las claves
+health_prober.add_check('auth-server', auth_server_check, required=token_verifier.mode != 'local')
+if token_verifier.mode == 'local':
+    health_prober.add_check('jwt_keys', jwt_keys_check)
+
+_background_lock = threading.Lock()
+_background_started = False
+
+def start_background_tasks():
+    """Arranca el trabajo en segundo plano de la app: indices, invalidacion
+    de la cache, migraciones y reservas pendientes, revocaciones y salud.
+    Lo llama quien sirve la app (python3 app.py o app_async.py), no la
+    importacion del modulo. Solo tiene efecto la primera vez."""
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    # En segundo plano para no bloquear el arranque si un shard no responde
+    threading.Thread(target=ensure_product_indexes, daemon=True).start()
+    migration_sweeper.start()
+    release_retrier.start()
+    if CACHE_CHANGE_STREAMS:
+        cache_invalidator.start()
+    if token_verifier.mode == 'local' and not token_verifier.refresh_keys():
+        print("Claves JWT no disponibles al iniciar; se reintentara en la primera peticion")
+    if revocation_sync.poll_seconds > 0 and revocation_sync.internal_key:
+        revocation_sync.start()
+    elif revocation_sync.poll_seconds > 0:
+        print("INTERNAL_API_KEY no configurada; no se sincronizan las revocaciones del auth-server")
+    health_prober.start()
+
+# Metricas leidas de los componentes al generar /metrics
+token_verify_seconds = metrics_registry.histogram(
+    'auth_token_verify_duration_seconds', 'Duracion de la verificacion de tokens', ('result',))
+metrics_registry.callback('auth_token_cache_hits_total', 'Tokens resueltos desde la cache', 'counter',
+                          lambda: {(): token_verifier.cache.hits})
+metrics_registry.callback('auth_token_cache_misses_total', 'Tokens no encontrados en la cache', 'counter',
+                          lambda: {(): token_verifier.cache.misses})
+metrics_registry.callback('auth_client_requests_total', 'Peticiones al auth-server', 'counter',
+                          lambda: {(): auth_client.stats()['requests_total']})
+metrics_registry.callback('auth_client_failures_total', 'Peticiones fallidas al auth-server', 'counter',
+                          lambda: {(): auth_client.stats()['failures_total']})
+metrics_registry.callback('auth_client_in_flight', 'Peticiones en curso al auth-server', 'gauge',
+                          lambda: {(): auth_client.stats()['concurrency']['in_flight']})
+metrics_registry.callback('auth_client_breaker_open', 'Circuit breaker del auth-server abierto (1) o no (0)', 'gauge',
+                          lambda: {(): int(auth_client.breaker.stats()['state'] == auth_client.breaker.OPEN)})
+metrics_registry.callback('product_cache_requests_total', 'Consultas a la cache de productos', 'counter',
+                          lambda: {('hit',): product_cache.hits, ('miss',): product_cache.misses}, ('result',))
+metrics_registry.callback('product_cache_bytes', 'Bytes ocupados por la cache de productos', 'gauge',
+                          lambda: {(): product_cache.stats()['bytes']})
+metrics_registry.callback('shard_queue_timeouts_total', 'Consultas a shards que vencieron en cola sin ejecutarse',
+                          'counter', lambda: {(): shard_executor.queue_timeouts})
 
 # Middleware para verificar autenticacion
 def verify_token():
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
     if not token:
         return jsonify({'message': 'Token de autenticacion requerido'}), 401
-    # Enviar el token al servidor de autenticacion para verificarlo por header authorization
+    started = time.perf_counter()
     try:
-        response = requests.post(
-            f"{AUTH_SERVER_URL}/auth/verify",
-            headers={'Authorization': f'Bearer {token}'}
-        )
-        if response.status_code != 200:
-            return jsonify({'message': 'Token invalido o expirado'}), 401
+        with tracing.span('verify_token', mode=token_verifier.mode):
+            g.user = token_verifier.verify(token)
+        token_verify_seconds.observe(time.perf_counter() - started, 'valid')
         return None
-    except requests.RequestException as e:
+    except InvalidToken:
+        token_verify_seconds.observe(time.perf_counter() - started, 'invalid')
+        return jsonify({'message': 'Token invalido o expirado'}), 401
+    except VerifierUnavailable as e:
+        token_verify_seconds.observe(time.perf_counter() - started, 'unavailable')
         return jsonify({'message': f'Error al verificar token: {str(e)}'}), 500
 
 # Rutas de paginas web
@@ -79,27 +358,45 @@ def register_user_page():
 
 # Funcion auxiliar para determinar en que BD guardar (fragmentacion por nombre)
 def get_database_for_product(product_name):
-    """Distribuye productos entre DB1 y DB2 basado en la primera letra del nombre
+    """Devuelve (shard, etiqueta) donde se guarda un producto segun el mapa
+    de shards: por rango del nombre normalizado (sin acentos, "Ñame" -> N)
+    o por hash. Con la configuracion por defecto:
     DB1: Productos A-M
     DB2: Productos N-Z
     """
-    if not product_name:
-        raise ValueError("El nombre del producto es requerido")
-    
-    first_letter = product_name[0].upper()
-    
-    # DB1: A-M, DB2: N-Z
-    if 'A' <= first_letter <= 'M':
-        return products_collection_db1, 'DB1 (A-M)'
-    elif 'N' <= first_letter <= 'Z':
-        return products_collection_db2, 'DB2 (N-Z)'
+    shard, label = shard_router.route(product_name)
+    return shard, label or shard.label
+
+def get_database_for_new_product(product_name):
+    """get_database_for_product para altas: si el enrutado anterior a la
+    normalizacion ya guardo ese nombre en otro shard, se usa ese shard para
+    no repartir la misma clave entre dos (el rebalanceador los mueve juntos)"""
+    shard, label, legacy, query = product_requests.new_product_route(shard_router, product_name)
+    if legacy is not None and legacy.collection.count_documents(query, limit=1):
+        return legacy, legacy.label
+    return shard, label
+
+def product_written(shard, object_id=None):
+    """Tras una escritura: nueva version de la coleccion del shard (ETag de
+    los listados) e invalidacion de la cache"""
+    etags.bump_collection_version(shard.db)
+    product_cache.invalidate(object_id)
+
+def etag_response(payload, etag, status=200):
+    """Respuesta JSON con ETag, o 304 sin cuerpo si el cliente ya la tiene"""
+    if etag and etags.none_match(request.if_none_match, etag):
+        response = Response(status=304)
     else:
-        # Si no es una letra (números, símbolos), usar DB1 por defecto
-        return products_collection_db1, 'DB1 (default)'
+        response = jsonify(payload)
+        response.status_code = status
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 # ============ CRUD DE PRODUCTOS ============
 
-# READ - Listar todos los productos
+# READ - Listar productos (paginado por cursor)
 @app.route('/products', methods=['GET'])
 def list_products():
     # Verificar autenticacion
@@ -108,23 +405,137 @@ def list_products():
         return auth_response
     
     try:
-        # Listar productos desde ambas bases de datos
-        products_db1 = list(products_collection_db1.find({}))
-        products_db2 = list(products_collection_db2.find({}))
-        
-        # Convertir ObjectId a string para JSON
-        for product in products_db1 + products_db2:
-            product['_id'] = str(product['_id'])
-            product['database'] = 'DB1' if product in products_db1 else 'DB2'
+        # Filtros que se empujan a cada shard como consulta indexada
+        listing = product_requests.ListingQuery(request.args)
+    except ValueError as ve:
+        return jsonify({'message': str(ve)}), 400
+    
+    page_key = listing.page_key
+    cached = product_cache.get_page(page_key) if not listing.explain else None
+    if cached is not None:
+        etag, page = cached
+        return etag_response(page, etag)
+    cache_token = product_cache.token()
+    
+    try:
+        targets = read_router.targets('list_products')
+        etag = None
+        if not listing.explain:
+            # La version de cada shard basta para responder 304 sin ejecutar la consulta
+            versions = shard_executor.gather(targets, etags.collection_version)
+            if not versions.partial:
+                etag = etags.listing_etag(page_key, versions.results)
+                if etags.none_match(request.if_none_match, etag):
+                    return etag_response(None, etag)
+        # Combinar en orden los shards; solo se materializa una pagina
+        items, next_state, errors = pagination.fetch_page(
+            targets, listing.limit, listing.sort_field, listing.direction, listing.cursor_state,
+            base_filter=listing.base_filter, executor=shard_executor, query_key=listing.query_key
+        )
+        product_requests.require_any(targets, errors)
         
-        all_products = products_db1 + products_db2
-        return jsonify({
-            'count': len(all_products),
-            'products': all_products
-        }), 200
+        page = product_requests.page_body(items, next_state, errors)
+        if listing.explain:
+            page['query_stats'] = explain_product_query(targets, listing.base_filter, listing.sort_field,
+                                                        listing.direction, listing.limit)
+        # Las paginas parciales (algun shard caido) no se cachean ni llevan ETag
+        elif not errors:
+            product_cache.put_page(page_key, (etag, page), cache_token)
+        else:
+            etag = None
+        return etag_response(page, etag)
+    except InvalidCursor as ic:
+        return jsonify({'message': str(ic)}), 400
+    except ShardUnavailable as su:
+        return jsonify({'message': str(su), 'unavailable_shards': su.errors}), 503
     except Exception as e:
         return jsonify({'message': f'Error al listar productos: {str(e)}'}), 500
 
+def explain_product_query(targets, query, sort_field, direction, limit):
+    """Plan y estadisticas de recorrido por shard de una consulta del listado"""
+    def explain(collection):
+        return collection.find(query).sort(pagination.sort_spec(sort_field, direction)).limit(limit + 1).explain()
+    
+    result = shard_executor.gather(targets, explain)
+    return product_requests.explain_stats(result.results, result.errors, query, sort_field, app.logger)
+
+# READ - Exportar el catalogo completo en streaming (NDJSON o CSV)
+@app.route('/products/export', methods=['GET'])
+def export_products():
+    # Verificar autenticacion
+    auth_response = verify_token()
+    if auth_response:
+        return auth_response
+    
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'message': 'Formato no soportado. Opciones: ndjson, csv'}), 400
+    try:
+        fields = catalog_export.parse_fields(request.args.get('fields'))
+        batch_size = pagination.parse_limit(request.args.get('batch_size'),
+                                            default=catalog_export.DEFAULT_BATCH_SIZE, maximum=5000)
+    except ValueError as ve:
+        return jsonify({'message': str(ve)}), 400
+    
+    if export_format == 'csv':
+        body = catalog_export.iter_csv(read_router.targets('export_products'), fields, batch_size, NOT_MIGRATING)
+        mimetype = 'text/csv'
+    else:
+        body = catalog_export.iter_ndjson(read_router.targets('export_products'), fields, batch_size, NOT_MIGRATING)
+        mimetype = 'application/x-ndjson'
+    
+    filename = f"productos_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{export_format}"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+# READ - Buscar productos por prefijo del nombre (solo en los shards posibles)
+@app.route('/products/search', methods=['GET'])
+def search_products():
+    # Verificar autenticacion
+    auth_response = verify_token()
+    if auth_response:
+        return auth_response
+    
+    try:
+        search = product_requests.SearchQuery(request.args)
+    except ValueError as ve:
+        return jsonify({'message': str(ve)}), 400
+    
+    # Con fragmentacion por rango solo se consultan los shards que pueden tener el prefijo
+    targets = search.targets(shard_router, read_router)
+    
+    try:
+        if search.output_format == 'ndjson':
+            matches, errors = product_search.iter_matches(
+                targets, search.query, search.limit,
+                batch_size=min(search.limit, catalog_export.DEFAULT_BATCH_SIZE), executor=shard_executor
+            )
+            product_requests.require_any(targets, errors)
+            return Response(
+                stream_with_context(catalog_export.ndjson_chunks(matches, product_search.DEFAULT_LIMIT)),
+                mimetype='application/x-ndjson',
+                headers={'X-Searched-Shards': ','.join(name for name, _ in targets),
+                         'X-Unavailable-Shards': ','.join(errors)}
+            )
+        
+        items, next_state, errors = pagination.fetch_page(
+            targets, search.limit, product_search.NAME_FIELD, 1, search.cursor_state,
+            base_filter=search.query, executor=shard_executor, query_key=search.query_key
+        )
+        product_requests.require_any(targets, errors)
+        return jsonify(product_requests.page_body(
+            items, next_state, errors, searched_shards=[name for name, _ in targets]
+        )), 200
+    except InvalidCursor as ic:
+        return jsonify({'message': str(ic)}), 400
+    except ShardUnavailable as su:
+        return jsonify({'message': str(su), 'unavailable_shards': su.errors}), 503
+    except Exception as e:
+        return jsonify({'message': f'Error al buscar productos: {str(e)}'}), 500
+
 # READ - Obtener un producto por ID
 @app.route('/products/<product_id>', methods=['GET'])
 def get_product(product_id):
@@ -134,20 +545,25 @@ def get_product(product_id):
         return auth_response
     
     try:
-        # Buscar en ambas bases de datos
-        product = products_collection_db1.find_one({'_id': ObjectId(product_id)})
-        database = 'DB1'
-        
-        if not product:
-            product = products_collection_db2.find_one({'_id': ObjectId(product_id)})
-            database = 'DB2'
-        
-        if not product:
-            return jsonify({'message': 'Producto no encontrado'}), 404
+        _, object_id = parse_public_id(product_id)
+        product = product_cache.get_product(object_id)
+        if product is None:
+            cache_token = product_cache.token()
+            # El prefijo del ID indica el shard; los IDs antiguos se buscan en todos
+            database, _, product = locate_product(product_id)
+            
+            if not product:
+                return jsonify({'message': 'Producto no encontrado'}), 404
+            
+            product_cache.put_product(object_id, product_requests.present_product(database, product), cache_token)
         
-        product['_id'] = str(product['_id'])
-        product['database'] = database
-        return jsonify(product), 200
+        # El ETag sale de la version y updated_at, sin serializar el cuerpo
+        etag = etags.product_etag(product['_id'], product.get(etags.VERSION_FIELD), product.get('updated_at'))
+        return etag_response(product, etag)
+    except InvalidId:
+        return jsonify({'message': 'ID de producto invalido'}), 400
+    except ShardUnavailable as su:
+        return jsonify({'message': str(su), 'unavailable_shards': su.errors}), 503
     except Exception as e:
         return jsonify({'message': f'Error al obtener producto: {str(e)}'}), 500
 
@@ -160,43 +576,116 @@ def create_product():
         return auth_response
     
     try:
-        data = request.get_json()
-        
-        # Validar campos requeridos
-        required_fields = ['name', 'price', 'stock']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'message': f'Campo requerido: {field}'}), 400
-        
-        # Crear el nuevo producto (sin ID, MongoDB lo genera automáticamente)
-        new_product = {
-            'name': data['name'],
-            'description': data.get('description', ''),
-            'price': float(data['price']),
-            'stock': int(data['stock']),
-            'category': data.get('category', 'General'),
-            'created_at': datetime.utcnow(),
-            'updated_at': datetime.utcnow()
-        }
+        # Validar campos requeridos (sin ID, MongoDB lo genera automáticamente)
+        new_product = product_requests.new_product(request.get_json(silent=True), datetime.utcnow())
         
         # Determinar en que base de datos guardar basado en el nombre
-        target_db, db_label = get_database_for_product(data['name'])
-        result = target_db.insert_one(new_product)
+        shard, db_label = get_database_for_new_product(new_product['name'])
+        shard.collection.insert_one(new_product)
+        product_written(shard)
         
-        new_product['_id'] = str(result.inserted_id)
-        new_product['created_at'] = new_product['created_at'].isoformat()
-        new_product['updated_at'] = new_product['updated_at'].isoformat()
-        new_product['database'] = db_label
-        
-        return jsonify({
-            'message': f'Producto creado exitosamente en {db_label}',
-            'product': new_product
-        }), 201
+        return jsonify(product_requests.created_body(new_product, shard.name, db_label)), 201
+    except DuplicateKeyError:
+        return jsonify({'message': 'Ya existe un producto con ese nombre'}), 409
     except ValueError as ve:
         return jsonify({'message': str(ve)}), 400
     except Exception as e:
         return jsonify({'message': f'Error al crear producto: {str(e)}'}), 500
 
+# CREATE/UPSERT - Importacion masiva de productos (arreglo JSON o NDJSON)
+@app.route('/products/bulk', methods=['POST'])
+def bulk_products():
+    # Verificar autenticacion (una sola vez para todo el lote)
+    auth_response = verify_token()
+    if auth_response:
+        return auth_response
+    
+    mode = request.args.get('mode', 'insert').lower()
+    if mode not in ('insert', 'upsert'):
+        return jsonify({'message': 'Modo no soportado. Opciones: insert, upsert'}), 400
+    ndjson = request.mimetype == 'application/x-ndjson' or request.args.get('format', '').lower() == 'ndjson'
+    try:
+        rows = product_bulk.parse_rows(request.get_data(), ndjson=ndjson, max_rows=BULK_MAX_ROWS)
+    except product_bulk.BulkTooLarge as e:
+        return jsonify({'message': str(e)}), 413
+    except product_bulk.BulkRequestError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    try:
+        # Validar y asignar shard en una sola pasada
+        now = datetime.utcnow()
+        results = []
+        routed = []
+        seen_keys = {}
+        for index, row in enumerate(rows):
+            try:
+                document = product_bulk.validate_row(row, now)
+                shard, _ = get_database_for_product(document['name'])
+            except ValueError as ve:
+                results.append({'row': index, 'status': 'error', 'message': str(ve)})
+                continue
+            if mode == 'upsert':
+                # La clave natural es el nombre normalizado: una fila por clave
+                key = document[product_search.NAME_FIELD]
+                if key in seen_keys:
+                    results.append({'row': index, 'status': 'error',
+                                    'message': f'Nombre repetido en la fila {seen_keys[key]}'})
+                    continue
+                seen_keys[key] = index
+            routed.append((index, document, shard))
+        
+        # Los nombres que el enrutado anterior dejo en otro shard se escriben alli
+        legacy = product_bulk.legacy_placements(shard_router, [document for _, document, _ in routed])
+        # Un producto migrandose de shard no se toca: el upsert crearia otra copia
+        migrating = product_bulk.migrating_keys(
+            shard_router.shards, {document[product_search.NAME_FIELD] for _, document, _ in routed}
+        ) if mode == 'upsert' else set()
+        by_shard = {}
+        for index, document, shard in routed:
+            if document[product_search.NAME_FIELD] in migrating:
+                results.append({'row': index, 'status': 'error',
+                                'message': 'El producto se esta migrando de shard, intente de nuevo'})
+                continue
+            shard = legacy.get(document[product_search.NAME_FIELD], shard)
+            by_shard.setdefault(shard.name, (shard, []))[1].append((index, document))
+        
+        # Un lote desordenado por shard, todos los shards a la vez
+        writer = product_bulk.upsert_rows if mode == 'upsert' else product_bulk.insert_rows
+        gathered = shard_executor.gather(
+            list(by_shard.items()),
+            lambda target: writer(target[0], target[1], BULK_BATCH_SIZE),
+            timeout=BULK_TIMEOUT
+        )
+        for name, shard_results in gathered.results.items():
+            results.extend(shard_results)
+        for name, error in gathered.errors.items():
+            # Sin respuesta del shard no se sabe que filas se guardaron
+            if error == 'timeout':
+                results.extend(product_bulk.unknown(index, name, 'El shard no respondio a tiempo')
+                               for index, _ in by_shard[name][1])
+            else:
+                results.extend({'row': index, 'status': 'error', 'database': name,
+                                'message': f'Shard no disponible: {error}'}
+                               for index, _ in by_shard[name][1])
+        # Tambien los shards sin respuesta: pudieron escribir parte del lote
+        for shard, _ in by_shard.values():
+            product_written(shard)
+        
+        results.sort(key=lambda result: result['row'])
+        summary = {status: sum(1 for r in results if r['status'] == status)
+                   for status in ('created', 'updated', 'error', 'unknown')}
+        return jsonify({
+            'message': f"Importacion completada: {summary['created']} creados, "
+                       f"{summary['updated']} actualizados, {summary['error']} con error, "
+                       f"{summary['unknown']} sin confirmar",
+            'mode': mode,
+            'total': len(rows),
+            'summary': summary,
+            'results': results
+        }), 200
+    except Exception as e:
+        return jsonify({'message': f'Error en la importacion masiva: {str(e)}'}), 500
+
 # UPDATE - Actualizar un producto
 @app.route('/products/<product_id>', methods=['PUT'])
 def update_product(product_id):
@@ -206,53 +695,266 @@ def update_product(product_id):
         return auth_response
     
     try:
-        data = request.get_json()
+        try:
+            update_data = product_requests.product_updates(request.get_json(silent=True), datetime.utcnow())
+        except ValueError as ve:
+            return jsonify({'message': str(ve)}), 400
         
-        # Buscar el producto en ambas bases de datos
-        product = products_collection_db1.find_one({'_id': ObjectId(product_id)})
-        target_db = products_collection_db1
+        tag, object_id = parse_public_id(product_id)
+        shard = shard_router.get(tag)
+        if shard is None:
+            # ID antiguo: buscar el producto en ambas bases de datos a la vez
+            database, _, product = find_product_shard({'_id': object_id}, {'_id': 1}, 'update_product')
+            if not product:
+                return jsonify({'message': 'Producto no encontrado'}), 404
+            shard = shard_router.get(database)
         
-        if not product:
-            product = products_collection_db2.find_one({'_id': ObjectId(product_id)})
-            target_db = products_collection_db2
+        # Si el nuevo nombre corresponde a otro shard, el producto se migra
+        target_shard, target_label = get_database_for_product(update_data['name']) if 'name' in update_data \
+            else (None, None)
+        # If-Match: solo se actualiza si el producto sigue en la version que vio el cliente
+        if_match = request.if_match if request.headers.get('If-Match') else None
         
-        if not product:
+        for _ in range(2):
+            guard = {}
+            if if_match is not None:
+                current = shard.collection.find_one({'_id': object_id}, {etags.VERSION_FIELD: 1, 'updated_at': 1})
+                if current is not None:
+                    current_etag = etags.product_etag(public_id(shard.name, object_id),
+                                                      current.get(etags.VERSION_FIELD), current.get('updated_at'))
+                    if not etags.match(if_match, current_etag):
+                        return jsonify({'message': 'El producto fue modificado por otra peticion',
+                                        'etag': current_etag}), 412
+                    # La misma condicion viaja en la escritura para cerrar la carrera
+                    guard = {etags.VERSION_FIELD: current.get(etags.VERSION_FIELD),
+                             'updated_at': current.get('updated_at')}
+            if target_shard is not None and target_shard is not shard:
+                relocated = relocate(shard, target_shard, object_id, update_data, expected=guard)
+                if relocated is not None:
+                    product_cache.invalidate(object_id)
+                    relocated.pop(product_search.NAME_FIELD, None)
+                    relocated['_id'] = public_id(target_shard.name, relocated['_id'])
+                    relocated['database'] = target_shard.name
+                    response = jsonify({
+                        'message': f'Producto actualizado y movido a {target_label}',
+                        'product': relocated,
+                        'relocated_from': shard.name
+                    })
+                    response.set_etag(etags.product_etag(relocated['_id'], relocated.get(etags.VERSION_FIELD),
+                                                         relocated.get('updated_at')))
+                    return response, 200
+            else:
+                result = shard.collection.update_one(
+                    {**guard, '_id': object_id, **NOT_MIGRATING},
+                    {'$set': update_data, '$inc': {etags.VERSION_FIELD: 1}}
+                )
+                if result.matched_count > 0:
+                    product_written(shard, object_id)
+                    break
+            if guard and shard.collection.count_documents({'_id': object_id, **NOT_MIGRATING}, limit=1):
+                return jsonify({'message': 'El producto fue modificado por otra peticion'}), 412
+            # No esta en este shard: pudo haberse migrado (redireccion) o estar migrandose
+            moved_to = find_redirect(shard_router, shard, object_id)
+            if moved_to is None:
+                if shard.collection.count_documents({'_id': object_id}, limit=1):
+                    return jsonify({'message': 'El producto se esta migrando de shard, intente de nuevo'}), 409
+                return jsonify({'message': 'Producto no encontrado'}), 404
+            shard = moved_to
+        else:
             return jsonify({'message': 'Producto no encontrado'}), 404
         
-        # Actualizar campos
-        update_data = {
-            'updated_at': datetime.utcnow()
-        }
-        
-        if 'name' in data:
-            update_data['name'] = data['name']
-        if 'description' in data:
-            update_data['description'] = data['description']
-        if 'price' in data:
-            update_data['price'] = float(data['price'])
-        if 'stock' in data:
-            update_data['stock'] = int(data['stock'])
-        if 'category' in data:
-            update_data['category'] = data['category']
-        
-        result = target_db.update_one(
-            {'_id': ObjectId(product_id)},
-            {'$set': update_data}
-        )
-        
+        database, target_db = shard.name, shard.collection
         if result.modified_count > 0:
-            updated_product = target_db.find_one({'_id': ObjectId(product_id)})
-            updated_product['_id'] = str(updated_product['_id'])
-            updated_product['database'] = 'DB1' if target_db == products_collection_db1 else 'DB2'
-            return jsonify({
+            updated_product = target_db.find_one({'_id': object_id}, {product_search.NAME_FIELD: 0})
+            updated_product['_id'] = public_id(database, updated_product['_id'])
+            updated_product['database'] = database
+            response = jsonify({
                 'message': 'Producto actualizado exitosamente',
                 'product': updated_product
-            }), 200
+            })
+            response.set_etag(etags.product_etag(updated_product['_id'], updated_product.get(etags.VERSION_FIELD),
+                                                 updated_product.get('updated_at')))
+            return response, 200
         else:
             return jsonify({'message': 'No se realizaron cambios'}), 200
+    except DuplicateKeyError:
+        return jsonify({'message': 'Ya existe un producto con ese nombre'}), 409
+    except MigrationError as me:
+        return jsonify({'message': str(me)}), 503
+    except InvalidId:
+        return jsonify({'message': 'ID de producto invalido'}), 400
+    except ShardUnavailable as su:
+        return jsonify({'message': str(su), 'unavailable_shards': su.errors}), 503
     except Exception as e:
         return jsonify({'message': f'Error al actualizar producto: {str(e)}'}), 500
 
+# UPDATE - Ajustar el stock de un producto con un $inc atomico
+@app.route('/products/<product_id>/stock', methods=['PATCH'])
+def adjust_product_stock(product_id):
+    # Verificar autenticacion
+    auth_response = verify_token()
+    if auth_response:
+        return auth_response
+    
+    try:
+        try:
+            delta = product_requests.stock_delta(request.get_json(silent=True))
+        except ValueError as ve:
+            return jsonify({'message': str(ve)}), 400
+        
+        now = datetime.utcnow()
+        tag, object_id = parse_public_id(product_id)
+        shard = shard_router.get(tag)
+        if shard is not None:
+            # Una sola operacion condicional en el shard indicado por el ID
+            product = inventory.adjust_stock(shard.collection, object_id, delta, now)
+            if product is None:
+                moved_to = find_redirect(shard_router, shard, object_id)
+                if moved_to is not None:
+                    shard = moved_to
+                    product = inventory.adjust_stock(shard.collection, object_id, delta, now)
+            database = shard.name
+        else:
+            # ID antiguo: el ajuste condicional se envia a todos; solo el duenio coincide
+            database, product, result = shard_executor.first(
+                PRODUCT_SHARDS, lambda collection: inventory.adjust_stock(collection, object_id, delta, now)
+            )
+            if product is None and result.partial:
+                raise ShardUnavailable(result.errors)
+        
+        if product is None:
+            # Camino de error: distinguir entre inexistente, en migracion y sin stock
+            _, _, current = locate_product(product_id, {'stock': 1, MIGRATING_FIELD: 1})
+            if not current:
+                return jsonify({'message': 'Producto no encontrado'}), 404
+            if current.get(MIGRATING_FIELD):
+                return jsonify({'message': 'El producto se esta migrando de shard, intente de nuevo'}), 409
+            return jsonify({
+                'message': 'Stock insuficiente',
+                'requested': -delta,
+                'available': current.get('stock', 0)
+            }), 409
+        
+        product_written(shard_router.get(database), object_id)
+        product['_id'] = public_id(database, product['_id'])
+        product['database'] = database
+        return jsonify({'message': 'Stock actualizado exitosamente', 'product': product}), 200
+    except InvalidId:
+        return jsonify({'message': 'ID de producto invalido'}), 400
+    except ShardUnavailable as su:
+        return jsonify({'message': str(su), 'unavailable_shards': su.errors}), 503
+    except Exception as e:
+        return jsonify({'message': f'Error al ajustar el stock: {str(e)}'}), 500
+
+# UPDATE - Reservar (descontar) el stock de varios productos de forma todo-o-nada
+@app.route('/products/stock/reserve', methods=['POST'])
+def reserve_stock():
+    # Verificar autenticacion
+    auth_response = verify_token()
+    if auth_response:
+        return auth_response
+    
+    try:
+        data = request.get_json() or {}
+        items = data.get('items')
+        if not isinstance(items, list) or not items:
+            return jsonify({'message': 'Campo requerido: items (lista de {product_id, quantity})'}), 400
+        
+        # Agrupar por shard sumando las cantidades de productos repetidos
+        by_shard = {}
+        for item in items:
+            try:
+                product_id = item['product_id']
+                quantity = int(item['quantity'])
+            except (KeyError, TypeError, ValueError):
+                return jsonify({'message': 'Cada item requiere product_id y quantity (entero)'}), 400
+            if quantity < 1:
+                return jsonify({'message': 'quantity debe ser mayor que 0'}), 400
+            tag, object_id = parse_public_id(product_id)
+            shard = shard_router.get(tag)
+            if shard is None:
+                # ID antiguo sin prefijo: localizar su shard
+                database, _, product = locate_product(product_id, {'_id': 1})
+                if not product:
+                    return jsonify({'message': f'Producto no encontrado: {product_id}'}), 404
+                shard = shard_router.get(database)
+            quantities = by_shard.setdefault(shard.name, {})
+            quantities[object_id] = quantities.get(object_id, 0) + quantity
+        
+        now = datetime.utcnow()
+        # El id permite compensar cada shard aunque no haya respondido a tiempo
+        reservation_id = ObjectId()
+        def reserve(name):
+            try:
+                shard_reservations[name].reserve(reservation_id, list(by_shard[name].items()), now)
+            except inventory.InsufficientStock as e:
+                return e
+            return None
+        
+        # Una transaccion por shard, todos los shards a la vez
+        result = shard_executor.gather([(name, name) for name in by_shard], reserve, timeout=RESERVE_TIMEOUT)
+        reserved = [name for name, outcome in result.results.items() if outcome is None]
+        shortages = [outcome for outcome in result.results.values() if outcome is not None]
+        
+        pending_release = []
+        if shortages or result.errors:
+            # Compensar todos los shards salvo los que rechazaron la reserva:
+            # un shard que excedio el tiempo pudo confirmar despues, y si aun
+            # no lo hizo la marca de cancelacion impide que lo haga
+            for name in by_shard:
+                if result.results.get(name) is not None:
+                    continue
+                try:
+                    shard_reservations[name].release(reservation_id, now)
+                except PyMongoError as e:
+                    release_retrier.add(name, reservation_id, e)
+                    pending_release.append(name)
+        else:
+            for name in by_shard:
+                try:
+                    shard_reservations[name].confirm(reservation_id)
+                except PyMongoError as e:
+                    # Solo informativo: la reserva ya esta aplicada
+                    app.logger.warning(f"No se pudo confirmar la reserva {reservation_id} en {name}: {e}")
+        for quantities in by_shard.values():
+            for object_id in quantities:
+                product_cache.invalidate(object_id)
+        
+        if shortages or result.errors:
+            if shortages:
+                return jsonify({
+                    'message': 'Stock insuficiente; no se reservo ningun producto',
+                    'reservation_id': str(reservation_id),
+                    'insufficient': [
+                        {**shortage, '_id': public_id(name, shortage['_id'])}
+                        for name, outcome in result.results.items() if outcome is not None
+                        for shortage in outcome.items
+                    ],
+                    'pending_release': pending_release
+                }), 409
+            return jsonify({
+                'message': 'No se pudo completar la reserva en todos los shards',
+                'reservation_id': str(reservation_id),
+                'unavailable_shards': result.errors,
+                'released_shards': [name for name in by_shard if name not in pending_release
+                                    and result.results.get(name) is None],
+                'pending_release': pending_release
+            }), 503
+        
+        return jsonify({
+            'message': 'Reserva completada',
+            'reserved': [
+                {'_id': public_id(name, object_id), 'quantity': quantity}
+                for name, quantities in by_shard.items() for object_id, quantity in quantities.items()
+            ]
+        }), 200
+    except InvalidId:
+        return jsonify({'message': 'ID de producto invalido'}), 400
+    except ShardUnavailable as su:
+        return jsonify({'message': str(su), 'unavailable_shards': su.errors}), 503
+    except Exception as e:
+        return jsonify({'message': f'Error al reservar stock: {str(e)}'}), 500
+
 # DELETE - Eliminar un producto
 @app.route('/products/<product_id>', methods=['DELETE'])
 def delete_product(product_id):
@@ -262,25 +964,83 @@ def delete_product(product_id):
         return auth_response
     
     try:
-        # Intentar eliminar de DB1
-        result = products_collection_db1.delete_one({'_id': ObjectId(product_id)})
-        database = 'DB1'
-        
-        # Si no se encontro en DB1, intentar en DB2
-        if result.deleted_count == 0:
-            result = products_collection_db2.delete_one({'_id': ObjectId(product_id)})
-            database = 'DB2'
+        tag, object_id = parse_public_id(product_id)
+        shard = shard_router.get(tag)
+        if shard is not None:
+            # El ID indica el shard: una sola operacion en un solo shard
+            deleted_count = shard.collection.delete_one({'_id': object_id}).deleted_count
+            if not deleted_count:
+                # Seguir la redireccion si el producto se migro de shard
+                shard = find_redirect(shard_router, shard, object_id)
+                deleted_count = shard.collection.delete_one({'_id': object_id}).deleted_count if shard else 0
+            deleted_from = [shard.name] if deleted_count else []
+        else:
+            # ID antiguo: eliminar en ambas bases de datos a la vez (solo una lo tiene)
+            result = shard_executor.gather(
+                PRODUCT_SHARDS, lambda collection: collection.delete_one({'_id': object_id}).deleted_count
+            )
+            deleted_from = [shard for shard, count in result.results.items() if count]
+            if not deleted_from and result.partial:
+                raise ShardUnavailable(result.errors)
         
-        if result.deleted_count == 0:
+        if not deleted_from:
             return jsonify({'message': 'Producto no encontrado'}), 404
+        product_written(shard_router.get(deleted_from[0]), object_id)
         
         return jsonify({
             'message': 'Producto eliminado exitosamente',
-            'deleted_from': database
+            'deleted_from': deleted_from[0]
         }), 200
+    except InvalidId:
+        return jsonify({'message': 'ID de producto invalido'}), 400
+    except ShardUnavailable as su:
+        return jsonify({'message': str(su), 'unavailable_shards': su.errors}), 503
     except Exception as e:
         return jsonify({'message': f'Error al eliminar producto: {str(e)}'}), 500
 
+# ============ REBALANCEO DE SHARDS ============
+
+# Iniciar la redistribucion de productos tras un cambio del mapa de shards
+@app.route('/admin/rebalance', methods=['POST'])
+def start_rebalance():
+    # Verificar autenticacion
+    auth_response = verify_token()
+    if auth_response:
+        return auth_response
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        batch_size = int(data.get('batch_size', 200))
+        pause = float(data.get('pause', 0.5))
+    except (TypeError, ValueError):
+        return jsonify({'message': 'batch_size y pause deben ser numericos'}), 400
+    if batch_size < 1 or pause < 0:
+        return jsonify({'message': 'batch_size debe ser mayor que 0 y pause no negativo'}), 400
+    
+    if not rebalancer.start(batch_size, pause, bool(data.get('dry_run', False))):
+        return jsonify({'message': 'Ya hay un rebalanceo en curso', 'status': rebalancer.status}), 409
+    return jsonify({'message': 'Rebalanceo iniciado', 'status': rebalancer.status}), 202
+
+# Estado del rebalanceo
+@app.route('/admin/rebalance', methods=['GET'])
+def rebalance_status():
+    # Verificar autenticacion
+    auth_response = verify_token()
+    if auth_response:
+        return auth_response
+    # Incluye el ultimo barrido de migraciones interrumpidas
+    return jsonify({**rebalancer.status, 'migration_recovery': migration_sweeper.last_report}), 200
+
+# Detener el rebalanceo al terminar el lote actual
+@app.route('/admin/rebalance', methods=['DELETE'])
+def stop_rebalance():
+    # Verificar autenticacion
+    auth_response = verify_token()
+    if auth_response:
+        return auth_response
+    rebalancer.stop()
+    return jsonify({'message': 'Deteniendo rebalanceo', 'status': rebalancer.status}), 200
+
 # Ruta documentacion API
 @app.route('/docs', methods=['GET'])
 def api_docs():
@@ -290,55 +1050,122 @@ def api_docs():
         'description': 'Servicio RESTful para gestión de productos con fragmentación distribuida por nombre',
         'base_url': request.host_url.rstrip('/'),
         'authentication': 'Se requiere token JWT en el header Authorization (Bearer token)',
-        'database_distribution': {
-            'DB1 (A-M)': 'Productos cuyo nombre comienza con letras A-M',
-            'DB2 (N-Z)': 'Productos cuyo nombre comienza con letras N-Z'
-        },
+        'database_distribution': shard_router.describe(),
         'endpoints': [
             {
                 'path': '/products',
                 'method': 'GET',
                 'title': 'Listar Productos',
-                'description': 'Obtiene todos los productos de ambas bases de datos',
+                'description': 'Obtiene una página de productos de ambas bases de datos, ordenada y combinada entre shards. Para la siguiente página se envía next_cursor en el parámetro after. La respuesta incluye un ETag que cambia con cualquier escritura en los shards',
                 'authentication': True,
                 'headers': {
-                    'Authorization': 'Bearer <token>'
+                    'Authorization': 'Bearer <token>',
+                    'If-None-Match': 'string (opcional) - ETag de una respuesta anterior; si no hubo cambios se responde 304'
+                },
+                'query_params': {
+                    'limit': 'number (opcional, 1-500, por defecto 50)',
+                    'sort': 'string (opcional) - name, price, stock, created_at o updated_at; prefijo - para orden descendente',
+                    'after': 'string (opcional) - cursor opaco devuelto en next_cursor',
+                    'category': 'string (opcional) - categoría exacta',
+                    'min_price': 'number (opcional) - precio mínimo',
+                    'max_price': 'number (opcional) - precio máximo',
+                    'stock_lt': 'number (opcional) - productos con stock menor a este valor',
+                    'updated_since': 'string (opcional) - fecha ISO 8601 de última actualización',
+                    'explain': 'boolean (opcional) - incluye el plan de consulta y los documentos examinados por shard'
                 },
                 'responses': [
                     {'code': '200', 'description': 'Lista de productos obtenida exitosamente'},
+                    {'code': '304', 'description': 'La página no cambió desde el ETag enviado'},
                     {'code': '401', 'description': 'Token no proporcionado o inválido'}
                 ],
                 'response_example': '''{
   "count": 2,
   "products": [
     {
-      "_id": "673a1b2c3d4e5f6g7h8i9j0k",
+      "_id": "db1-673a1b2c3d4e5f6a7b8c9d0e",
       "name": "Manzana",
       "description": "Fruta fresca",
       "price": 2.5,
       "stock": 100,
       "category": "Frutas",
-      "database": "DB1 (A-M)"
+      "database": "DB1"
     }
-  ]
+  ],
+  "next_cursor": "eyJzb3J0IjoibmFtZSIsInBvcyI6ey4uLn19",
+  "has_more": true
+}'''
+            },
+            {
+                'path': '/products/export',
+                'method': 'GET',
+                'title': 'Exportar Catálogo',
+                'description': 'Descarga el catálogo completo de ambas bases de datos en streaming (memoria constante)',
+                'authentication': True,
+                'headers': {
+                    'Authorization': 'Bearer <token>'
+                },
+                'query_params': {
+                    'format': 'string (opcional) - ndjson (por defecto) o csv',
+                    'fields': 'string (opcional) - campos separados por comas',
+                    'batch_size': 'number (opcional, por defecto 1000) - documentos por lote'
+                },
+                'responses': [
+                    {'code': '200', 'description': 'Archivo NDJSON o CSV transmitido por bloques'},
+                    {'code': '400', 'description': 'Formato o campos no válidos'},
+                    {'code': '401', 'description': 'Token no proporcionado o inválido'}
+                ],
+                'response_example': '''{"_id": "db1-673a1b2c3d4e5f6a7b8c9d0e", "name": "Manzana", "price": 2.5, "stock": 100, "database": "DB1"}
+{"_id": "db2-673a1b2c3d4e5f6a7b8c9d0f", "name": "Pera", "price": 3.0, "stock": 80, "database": "DB2"}'''
+            },
+            {
+                'path': '/products/search',
+                'method': 'GET',
+                'title': 'Buscar Productos por Prefijo',
+                'description': 'Busca productos cuyo nombre empieza por un prefijo (sin distinguir mayúsculas ni acentos). Solo se consultan los shards cuyo rango de nombres puede contener coincidencias y los resultados se devuelven ordenados por nombre',
+                'authentication': True,
+                'headers': {
+                    'Authorization': 'Bearer <token>'
+                },
+                'query_params': {
+                    'prefix': 'string (requerido) - inicio del nombre',
+                    'limit': 'number (opcional, por defecto 20; hasta 500 en json y 5000 en ndjson)',
+                    'after': 'string (opcional) - cursor devuelto en next_cursor (solo json)',
+                    'format': 'string (opcional) - json (por defecto) o ndjson en streaming'
+                },
+                'responses': [
+                    {'code': '200', 'description': 'Productos encontrados, ordenados por nombre'},
+                    {'code': '400', 'description': 'Prefijo, límite o cursor no válidos'},
+                    {'code': '401', 'description': 'Token no proporcionado o inválido'},
+                    {'code': '503', 'description': 'Ningún shard consultado respondió'}
+                ],
+                'response_example': '''{
+  "count": 1,
+  "products": [
+    {"_id": "db1-673a1b2c3d4e5f6a7b8c9d0e", "name": "Manzana", "price": 2.5, "stock": 100, "database": "DB1"}
+  ],
+  "next_cursor": null,
+  "has_more": false,
+  "searched_shards": ["DB1"]
 }'''
             },
             {
                 'path': '/products/<id>',
                 'method': 'GET',
                 'title': 'Obtener Producto',
-                'description': 'Obtiene un producto específico por su ID',
+                'description': 'Obtiene un producto específico por su ID. El prefijo del ID (db1-, db2-) indica el shard y evita consultar los demás; los ObjectId sin prefijo se buscan en todos',
                 'authentication': True,
                 'headers': {
-                    'Authorization': 'Bearer <token>'
+                    'Authorization': 'Bearer <token>',
+                    'If-None-Match': 'string (opcional) - ETag de una respuesta anterior; si no hubo cambios se responde 304'
                 },
                 'responses': [
                     {'code': '200', 'description': 'Producto encontrado'},
+                    {'code': '304', 'description': 'El producto no cambió desde el ETag enviado'},
                     {'code': '404', 'description': 'Producto no encontrado'},
                     {'code': '401', 'description': 'Token no proporcionado o inválido'}
                 ],
                 'response_example': '''{
-  "_id": "673a1b2c3d4e5f6g7h8i9j0k",
+  "_id": "db2-673a1b2c3d4e5f6a7b8c9d0e",
   "name": "Pera",
   "description": "Fruta dulce",
   "price": 3.0,
@@ -379,7 +1206,7 @@ def api_docs():
                 'response_example': '''{
   "message": "Producto creado exitosamente en DB2 (N-Z)",
   "product": {
-    "_id": "673a1b2c3d4e5f6g7h8i9j0k",
+    "_id": "db2-673a1b2c3d4e5f6a7b8c9d0e",
     "name": "Naranja",
     "description": "Fruta cítrica",
     "price": 1.8,
@@ -387,17 +1214,56 @@ def api_docs():
     "category": "Frutas",
     "database": "DB2 (N-Z)"
   }
+}'''
+            },
+            {
+                'path': '/products/bulk',
+                'method': 'POST',
+                'title': 'Importación Masiva de Productos',
+                'description': 'Crea o actualiza muchos productos en una sola petición. Las filas se validan, se agrupan por shard y cada shard recibe lotes en paralelo. El resultado se informa fila por fila',
+                'authentication': True,
+                'headers': {
+                    'Authorization': 'Bearer <token>',
+                    'Content-Type': 'application/json o application/x-ndjson'
+                },
+                'query_params': {
+                    'mode': 'string (opcional) - insert (por defecto) o upsert por nombre normalizado',
+                    'format': 'string (opcional) - ndjson si el cuerpo tiene un producto por línea'
+                },
+                'request': {
+                    'body': 'array (requerido) - productos con los mismos campos que Crear Producto, o un producto por línea en NDJSON'
+                },
+                'responses': [
+                    {'code': '200', 'description': 'Resultado por fila (created, updated o error)'},
+                    {'code': '400', 'description': 'Cuerpo o modo no válidos'},
+                    {'code': '401', 'description': 'Token no proporcionado o inválido'},
+                    {'code': '413', 'description': 'Se superó el máximo de filas por petición'}
+                ],
+                'example': '''[
+  {"name": "Manzana", "price": 2.5, "stock": 100, "category": "Frutas"},
+  {"name": "Pera", "price": 3.0, "stock": 80}
+]''',
+                'response_example': '''{
+  "message": "Importacion completada: 1 creados, 1 actualizados, 0 con error",
+  "mode": "upsert",
+  "total": 2,
+  "summary": {"created": 1, "updated": 1, "error": 0},
+  "results": [
+    {"row": 0, "status": "updated", "database": "DB1", "_id": "db1-673a1b2c3d4e5f6a7b8c9d0e"},
+    {"row": 1, "status": "created", "database": "DB2", "_id": "db2-673a1b2c3d4e5f6a7b8c9d0f"}
+  ]
 }'''
             },
             {
                 'path': '/products/<id>',
                 'method': 'PUT',
                 'title': 'Actualizar Producto',
-                'description': 'Actualiza los datos de un producto existente',
+                'description': 'Actualiza los datos de un producto existente. Con If-Match solo se aplica si el producto no cambió desde que el cliente lo leyó',
                 'authentication': True,
                 'headers': {
                     'Authorization': 'Bearer <token>',
-                    'Content-Type': 'application/json'
+                    'Content-Type': 'application/json',
+                    'If-Match': 'string (opcional) - ETag obtenido al leer el producto'
                 },
                 'request': {
                     'name': 'string (opcional)',
@@ -409,6 +1275,7 @@ def api_docs():
                 'responses': [
                     {'code': '200', 'description': 'Producto actualizado exitosamente'},
                     {'code': '404', 'description': 'Producto no encontrado'},
+                    {'code': '412', 'description': 'El producto cambió desde el ETag enviado en If-Match'},
                     {'code': '401', 'description': 'Token no proporcionado o inválido'}
                 ],
                 'example': '''{
@@ -418,11 +1285,71 @@ def api_docs():
                 'response_example': '''{
   "message": "Producto actualizado exitosamente",
   "product": {
-    "_id": "673a1b2c3d4e5f6g7h8i9j0k",
+    "_id": "db2-673a1b2c3d4e5f6a7b8c9d0e",
     "name": "Naranja",
     "price": 2.0,
     "stock": 200
   }
+}'''
+            },
+            {
+                'path': '/products/<id>/stock',
+                'method': 'PATCH',
+                'title': 'Ajustar Stock',
+                'description': 'Suma o resta unidades al stock con una sola operación atómica. Un descuento solo se aplica si el stock no queda negativo, por lo que compras concurrentes no pierden actualizaciones',
+                'authentication': True,
+                'headers': {
+                    'Authorization': 'Bearer <token>',
+                    'Content-Type': 'application/json'
+                },
+                'request': {
+                    'delta': 'number (requerido) - unidades a sumar (positivo) o descontar (negativo)'
+                },
+                'responses': [
+                    {'code': '200', 'description': 'Stock actualizado'},
+                    {'code': '400', 'description': 'delta inválido'},
+                    {'code': '404', 'description': 'Producto no encontrado'},
+                    {'code': '409', 'description': 'Stock insuficiente o producto en migración'}
+                ],
+                'example': '''{
+  "delta": -2
+}''',
+                'response_example': '''{
+  "message": "Stock actualizado exitosamente",
+  "product": {"_id": "db1-673a1b2c3d4e5f6a7b8c9d0e", "name": "Manzana", "stock": 98, "database": "DB1"}
+}'''
+            },
+            {
+                'path': '/products/stock/reserve',
+                'method': 'POST',
+                'title': 'Reservar Stock',
+                'description': 'Descuenta el stock de varios productos de forma todo-o-nada. Se usa una transacción por shard y, si algún shard no puede reservar, se devuelve lo descontado en los demás',
+                'authentication': True,
+                'headers': {
+                    'Authorization': 'Bearer <token>',
+                    'Content-Type': 'application/json'
+                },
+                'request': {
+                    'items': 'array (requerido) - lista de {product_id, quantity}'
+                },
+                'responses': [
+                    {'code': '200', 'description': 'Todos los productos reservados'},
+                    {'code': '400', 'description': 'Items inválidos'},
+                    {'code': '409', 'description': 'Stock insuficiente; no se reservó nada'},
+                    {'code': '503', 'description': 'Algún shard no respondió'}
+                ],
+                'example': '''{
+  "items": [
+    {"product_id": "db1-673a1b2c3d4e5f6a7b8c9d0e", "quantity": 2},
+    {"product_id": "db2-673a1b2c3d4e5f6a7b8c9d0f", "quantity": 1}
+  ]
+}''',
+                'response_example': '''{
+  "message": "Reserva completada",
+  "reserved": [
+    {"_id": "db1-673a1b2c3d4e5f6a7b8c9d0e", "quantity": 2},
+    {"_id": "db2-673a1b2c3d4e5f6a7b8c9d0f", "quantity": 1}
+  ]
 }'''
             },
             {
@@ -460,12 +1387,15 @@ def list_users():
         return auth_response
     
     try:
-        # Conexión a DB3 para obtener usuarios
-        db3_client = MongoClient(os.getenv("DB3_URL"))
-        db3 = db3_client['auth_db']
-        users_collection = db3['users']
-        
-        users = list(users_collection.find({}, {'password': 0}))  # Excluir contraseñas
+        limit = pagination.parse_limit(request.args.get('limit'))
+        after = request.args.get('after')
+        cursor_state = pagination.decode_cursor(after) if after else None
+    except ValueError as ve:
+        return jsonify({'message': str(ve)}), 400
+    
+    try:
+        # Una pagina de usuarios de DB3 (sin contraseñas), ordenada por username
+        users, next_state = user_directory.page(limit, cursor_state, request.args.get('prefix', ''))
         
         # Convertir ObjectId a string
         for user in users:
@@ -473,8 +1403,12 @@ def list_users():
         
         return jsonify({
             'count': len(users),
-            'users': users
+            'users': users,
+            'next_cursor': pagination.encode_cursor(next_state) if next_state else None,
+            'has_more': next_state is not None
         }), 200
+    except InvalidCursor as ic:
+        return jsonify({'message': str(ic)}), 400
     except Exception as e:
         return jsonify({'message': f'Error al listar usuarios: {str(e)}'}), 500
 
@@ -494,12 +1428,11 @@ def register_user():
             return jsonify({'message': 'Usuario y contraseña son requeridos'}), 400
         
         # Enviar solicitud al servidor de autenticación
-        response = requests.post(
-            f"{AUTH_SERVER_URL}/auth/register",
-            json=data
-        )
+        response = auth_client.post('/auth/register', json=data)
         
         return jsonify(response.json()), response.status_code
+    except (CircuitOpenError, AuthClientBusy) as e:
+        return jsonify({'message': str(e)}), 503
     except requests.RequestException as e:
         return jsonify({'message': f'Error al comunicarse con el servidor de autenticación: {str(e)}'}), 500
     except Exception as e:
@@ -514,17 +1447,19 @@ def delete_user(username):
         return auth_response
     
     try:
-        # Conexión a DB3 para eliminar usuario
-        db3_client = MongoClient(os.getenv("DB3_URL"))
-        db3 = db3_client['auth_db']
-        users_collection = db3['users']
-        
-        result = users_collection.delete_one({'username': username})
-        
-        if result.deleted_count == 0:
+        if not user_directory.delete(username):
             return jsonify({'message': 'Usuario no encontrado'}), 404
+        # Sus tokens dejan de aceptarse aqui de inmediato y en el resto de servicios via auth-server
+        token_verifier.revocations.revoke_user(username)
+        token_verifier.invalidate_user(username)
+        try:
+            response = auth_client.post(f"/auth/users/{quote(username, safe='')}/revoke",
+                                        headers=revocation_sync.headers())
+            tokens_revoked = response.status_code == 200
+        except (CircuitOpenError, AuthClientBusy, requests.RequestException):
+            tokens_revoked = False
         
-        return jsonify({'message': 'Usuario eliminado exitosamente'}), 200
+        return jsonify({'message': 'Usuario eliminado exitosamente', 'tokens_revoked': tokens_revoked}), 200
     except Exception as e:
         return jsonify({'message': f'Error al eliminar usuario: {str(e)}'}), 500
 
@@ -548,11 +1483,33 @@ def get_config():
 def proxy_login():
     try:
         # Reenviar la petición al auth-server interno
-        response = requests.post(
-            f"{AUTH_SERVER_URL}/auth/login",
-            json=request.get_json()
-        )
+        response = auth_client.post('/auth/login', json=request.get_json())
+        return jsonify(response.json()), response.status_code
+    except (CircuitOpenError, AuthClientBusy) as e:
+        return jsonify({'message': str(e)}), 503
+    except requests.RequestException as e:
+        return jsonify({'message': f'Error de conexión con auth-server: {str(e)}'}), 500
+
+@app.route('/auth/logout', methods=['POST'])
+def proxy_logout():
+    try:
+        # Reenviar la petición (con el token a revocar) al auth-server interno
+        response = auth_client.post('/auth/logout', json=request.get_json(silent=True) or {},
+                                    headers={'Authorization': request.headers.get('Authorization', '')})
         return jsonify(response.json()), response.status_code
+    except (CircuitOpenError, AuthClientBusy) as e:
+        return jsonify({'message': str(e)}), 503
+    except requests.RequestException as e:
+        return jsonify({'message': f'Error de conexión con auth-server: {str(e)}'}), 500
+
+@app.route('/auth/refresh', methods=['POST'])
+def proxy_refresh():
+    try:
+        # Reenviar la petición al auth-server interno
+        response = auth_client.post('/auth/refresh', json=request.get_json())
+        return jsonify(response.json()), response.status_code
+    except (CircuitOpenError, AuthClientBusy) as e:
+        return jsonify({'message': str(e)}), 503
     except requests.RequestException as e:
         return jsonify({'message': f'Error de conexión con auth-server: {str(e)}'}), 500
 
@@ -560,24 +1517,91 @@ def proxy_login():
 def proxy_register():
     try:
         # Reenviar la petición al auth-server interno
-        response = requests.post(
-            f"{AUTH_SERVER_URL}/auth/register",
-            json=request.get_json()
-        )
+        response = auth_client.post('/auth/register', json=request.get_json())
         return jsonify(response.json()), response.status_code
+    except (CircuitOpenError, AuthClientBusy) as e:
+        return jsonify({'message': str(e)}), 503
     except requests.RequestException as e:
         return jsonify({'message': f'Error de conexión con auth-server: {str(e)}'}), 500
 
 # Health check endpoint
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Endpoint para verificar el estado del servicio"""
+    """Endpoint para verificar el estado del servicio (ultima instantanea del prober)"""
+    snapshot = health_prober.snapshot()
     return jsonify({
-        'status': 'healthy',
+        'status': 'healthy' if snapshot['ready'] else 'degraded',
         'service': 'web-server',
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'checked_at': snapshot['checked_at'],
+        'checks': {name: result['ok'] for name, result in snapshot['checks'].items()}
+    }), 200
+
+# Liveness: el proceso responde (no depende de MongoDB ni del auth-server)
+@app.route('/health/live', methods=['GET'])
+def liveness():
+    return jsonify({'status': 'alive', 'service': 'web-server'}), 200
+
+# Readiness: dependencias requeridas disponibles segun la ultima comprobacion en segundo plano
+@app.route('/health/ready', methods=['GET'])
+def readiness():
+    snapshot = health_prober.snapshot()
+    return jsonify({'service': 'web-server', **snapshot}), 200 if snapshot['ready'] else 503
+
+# Metricas en formato de texto de Prometheus
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    if not METRICS_ENABLED:
+        return jsonify({'message': 'Metricas desactivadas'}), 404
+    return Response(metrics_registry.render(), content_type=metrics.CONTENT_TYPE)
+
+# Estadisticas de la cache de productos
+@app.route('/stats/cache', methods=['GET'])
+def cache_stats():
+    auth_response = verify_token()
+    if auth_response:
+        return auth_response
+    return jsonify({
+        **product_cache.stats(),
+        'change_streams': cache_invalidator.status
     }), 200
 
+# Decisiones de enrutamiento de lecturas (primario / secundarios) por endpoint
+@app.route('/stats/read-routing', methods=['GET'])
+def read_routing_stats():
+    auth_response = verify_token()
+    if auth_response:
+        return auth_response
+    return jsonify(read_router.stats()), 200
+
+# Trazas: muestreo, operaciones lentas registradas y exportacion
+@app.route('/stats/tracing', methods=['GET'])
+def tracing_stats():
+    auth_response = verify_token()
+    if auth_response:
+        return auth_response
+    return jsonify({'enabled': TRACING_ENABLED, **tracer.stats()}), 200
+
+# Estadisticas del cliente hacia el auth-server (pool, breaker, verificacion)
+@app.route('/stats/auth-client', methods=['GET'])
+def auth_client_stats():
+    auth_response = verify_token()
+    if auth_response:
+        return auth_response
+    return jsonify({
+        'auth_client': auth_client.stats(),
+        'token_verifier': token_verifier.stats(),
+        'revocation_sync': revocation_sync.stats()
+    }), 200
+
+# Compensaciones de reservas pendientes de reintento
+@app.route('/stats/reservations', methods=['GET'])
+def reservation_stats():
+    auth_response = verify_token()
+    if auth_response:
+        return auth_response
+    return jsonify(release_retrier.stats()), 200
+
 if __name__ == '__main__':
     # Obtener puerto de variable de entorno o usar 3000 por defecto
     port = int(os.getenv('PORT', 3000))
@@ -591,4 +1615,5 @@ Auth Server: {AUTH_SERVER_URL}
 Debug: {debug_mode}
 {'='*50}\n""")
     
+    start_background_tasks()
     app.run(host='0.0.0.0', port=port, debug=debug_mode)
\ No newline at end of file
@@ -0,0 +1,673 @@
+# Modo asincrono del web-server (Quart + Motor + httpx, servido con Hypercorn)
+# Las rutas de mas trafico (listado, busqueda, lectura, alta, baja y ajuste
+# de stock de productos, login y registro) se atienden en el event loop: las
+# consultas a los shards y al auth-server se esperan a la vez sin ocupar un
+# hilo por peticion, de modo que miles de conexiones inactivas del dashboard
+# no necesitan miles de hilos. El resto de rutas (paginas, exportacion,
+# importacion masiva, edicion, reservas, usuarios, administracion, docs)
+# las sigue atendiendo la app Flask en un pool de hilos del mismo proceso,
+# compartiendo la cache de productos, las metricas y las trazas. La
+# validacion y la forma de las respuestas vienen de product_requests (las
+# mismas que en app.py); este modulo solo aporta la E/S asincrona.
+#
+# El modo por defecto sigue siendo Flask (python3 app.py). Para este modo:
+#   pip install -r requirements-async.txt
+#   hypercorn app_async:asgi_app --bind 0.0.0.0:3000
+import asyncio, heapq, os, time
+from datetime import datetime
+
+import pymongo
+import requests
+from bson.errors import InvalidId
+from pymongo.errors import DuplicateKeyError
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from motor.motor_asyncio import AsyncIOMotorClient
+from quart import Quart, request, jsonify, g, Response
+from quart.wrappers.response import DataBody
+from quart_cors import cors
+from werkzeug.exceptions import HTTPException
+
+import mongo_clients
+# Los shards de la app Flask usan el MongoClient de cada cliente de Motor:
+# un solo pool por replica set para los dos modos (ver mongo_clients)
+mongo_clients.use_async(AsyncIOMotorClient)
+# Importar la app Flask no arranca sus hilos de fondo: se arrancan al servir
+import app as sync_app
+import catalog_export
+import etags
+import inventory
+import json_provider
+import pagination
+import product_requests
+import product_search
+from async_clients import AsyncAuthClient, AsyncTokenVerifier
+from auth_client import CircuitOpenError, AuthClientBusy
+from compression import Compressor
+from observability import tracing
+from pagination import InvalidCursor
+from product_ids import public_id, parse_public_id
+from read_routing import ReadRouter
+from scatter_gather import ShardUnavailable
+from shard_migration import REDIRECTS_COLLECTION, MIGRATING_FIELD
+from token_verifier import InvalidToken, VerifierUnavailable
+
+# Rutas (endpoints de la app Flask) que atiende el event loop
+ASYNC_ENDPOINTS = {
+    'list_products', 'search_products', 'get_product', 'create_product', 'delete_product',
+    'adjust_product_stock', 'proxy_login', 'proxy_logout', 'proxy_refresh', 'proxy_register', 'auth_client_stats'
+}
+
+app = cors(Quart(__name__, static_folder=None))
+json_provider.configure(
+    app,
+    serializer=os.getenv("JSON_SERIALIZER", "orjson").lower(),
+    datetime_format=os.getenv("JSON_DATETIME_FORMAT", "http").lower()
+)
+compressor = Compressor(
+    min_size=int(os.getenv("COMPRESSION_MIN_SIZE", 1024)),
+    gzip_level=int(os.getenv("COMPRESSION_GZIP_LEVEL", 6)),
+    brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))
+) if os.getenv("RESPONSE_COMPRESSION", "True").lower() == "true" else None
+
+# Mismas metricas (/metrics) y trazas que las rutas Flask
+if sync_app.METRICS_ENABLED:
+    sync_app.request_metrics.init_async_app(app)
+if sync_app.TRACING_ENABLED:
+    sync_app.tracer.init_async_app(app)
+
+SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", 5))
+# La cache es la misma que usan las rutas Flask: las escrituras de ambos lados la invalidan
+product_cache = sync_app.product_cache
+
+# Enrutador de Motor y clientes del auth-server: se crean al arrancar el servidor
+shard_router = None
+read_router = None
+PRODUCT_SHARDS = []
+auth_client = None
+token_verifier = None
+
+
+@app.before_serving
+async def start_clients():
+    global shard_router, read_router, PRODUCT_SHARDS, auth_client, token_verifier
+    # Hilos de fondo de la app Flask (indices, cache, revocaciones, salud...)
+    sync_app.start_background_tasks()
+    # Mismos clientes (pools, metricas y trazas) que la app Flask, vistos desde Motor
+    shard_router = sync_app.shard_router.with_clients(lambda shard: mongo_clients.async_client(shard.client))
+    PRODUCT_SHARDS = shard_router.targets()
+    read_router = ReadRouter(
+        shard_router,
+        secondary_endpoints=sync_app.read_router.secondary_endpoints,
+        max_staleness=sync_app.read_router.max_staleness
+    )
+    auth_client = AsyncAuthClient(
+        sync_app.AUTH_SERVER_URL,
+        pool_size=int(os.getenv("AUTH_POOL_SIZE", 20)),
+        connect_timeout=float(os.getenv("AUTH_CONNECT_TIMEOUT", 2)),
+        read_timeout=float(os.getenv("AUTH_READ_TIMEOUT", 5)),
+        max_concurrency=int(os.getenv("AUTH_MAX_CONCURRENCY", 50)),
+        acquire_timeout=float(os.getenv("AUTH_ACQUIRE_TIMEOUT", 1)),
+        failure_threshold=int(os.getenv("AUTH_BREAKER_THRESHOLD", 5)),
+        reset_timeout=float(os.getenv("AUTH_BREAKER_RESET", 30))
+    )
+    token_verifier = AsyncTokenVerifier(
+        auth_client,
+        mode=os.getenv("AUTH_VERIFY_MODE", "local").lower(),
+        internal_key=os.getenv("INTERNAL_API_KEY"),
+        cache_size=int(os.getenv("TOKEN_CACHE_SIZE", 10000)),
+        refresh_seconds=int(os.getenv("JWT_KEYS_REFRESH_SECONDS", 300)),
+        leeway=int(os.getenv("JWT_LEEWAY_SECONDS", 0)),
+        fallback=os.getenv("AUTH_VERIFY_FALLBACK", "True").lower() == "true",
+        # Misma lista que la app Flask: la sincroniza su hilo
+        revocations=sync_app.token_verifier.revocations
+    )
+    if token_verifier.mode == 'local' and not await token_verifier.refresh_keys_async():
+        print("Claves JWT no disponibles al iniciar; se reintentara en la primera peticion")
+    print(f"Modo asincrono: {len(shard_router.shards)} shards ({shard_router.strategy})")
+
+
+@app.after_serving
+async def close_clients():
+    await auth_client.close()
+    shard_router.close()
+
+
+# ============ AUXILIARES ============
+
+async def verify_token():
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    if not token:
+        return jsonify({'message': 'Token de autenticacion requerido'}), 401
+    started = time.perf_counter()
+    try:
+        with tracing.span('verify_token', mode=token_verifier.mode):
+            g.user = await token_verifier.verify_async(token)
+        sync_app.token_verify_seconds.observe(time.perf_counter() - started, 'valid')
+        return None
+    except InvalidToken:
+        sync_app.token_verify_seconds.observe(time.perf_counter() - started, 'invalid')
+        return jsonify({'message': 'Token invalido o expirado'}), 401
+    except VerifierUnavailable as e:
+        sync_app.token_verify_seconds.observe(time.perf_counter() - started, 'unavailable')
+        return jsonify({'message': f'Error al verificar token: {str(e)}'}), 500
+
+
+def _error_message(error):
+    return 'timeout' if isinstance(error, asyncio.TimeoutError) else str(error)
+
+
+async def _on_shard(name, fn, target, timeout=None):
+    # Un span por shard, como ScatterGather en la app Flask. Ademas de
+    # wait_for, pymongo.timeout limita cada comando en el servidor
+    # (maxTimeMS): Motor ejecuta la operacion con una copia del contexto de
+    # la tarea, asi que una consulta abandonada no sigue corriendo en el shard
+    timeout = timeout or SHARD_TIMEOUT
+    with tracing.span(f"shard {name}", shard=name), pymongo.timeout(timeout):
+        return await asyncio.wait_for(fn(target), timeout)
+
+
+async def gather_shards(targets, fn, timeout=None):
+    """Ejecuta fn(objetivo) en todos los shards a la vez con timeout por
+    shard. Devuelve (resultados, errores) indexados por nombre de shard."""
+    outcomes = await asyncio.gather(
+        *(_on_shard(name, fn, target, timeout) for name, target in targets),
+        return_exceptions=True
+    )
+    results, errors = {}, {}
+    for (name, _), outcome in zip(targets, outcomes):
+        if isinstance(outcome, Exception):
+            errors[name] = _error_message(outcome)
+        else:
+            results[name] = outcome
+    return results, errors
+
+
+async def first_shard(targets, fn):
+    """Devuelve (shard, valor, errores) del primer shard cuyo resultado no
+    sea None; los demas se cancelan"""
+    tasks = {asyncio.ensure_future(_on_shard(name, fn, target)): name for name, target in targets}
+    errors = {}
+    pending = set(tasks)
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            try:
+                value = task.result()
+            except Exception as e:
+                errors[tasks[task]] = _error_message(e)
+                continue
+            if value is not None:
+                for other in pending:
+                    other.cancel()
+                return tasks[task], value, errors
+    return None, None, errors
+
+
+async def collection_version(collection):
+    meta = collection.database.get_collection(etags.META_COLLECTION, read_preference=collection.read_preference)
+    doc = await meta.find_one({'_id': etags.META_ID}, {etags.VERSION_FIELD: 1})
+    return doc.get(etags.VERSION_FIELD, 0) if doc else 0
+
+
+async def product_written(shard, object_id=None):
+    await shard.db[etags.META_COLLECTION].update_one(
+        {'_id': etags.META_ID}, {'$inc': {etags.VERSION_FIELD: 1}}, upsert=True
+    )
+    product_cache.invalidate(object_id)
+
+
+async def find_redirect(shard, object_id):
+    redirect = await shard.db[REDIRECTS_COLLECTION].find_one({'_id': object_id})
+    return shard_router.get(redirect['moved_to']) if redirect else None
+
+
+async def locate_product(product_id, projection=None):
+    """(shard, documento) de un ID publico; los ObjectId sin prefijo, o los
+    que no aparecen donde indican el prefijo y la redireccion, se buscan en
+    todos los shards a la vez"""
+    tag, object_id = parse_public_id(product_id)
+    shard = shard_router.get(tag)
+    if shard is not None:
+        product = await read_router.collection('get_product', shard).find_one({'_id': object_id}, projection)
+        if not product:
+            # El producto pudo haberse migrado a otro shard tras un cambio de nombre
+            shard = await find_redirect(shard, object_id)
+            product = await read_router.collection('get_product', shard).find_one({'_id': object_id}, projection) \
+                if shard else None
+        if product:
+            return shard, product
+    targets = read_router.targets('get_product')
+    name, product, errors = await first_shard(
+        targets, lambda collection: collection.find_one({'_id': object_id}, projection)
+    )
+    if name is None and errors:
+        raise ShardUnavailable(errors)
+    return shard_router.get(name), product
+
+
+async def fetch_page(targets, limit, sort_field, direction, cursor_state, base_filter, query_key):
+    """pagination.fetch_page con las consultas de todos los shards esperadas a la vez"""
+    sort_key, positions, queries = pagination.prepare_queries(
+        targets, sort_field, direction, cursor_state, base_filter, query_key
+    )
+    spec = pagination.sort_spec(sort_field, direction)
+    results, errors = await gather_shards(
+        [(name, (collection, query)) for name, collection, query in queries],
+        lambda target: target[0].find(target[1]).sort(spec).limit(limit + 1).to_list(limit + 1)
+    )
+    batches = [(name, results[name]) for name, _, _ in queries if name in results]
+    items, state = pagination.merge_page(batches, limit, sort_field, direction, sort_key, positions, query_key)
+    return items, state, errors
+
+
+def etag_response(payload, etag, status=200):
+    if etag and etags.none_match(request.if_none_match, etag):
+        response = Response('', status=304)
+    else:
+        response = jsonify(payload)
+        response.status_code = status
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@app.after_request
+async def compress_response(response):
+    if compressor is None or response.status_code < 200 or response.status_code == 204:
+        return response
+    if response.status_code == 304:
+        return compressor.not_modified(response, request.if_none_match)
+    if 'Content-Encoding' in response.headers or not compressor.compressible(response):
+        return response
+    # Las respuestas en streaming (busqueda NDJSON) se envian sin comprimir
+    if not isinstance(response.response, DataBody):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = compressor.choose_encoding(request.accept_encodings)
+    body = await response.get_data()
+    if encoding is None or len(body) < compressor.min_size:
+        return response
+    response.set_data(compressor.compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    compressor.code_etag(response, encoding)
+    return response
+
+
+# ============ CRUD DE PRODUCTOS ============
+
+@app.route('/products', methods=['GET'])
+async def list_products():
+    # Verificar autenticacion
+    auth_response = await verify_token()
+    if auth_response:
+        return auth_response
+
+    try:
+        listing = product_requests.ListingQuery(request.args)
+    except ValueError as ve:
+        return jsonify({'message': str(ve)}), 400
+
+    page_key = listing.page_key
+    cached = product_cache.get_page(page_key) if not listing.explain else None
+    if cached is not None:
+        etag, page = cached
+        return etag_response(page, etag)
+    cache_token = product_cache.token()
+
+    try:
+        targets = read_router.targets('list_products')
+        etag = None
+        if not listing.explain:
+            versions, version_errors = await gather_shards(targets, collection_version)
+            if not version_errors:
+                etag = etags.listing_etag(page_key, versions)
+                if etags.none_match(request.if_none_match, etag):
+                    return etag_response(None, etag)
+        items, next_state, errors = await fetch_page(
+            targets, listing.limit, listing.sort_field, listing.direction, listing.cursor_state,
+            listing.base_filter, listing.query_key
+        )
+        product_requests.require_any(targets, errors)
+
+        page = product_requests.page_body(items, next_state, errors)
+        if listing.explain:
+            spec = pagination.sort_spec(listing.sort_field, listing.direction)
+            plans, explain_errors = await gather_shards(
+                targets,
+                lambda collection: collection.find(listing.base_filter).sort(spec).limit(listing.limit + 1).explain()
+            )
+            page['query_stats'] = product_requests.explain_stats(
+                plans, explain_errors, listing.base_filter, listing.sort_field, app.logger
+            )
+        elif not errors:
+            product_cache.put_page(page_key, (etag, page), cache_token)
+        else:
+            etag = None
+        return etag_response(page, etag)
+    except InvalidCursor as ic:
+        return jsonify({'message': str(ic)}), 400
+    except ShardUnavailable as su:
+        return jsonify({'message': str(su), 'unavailable_shards': su.errors}), 503
+    except Exception as e:
+        return jsonify({'message': f'Error al listar productos: {str(e)}'}), 500
+
+
+async def _next_match(cursor):
+    try:
+        return await cursor.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def search_matches(targets, query, limit):
+    """product_search.iter_matches con Motor: abre un cursor por shard y
+    espera a la vez el primer documento de cada uno. Devuelve (generador
+    de bloques NDJSON, errores de los shards que no respondieron)."""
+    batch_size = min(limit, catalog_export.DEFAULT_BATCH_SIZE)
+
+    async def open_cursor(collection):
+        cursor = collection.find(query).sort(product_search.SEARCH_SORT).limit(limit).batch_size(batch_size)
+        cursor = cursor.__aiter__()
+        return cursor, await _next_match(cursor)
+
+    opened, errors = await gather_shards(targets, open_cursor)
+    cursors = [(name, *opened[name]) for name, _ in targets if name in opened]
+
+    async def generate():
+        heap = [((doc.get(product_search.NAME_FIELD) or '', doc['_id']), index, doc)
+                for index, (_, _, doc) in enumerate(cursors) if doc is not None]
+        heapq.heapify(heap)
+        sent, chunk = 0, []
+        while heap and sent < limit:
+            _, index, doc = heapq.heappop(heap)
+            name, cursor, _ = cursors[index]
+            following = await _next_match(cursor)
+            if following is not None:
+                heapq.heappush(heap, ((following.get(product_search.NAME_FIELD) or '', following['_id']),
+                                      index, following))
+            doc.pop(product_search.NAME_FIELD, None)
+            chunk.append(catalog_export.ndjson_line(name, doc))
+            sent += 1
+            if len(chunk) >= product_search.DEFAULT_LIMIT:
+                yield '\n'.join(chunk) + '\n'
+                chunk = []
+        if chunk:
+            yield '\n'.join(chunk) + '\n'
+    return generate(), errors
+
+
+@app.route('/products/search', methods=['GET'])
+async def search_products():
+    # Verificar autenticacion
+    auth_response = await verify_token()
+    if auth_response:
+        return auth_response
+
+    try:
+        search = product_requests.SearchQuery(request.args)
+    except ValueError as ve:
+        return jsonify({'message': str(ve)}), 400
+
+    # Con fragmentacion por rango solo se consultan los shards que pueden tener el prefijo
+    targets = search.targets(shard_router, read_router)
+
+    try:
+        if search.output_format == 'ndjson':
+            matches, errors = await search_matches(targets, search.query, search.limit)
+            product_requests.require_any(targets, errors)
+            return Response(matches, mimetype='application/x-ndjson',
+                            headers={'X-Searched-Shards': ','.join(name for name, _ in targets),
+                                     'X-Unavailable-Shards': ','.join(errors)})
+
+        items, next_state, errors = await fetch_page(
+            targets, search.limit, product_search.NAME_FIELD, 1, search.cursor_state, search.query,
+            search.query_key
+        )
+        product_requests.require_any(targets, errors)
+        return jsonify(product_requests.page_body(
+            items, next_state, errors, searched_shards=[name for name, _ in targets]
+        )), 200
+    except InvalidCursor as ic:
+        return jsonify({'message': str(ic)}), 400
+    except ShardUnavailable as su:
+        return jsonify({'message': str(su), 'unavailable_shards': su.errors}), 503
+    except Exception as e:
+        return jsonify({'message': f'Error al buscar productos: {str(e)}'}), 500
+
+
+@app.route('/products/<product_id>', methods=['GET'])
+async def get_product(product_id):
+    # Verificar autenticacion
+    auth_response = await verify_token()
+    if auth_response:
+        return auth_response
+
+    try:
+        _, object_id = parse_public_id(product_id)
+        product = product_cache.get_product(object_id)
+        if product is None:
+            cache_token = product_cache.token()
+            shard, product = await locate_product(product_id)
+            if not product:
+                return jsonify({'message': 'Producto no encontrado'}), 404
+            product_cache.put_product(object_id, product_requests.present_product(shard.name, product), cache_token)
+
+        etag = etags.product_etag(product['_id'], product.get(etags.VERSION_FIELD), product.get('updated_at'))
+        return etag_response(product, etag)
+    except InvalidId:
+        return jsonify({'message': 'ID de producto invalido'}), 400
+    except ShardUnavailable as su:
+        return jsonify({'message': str(su), 'unavailable_shards': su.errors}), 503
+    except Exception as e:
+        return jsonify({'message': f'Error al obtener producto: {str(e)}'}), 500
+
+
+@app.route('/products', methods=['POST'])
+async def create_product():
+    # Verificar autenticacion
+    auth_response = await verify_token()
+    if auth_response:
+        return auth_response
+
+    try:
+        new_product = product_requests.new_product(await request.get_json(silent=True), datetime.utcnow())
+
+        # Mismo shard que get_database_for_new_product en app.py
+        shard, db_label, legacy, query = product_requests.new_product_route(shard_router, new_product['name'])
+        if legacy is not None and await legacy.collection.count_documents(query, limit=1):
+            shard, db_label = legacy, legacy.label
+        await shard.collection.insert_one(new_product)
+        await product_written(shard)
+
+        return jsonify(product_requests.created_body(new_product, shard.name, db_label)), 201
+    except DuplicateKeyError:
+        return jsonify({'message': 'Ya existe un producto con ese nombre'}), 409
+    except ValueError as ve:
+        return jsonify({'message': str(ve)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Error al crear producto: {str(e)}'}), 500
+
+
+@app.route('/products/<product_id>/stock', methods=['PATCH'])
+async def adjust_product_stock(product_id):
+    # Verificar autenticacion
+    auth_response = await verify_token()
+    if auth_response:
+        return auth_response
+
+    try:
+        try:
+            delta = product_requests.stock_delta(await request.get_json(silent=True))
+        except ValueError as ve:
+            return jsonify({'message': str(ve)}), 400
+
+        now = datetime.utcnow()
+        tag, object_id = parse_public_id(product_id)
+        shard = shard_router.get(tag)
+        # Con Motor la misma operacion condicional de inventory devuelve un awaitable
+        if shard is not None:
+            product = await inventory.adjust_stock(shard.collection, object_id, delta, now)
+            if product is None:
+                moved_to = await find_redirect(shard, object_id)
+                if moved_to is not None:
+                    shard = moved_to
+                    product = await inventory.adjust_stock(shard.collection, object_id, delta, now)
+        else:
+            # ID antiguo: el ajuste condicional se envia a todos; solo el duenio coincide
+            name, product, errors = await first_shard(
+                PRODUCT_SHARDS, lambda collection: inventory.adjust_stock(collection, object_id, delta, now)
+            )
+            if product is None and errors:
+                raise ShardUnavailable(errors)
+            shard = shard_router.get(name)
+
+        if product is None:
+            _, current = await locate_product(product_id, {'stock': 1, MIGRATING_FIELD: 1})
+            if not current:
+                return jsonify({'message': 'Producto no encontrado'}), 404
+            if current.get(MIGRATING_FIELD):
+                return jsonify({'message': 'El producto se esta migrando de shard, intente de nuevo'}), 409
+            return jsonify({
+                'message': 'Stock insuficiente',
+                'requested': -delta,
+                'available': current.get('stock', 0)
+            }), 409
+
+        await product_written(shard, object_id)
+        product['_id'] = public_id(shard.name, product['_id'])
+        product['database'] = shard.name
+        return jsonify({'message': 'Stock actualizado exitosamente', 'product': product}), 200
+    except InvalidId:
+        return jsonify({'message': 'ID de producto invalido'}), 400
+    except ShardUnavailable as su:
+        return jsonify({'message': str(su), 'unavailable_shards': su.errors}), 503
+    except Exception as e:
+        return jsonify({'message': f'Error al ajustar el stock: {str(e)}'}), 500
+
+
+@app.route('/products/<product_id>', methods=['DELETE'])
+async def delete_product(product_id):
+    # Verificar autenticacion
+    auth_response = await verify_token()
+    if auth_response:
+        return auth_response
+
+    try:
+        tag, object_id = parse_public_id(product_id)
+        shard = shard_router.get(tag)
+        if shard is not None:
+            deleted_count = (await shard.collection.delete_one({'_id': object_id})).deleted_count
+            if not deleted_count:
+                # Seguir la redireccion si el producto se migro de shard
+                shard = await find_redirect(shard, object_id)
+                deleted_count = (await shard.collection.delete_one({'_id': object_id})).deleted_count \
+                    if shard else 0
+            deleted_from = [shard.name] if deleted_count else []
+        else:
+            # ID antiguo: eliminar en todos los shards a la vez (solo uno lo tiene)
+            async def delete(collection):
+                return (await collection.delete_one({'_id': object_id})).deleted_count
+            results, errors = await gather_shards(PRODUCT_SHARDS, delete)
+            deleted_from = [name for name, count in results.items() if count]
+            if not deleted_from and errors:
+                raise ShardUnavailable(errors)
+
+        if not deleted_from:
+            return jsonify({'message': 'Producto no encontrado'}), 404
+        await product_written(shard_router.get(deleted_from[0]), object_id)
+
+        return jsonify({
+            'message': 'Producto eliminado exitosamente',
+            'deleted_from': deleted_from[0]
+        }), 200
+    except InvalidId:
+        return jsonify({'message': 'ID de producto invalido'}), 400
+    except ShardUnavailable as su:
+        return jsonify({'message': str(su), 'unavailable_shards': su.errors}), 503
+    except Exception as e:
+        return jsonify({'message': f'Error al eliminar producto: {str(e)}'}), 500
+
+
+# ============ PROXY AL AUTH-SERVER ============
+
+async def _proxy(path):
+    try:
+        response = await auth_client.post(path, json=await request.get_json())
+        return jsonify(response.json()), response.status_code
+    except (CircuitOpenError, AuthClientBusy) as e:
+        return jsonify({'message': str(e)}), 503
+    except requests.RequestException as e:
+        return jsonify({'message': f'Error de conexión con auth-server: {str(e)}'}), 500
+
+
+@app.route('/auth/login', methods=['POST'])
+async def proxy_login():
+    return await _proxy('/auth/login')
+
+
+@app.route('/auth/logout', methods=['POST'])
+async def proxy_logout():
+    try:
+        # Reenviar la petición (con el token a revocar) al auth-server interno
+        response = await auth_client.post('/auth/logout', json=await request.get_json(silent=True) or {},
+                                          headers={'Authorization': request.headers.get('Authorization', '')})
+        return jsonify(response.json()), response.status_code
+    except (CircuitOpenError, AuthClientBusy) as e:
+        return jsonify({'message': str(e)}), 503
+    except requests.RequestException as e:
+        return jsonify({'message': f'Error de conexión con auth-server: {str(e)}'}), 500
+
+
+@app.route('/auth/refresh', methods=['POST'])
+async def proxy_refresh():
+    return await _proxy('/auth/refresh')
+
+
+@app.route('/auth/register', methods=['POST'])
+async def proxy_register():
+    return await _proxy('/auth/register')
+
+
+@app.route('/stats/auth-client', methods=['GET'])
+async def auth_client_stats():
+    auth_response = await verify_token()
+    if auth_response:
+        return auth_response
+    return jsonify({
+        'auth_client': auth_client.stats(),
+        'token_verifier': token_verifier.stats(),
+        'revocation_sync': sync_app.revocation_sync.stats()
+    }), 200
+
+
+# ============ DESPACHO ENTRE EVENT LOOP Y FLASK ============
+
+class EndpointDispatcher:
+    """Aplicacion ASGI que decide por endpoint: las rutas de ASYNC_ENDPOINTS
+    van a Quart y el resto a la app Flask (WSGI en un pool de hilos)"""
+
+    def __init__(self, async_app, wsgi_app, endpoints, max_body_size):
+        self.async_app = async_app
+        self.wsgi_app = wsgi_app
+        self.endpoints = endpoints
+        self._wsgi = AsyncioWSGIMiddleware(wsgi_app, max_body_size=max_body_size)
+
+    def _endpoint(self, scope):
+        adapter = self.wsgi_app.url_map.bind('localhost')
+        try:
+            endpoint, _ = adapter.match(scope['path'], scope['method'])
+            return endpoint
+        except HTTPException:
+            return None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and self._endpoint(scope) not in self.endpoints:
+            return await self._wsgi(scope, receive, send)
+        return await self.async_app(scope, receive, send)
+
+
+asgi_app = EndpointDispatcher(
+    app, sync_app.app, ASYNC_ENDPOINTS,
+    max_body_size=int(os.getenv("ASYNC_MAX_BODY_SIZE", 64 * 1024 * 1024))
+)
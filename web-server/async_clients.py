@@ -0,0 +1,175 @@
+# Versiones asyncio del cliente del auth-server y del verificador de tokens
+# Se usan en el modo asincrono (app_async.py). Mantienen el mismo
+# comportamiento que AuthClient y TokenVerifier: pool keep-alive (httpx),
+# concurrencia acotada, circuit breaker, cache de tokens verificados y
+# propagacion de la traza (traceparent).
+import asyncio, time
+
+import httpx
+import jwt
+import requests
+
+from auth_client import CircuitBreaker, CircuitOpenError, AuthClientBusy
+from observability import tracing
+from token_verifier import TokenVerifier, TokenCache, InvalidToken, VerifierUnavailable
+
+
+class AsyncAuthClient:
+    """Cliente asincrono del auth-server con pool de conexiones y circuit breaker"""
+
+    def __init__(self, base_url, pool_size=20, connect_timeout=2.0, read_timeout=5.0,
+                 max_concurrency=50, acquire_timeout=1.0, failure_threshold=5, reset_timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+        self.requests_total = 0
+        self.failures_total = 0
+        self.busy_rejections = 0
+
+    async def request(self, method, path, **kwargs):
+        if not self.breaker.allow():
+            raise CircuitOpenError('auth-server no disponible (circuito abierto)')
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            # Sin enviar la peticion no hay exito ni fallo: liberar el turno de prueba
+            self.breaker.release_probe()
+            self.busy_rejections += 1
+            raise AuthClientBusy('Demasiadas peticiones simultaneas al auth-server')
+        self._in_flight += 1
+        self.requests_total += 1
+        try:
+            with tracing.span(f"auth-server {method} {path}", kind='client', method=method, path=path) as call:
+                # El traceparent enlaza la peticion con la traza del web-server
+                kwargs['headers'] = tracing.inject(kwargs.get('headers'))
+                response = await self._client.request(method, path, **kwargs)
+                if call is not None:
+                    call.set(status=response.status_code)
+        except httpx.HTTPError as e:
+            self._record(False)
+            # Mismo tipo de error que el cliente sincrono para los manejadores de las rutas
+            raise requests.RequestException(str(e)) from e
+        except BaseException:
+            # Cancelacion de la tarea u otro error ajeno al auth-server
+            self.breaker.release_probe()
+            raise
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+        # Los 4xx son respuestas validas del auth-server; solo 5xx cuentan como fallo
+        self._record(response.status_code < 500)
+        return response
+
+    def _record(self, ok):
+        if ok:
+            self.breaker.record_success()
+        else:
+            self.failures_total += 1
+            self.breaker.record_failure()
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    def stats(self):
+        return {
+            'base_url': self.base_url,
+            'timeout': {'connect': self.timeout[0], 'read': self.timeout[1]},
+            'concurrency': {'in_flight': self._in_flight, 'max': self.max_concurrency},
+            'pool_size': self.pool_size,
+            'breaker': self.breaker.stats(),
+            'requests_total': self.requests_total,
+            'failures_total': self.failures_total,
+            'busy_rejections': self.busy_rejections
+        }
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class AsyncTokenVerifier(TokenVerifier):
+    """TokenVerifier cuyas llamadas al auth-server no bloquean el event loop"""
+
+    def __init__(self, auth_client, **kwargs):
+        super().__init__(auth_client, **kwargs)
+        self._refresh_lock = asyncio.Lock()
+
+    async def refresh_keys_async(self, force=False):
+        now = time.monotonic()
+        async with self._refresh_lock:
+            due = self._refresh_due(force, now)
+            if due is None:
+                return True
+            if not due:
+                return bool(self._keys)
+            try:
+                response = await self.auth_client.get('/auth/keys', headers=self._keys_headers())
+                if response.status_code != 200:
+                    return bool(self._keys)
+                data = response.json()
+            except (requests.RequestException, ValueError):
+                return bool(self._keys)
+            self._apply_keys(data, now)
+            return bool(self._keys)
+
+    async def _key_for_async(self, kid):
+        if not await self.refresh_keys_async():
+            raise VerifierUnavailable('Claves de verificacion no disponibles')
+        key = self._keys.get(kid if kid is not None else self._active_kid)
+        if key is None and kid is not None:
+            # kid desconocido: probablemente el auth-server roto la clave
+            await self.refresh_keys_async(force=True)
+            key = self._keys.get(kid)
+        if key is None:
+            raise InvalidToken('Clave de firma desconocida')
+        return key
+
+    async def verify_async(self, token):
+        """Devuelve los claims del token o lanza InvalidToken /
+        VerifierUnavailable"""
+        digest = TokenCache.digest(token)
+        claims = self.cache.get(digest)
+        if claims is None:
+            if self.mode == 'local':
+                try:
+                    claims = await self._verify_local_async(token)
+                except VerifierUnavailable:
+                    if not self.fallback:
+                        raise
+                    claims = await self._verify_remote_async(token)
+            else:
+                claims = await self._verify_remote_async(token)
+            self.cache.put(digest, claims)
+
+        self.check_revoked(claims)
+        return claims
+
+    async def _verify_local_async(self, token):
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+            key = await self._key_for_async(kid)
+            return self._decode(token, key)
+        except jwt.InvalidTokenError as e:
+            raise InvalidToken(str(e))
+
+    async def _verify_remote_async(self, token):
+        try:
+            response = await self.auth_client.post(
+                '/auth/verify',
+                headers={'Authorization': f'Bearer {token}'}
+            )
+        except requests.RequestException as e:
+            raise VerifierUnavailable(str(e))
+        return self._remote_claims(token, response.status_code)
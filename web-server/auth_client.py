@@ -0,0 +1,218 @@
+# Cliente HTTP compartido para el trafico web-server -> auth-server
+# Una sola Session con pool de conexiones keep-alive, timeouts por llamada,
+# concurrencia acotada y un circuit breaker que falla rapido cuando el
+# auth-server no responde.
+import threading, time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from observability import tracing
+
+
+class CircuitOpenError(requests.RequestException):
+    """El circuito esta abierto: no se envian peticiones al auth-server"""
+
+
+class AuthClientBusy(requests.RequestException):
+    """Se alcanzo el limite de peticiones simultaneas al auth-server"""
+
+
+class CircuitBreaker:
+    """Circuit breaker de tres estados.
+
+    - closed: las peticiones pasan; tras `failure_threshold` fallos
+      consecutivos se abre.
+    - open: las peticiones fallan de inmediato durante `reset_timeout`
+      segundos.
+    - half_open: se deja pasar un numero limitado de peticiones de prueba;
+      un exito cierra el circuito y un fallo lo vuelve a abrir.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, half_open_max_calls=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def allow(self):
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def release_probe(self):
+        """Devuelve el turno de prueba tomado por allow() cuando la peticion
+        no llego a enviarse (sin resultado que registrar)"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._half_open_calls = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            state = self._current_state()
+            retry_in = 0.0
+            if state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout': self.reset_timeout,
+                'retry_in_seconds': round(retry_in, 2),
+                'times_opened': self.times_opened,
+                'rejected': self.rejected
+            }
+
+
+class AuthClient:
+    """Cliente del auth-server con pool de conexiones y circuit breaker"""
+
+    def __init__(self, base_url, pool_size=20, connect_timeout=2.0, read_timeout=5.0,
+                 max_concurrency=50, acquire_timeout=1.0, failure_threshold=5, reset_timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self.session = requests.Session()
+        # Todas las peticiones van al mismo host: un pool con pool_size conexiones
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', self._adapter)
+        self.session.mount('https://', self._adapter)
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self.requests_total = 0
+        self.failures_total = 0
+        self.busy_rejections = 0
+
+    def request(self, method, path, timeout=None, **kwargs):
+        if not self.breaker.allow():
+            raise CircuitOpenError('auth-server no disponible (circuito abierto)')
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            # Sin enviar la peticion no hay exito ni fallo: liberar el turno de prueba
+            self.breaker.release_probe()
+            with self._stats_lock:
+                self.busy_rejections += 1
+            raise AuthClientBusy('Demasiadas peticiones simultaneas al auth-server')
+        with self._stats_lock:
+            self._in_flight += 1
+            self.requests_total += 1
+        try:
+            with tracing.span(f"auth-server {method} {path}", kind='client', method=method, path=path) as call:
+                # El traceparent enlaza la peticion con la traza del web-server
+                kwargs['headers'] = tracing.inject(kwargs.get('headers'))
+                response = self.session.request(method, f"{self.base_url}{path}",
+                                                timeout=timeout or self.timeout, **kwargs)
+                if call is not None:
+                    call.set(status=response.status_code)
+        except requests.RequestException:
+            self._record(False)
+            raise
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+            self._slots.release()
+        # Los 4xx son respuestas validas del auth-server; solo 5xx cuentan como fallo
+        self._record(response.status_code < 500)
+        return response
+
+    def _record(self, ok):
+        if ok:
+            self.breaker.record_success()
+        else:
+            with self._stats_lock:
+                self.failures_total += 1
+            self.breaker.record_failure()
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def _pool_stats(self):
+        pools = []
+        manager = self._adapter.poolmanager
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None or pool.pool is None:
+                continue
+            maxsize, free = pool.pool.maxsize, pool.pool.qsize()
+            pools.append({
+                'host': f"{pool.scheme}://{pool.host}:{pool.port}",
+                'maxsize': maxsize,
+                # La cola del pool contiene conexiones libres y huecos aun sin abrir
+                'in_use': maxsize - free,
+                'free_slots': free,
+                'connections_created': pool.num_connections,
+                'requests_sent': pool.num_requests
+            })
+        return pools
+
+    def stats(self):
+        with self._stats_lock:
+            in_flight = self._in_flight
+            totals = {
+                'requests_total': self.requests_total,
+                'failures_total': self.failures_total,
+                'busy_rejections': self.busy_rejections
+            }
+        return {
+            'base_url': self.base_url,
+            'timeout': {'connect': self.timeout[0], 'read': self.timeout[1]},
+            'concurrency': {'in_flight': in_flight, 'max': self.max_concurrency},
+            'pool_size': self.pool_size,
+            'pools': self._pool_stats(),
+            'breaker': self.breaker.stats(),
+            **totals
+        }
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,95 @@
+# Compara la serializacion de un listado de productos con el proveedor JSON
+# estandar de Flask (jsonify original), el proveedor std con ObjectId y el
+# proveedor orjson, y el tamano de la respuesta sin comprimir, con gzip y
+# con brotli. No requiere MongoDB: los documentos se generan en memoria.
+#
+# Uso: python benchmarks/bench_json.py --count 500 --repeat 50
+import argparse, gzip, os, random, sys, time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import json_provider
+from product_ids import public_id
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def make_page(count):
+    now = datetime.utcnow()
+    products = []
+    for i in range(count):
+        shard = 'DB1' if i % 2 else 'DB2'
+        products.append({
+            '_id': ObjectId(),
+            'name': f"Producto {i:05d}",
+            'description': 'Descripcion de prueba ' * random.randint(1, 4),
+            'price': round(random.uniform(1, 500), 2),
+            'stock': random.randint(0, 1000),
+            'category': random.choice(['Frutas', 'Verduras', 'Lacteos', 'General']),
+            'created_at': now - timedelta(days=i),
+            'updated_at': now,
+            'version': random.randint(1, 20),
+            'database': shard
+        })
+    return products
+
+
+def build_page(products, stringify):
+    # El listado reemplaza _id por el ID publico con prefijo de shard
+    items = []
+    for product in products:
+        product = dict(product)
+        product['_id'] = public_id(product['database'], product['_id']) if stringify else product['_id']
+        items.append(product)
+    return {'count': len(items), 'products': items, 'next_cursor': None, 'has_more': False}
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=500, help='productos por pagina')
+    parser.add_argument('--repeat', type=int, default=50, help='repeticiones por medicion')
+    args = parser.parse_args()
+
+    products = make_page(args.count)
+    app = Flask(__name__)
+    candidates = [('flask jsonify (original)', DefaultJSONProvider(app), True)]
+    std = json_provider.StdJSONProvider(app)
+    candidates.append(('std + ObjectId', std, True))
+    if json_provider.orjson is not None:
+        candidates.append(('orjson', json_provider.OrjsonProvider(app), True))
+        iso = json_provider.OrjsonProvider(app)
+        iso.datetime_format = 'iso'
+        candidates.append(('orjson (fechas ISO)', iso, True))
+    else:
+        print('orjson no esta instalado: se omite su medicion')
+
+    print(f"{args.count} productos, mediana de {args.repeat} repeticiones")
+    print(f"{'serializador':<26}{'ms':>9}{'bytes':>10}{'gzip':>9}{'brotli':>9}")
+    for label, provider, stringify in candidates:
+        page = build_page(products, stringify)
+        elapsed = measure(lambda: provider.dumps(page), args.repeat)
+        body = provider.dumps(page).encode('utf-8')
+        gzipped = len(gzip.compress(body, compresslevel=6))
+        brotlied = len(brotli.compress(body, quality=4)) if brotli else '-'
+        print(f"{label:<26}{elapsed:>9.2f}{len(body):>10}{gzipped:>9}{brotlied:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# Exportacion en streaming del catalogo completo de productos
+# Los documentos se leen de cada shard con cursores por lotes y proyeccion,
+# y se emiten por bloques: la memoria usada no depende del tamano del catalogo.
+import csv, io, json
+from datetime import datetime
+
+import json_provider
+from product_ids import public_id
+
+EXPORT_FIELDS = ('name', 'description', 'price', 'stock', 'category', 'created_at', 'updated_at')
+DEFAULT_BATCH_SIZE = 1000
+
+
+def parse_fields(value):
+    """Lista de campos solicitados (?fields=name,price); por defecto todos"""
+    if not value:
+        return list(EXPORT_FIELDS)
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    invalid = [f for f in fields if f not in EXPORT_FIELDS]
+    if invalid:
+        raise ValueError(f"Campos no exportables: {', '.join(invalid)}")
+    return fields
+
+
+def _default(value):
+    # Mismo codificador que las respuestas JSON, con fechas ISO 8601
+    return json_provider.default(value, 'iso')
+
+
+def iter_documents(shards, fields, batch_size=DEFAULT_BATCH_SIZE, query=None):
+    """Recorre todos los shards devolviendo (shard, documento) con la
+    proyeccion minima"""
+    projection = {field: 1 for field in fields}
+    for name, collection in shards:
+        cursor = collection.find(query or {}, projection, batch_size=batch_size)
+        try:
+            for doc in cursor:
+                yield name, doc
+        finally:
+            cursor.close()
+
+
+def iter_ndjson(shards, fields, batch_size=DEFAULT_BATCH_SIZE, query=None):
+    """Un documento JSON por linea, agrupando las lineas de cada lote en un
+    solo bloque de la respuesta"""
+    return ndjson_chunks(iter_documents(shards, fields, batch_size, query), batch_size)
+
+
+def ndjson_line(name, doc):
+    """Una linea NDJSON (sin salto) de un documento del shard `name`"""
+    doc['_id'] = public_id(name, doc['_id'])
+    doc['database'] = name
+    return json.dumps(doc, default=_default, ensure_ascii=False)
+
+
+def ndjson_chunks(items, batch_size=DEFAULT_BATCH_SIZE):
+    """Serializa pares (shard, documento) como NDJSON en bloques de lote"""
+    chunk = []
+    for name, doc in items:
+        chunk.append(ndjson_line(name, doc))
+        if len(chunk) >= batch_size:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+
+
+def iter_csv(shards, fields, batch_size=DEFAULT_BATCH_SIZE, query=None):
+    """CSV con cabecera; cada bloque contiene como mucho un lote de filas"""
+    columns = ['_id', *fields, 'database']
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    rows = 0
+    for name, doc in iter_documents(shards, fields, batch_size, query):
+        row = [public_id(name, doc['_id'])]
+        for field in fields:
+            value = doc.get(field)
+            row.append(value.isoformat() if isinstance(value, datetime) else value)
+        row.append(name)
+        writer.writerow(row)
+        rows += 1
+        if rows >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            rows = 0
+    if buffer.tell():
+        yield buffer.getvalue()
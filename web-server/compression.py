@@ -0,0 +1,122 @@
+# Compresion negociada de respuestas (gzip / brotli)
+# Se aplica en after_request a las respuestas de texto (JSON, NDJSON, CSV,
+# HTML...) que superan un umbral. Las respuestas en streaming (exportacion,
+# busqueda NDJSON) se comprimen bloque a bloque sin materializarlas.
+# El ETag fuerte de una respuesta comprimida recibe la codificacion como
+# sufijo: los bytes ya no son los de la representacion sin comprimir.
+import gzip, zlib
+
+from flask import request
+
+from etags import coded_etag
+
+try:
+    import brotli
+except ImportError:  # Dependencia opcional
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'application/javascript')
+
+
+class _GzipStream:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def process(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def process(self, data):
+        return self._compressor.process(data)
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class Compressor:
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=4, encodings=('br', 'gzip')):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = [e for e in encodings if e != 'br' or brotli is not None]
+
+    def init_app(self, app):
+        app.after_request(self.after_request)
+
+    def choose_encoding(self, accept_encoding):
+        """Primera codificacion soportada que el cliente acepta (q > 0)"""
+        for encoding in self.encodings:
+            if accept_encoding[encoding] > 0:
+                return encoding
+        return None
+
+    @staticmethod
+    def compressible(response):
+        mimetype = response.mimetype or ''
+        return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+    def _stream(self, chunks, encoding):
+        stream = _BrotliStream(self.brotli_quality) if encoding == 'br' else _GzipStream(self.gzip_level)
+        for chunk in chunks:
+            data = stream.process(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield stream.finish()
+
+    @staticmethod
+    def code_etag(response, encoding):
+        """Agrega la codificacion al ETag fuerte de una respuesta comprimida"""
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(coded_etag(etag, encoding))
+
+    def not_modified(self, response, if_none_match):
+        """El 304 repite el ETag que el cliente tiene guardado (el comprimido)"""
+        etag, weak = response.get_etag()
+        if not etag or weak:
+            return response
+        for encoding in self.encodings:
+            if if_none_match.contains_raw(f'"{coded_etag(etag, encoding)}"'):
+                response.set_etag(coded_etag(etag, encoding))
+                break
+        return response
+
+    def after_request(self, response):
+        if response.status_code == 304:
+            return self.not_modified(response, request.if_none_match)
+        if not self.encodings or response.status_code < 200 or response.status_code == 204:
+            return response
+        if 'Content-Encoding' in response.headers or not self.compressible(response):
+            return response
+        if response.direct_passthrough or response.status_code == 206:
+            # Archivos (send_file) y rangos se sirven tal cual
+            return response
+        encoding = self.choose_encoding(request.accept_encodings)
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            # Streaming: se comprime cada bloque al vuelo
+            response.response = self._stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            response.set_data(self.compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+        self.code_etag(response, encoding)
+        return response
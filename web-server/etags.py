@@ -0,0 +1,73 @@
+# ETags de productos y de listados
+# Cada producto lleva un contador 'version' que se incrementa en cada
+# escritura; su ETag se deriva del ID publico, la version y updated_at.
+# Cada shard mantiene ademas una version de coleccion en 'product_meta' que
+# se incrementa tras cualquier escritura; el ETag de un listado combina los
+# parametros de la consulta con las versiones de los shards consultados, de
+# modo que se puede responder 304 sin ejecutar la consulta ni serializar.
+# Una respuesta comprimida es otra representacion: su ETag lleva la
+# codificacion como sufijo ("<etag>-gzip") y las comparaciones de
+# If-None-Match / If-Match lo ignoran.
+import hashlib
+
+META_COLLECTION = 'product_meta'
+VERSION_FIELD = 'version'
+META_ID = 'products'
+CODINGS = ('gzip', 'br')
+
+
+def product_etag(public_product_id, version, updated_at):
+    """ETag fuerte de un producto (sin comillas)"""
+    stamp = updated_at.isoformat() if hasattr(updated_at, 'isoformat') else str(updated_at)
+    raw = f"{public_product_id}:{version or 0}:{stamp}".encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()[:20]
+
+
+def listing_etag(query_key, versions):
+    """ETag de una pagina del listado a partir de sus parametros y de la
+    version de cada shard"""
+    raw = repr((query_key, sorted(versions.items()))).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()[:20]
+
+
+def coded_etag(etag, encoding):
+    """ETag de la representacion comprimida con `encoding`"""
+    return f"{etag}-{encoding}"
+
+
+def strip_coding(etag):
+    """ETag sin el sufijo de codificacion que agrega la compresion"""
+    for encoding in CODINGS:
+        if etag.endswith(f"-{encoding}"):
+            return etag[:-len(encoding) - 1]
+    return etag
+
+
+def _contains(tags, etag, include_weak):
+    if tags.star_tag:
+        return True
+    return any(strip_coding(tag) == etag for tag in tags.as_set(include_weak))
+
+
+def none_match(tags, etag):
+    """If-None-Match (comparacion debil) contiene el ETag, con o sin codificacion"""
+    return _contains(tags, etag, include_weak=True)
+
+
+def match(tags, etag):
+    """If-Match (comparacion fuerte) contiene el ETag, con o sin codificacion"""
+    return _contains(tags, etag, include_weak=False)
+
+
+def bump_collection_version(db):
+    """Marca que la coleccion de productos del shard cambio. Debe llamarse
+    despues de la escritura: un lector que vea la nueva version ya ve los datos"""
+    db[META_COLLECTION].update_one({'_id': META_ID}, {'$inc': {VERSION_FIELD: 1}}, upsert=True)
+
+
+def collection_version(collection):
+    """Version de la coleccion de productos leida con la misma preferencia
+    de lectura que la coleccion indicada"""
+    meta = collection.database.get_collection(META_COLLECTION, read_preference=collection.read_preference)
+    doc = meta.find_one({'_id': META_ID}, {VERSION_FIELD: 1})
+    return doc.get(VERSION_FIELD, 0) if doc else 0
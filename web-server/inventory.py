@@ -0,0 +1,271 @@
+# Ajustes atomicos de stock y reservas de varios productos
+# Cada ajuste es un $inc condicional (el stock nunca queda negativo) en una
+# sola operacion find_one_and_update, sin leer-modificar-escribir. Las
+# reservas agrupan los productos por shard: en cada shard se descuentan
+# todos dentro de una transaccion (un bulk_write), y si algun shard no
+# puede completar su parte se devuelve el stock ya descontado en los demas.
+#
+# Cada reserva deja en el shard un registro con su id (coleccion
+# stock_reservations) escrito en la misma transaccion que los descuentos.
+# La compensacion se hace por id y es idempotente: devuelve el stock de un
+# registro 'held' una sola vez, y si el shard aun no tiene el registro (no
+# respondio a tiempo) deja una marca 'cancelled' para que una confirmacion
+# tardia choque con ella y no descuente nada. Las compensaciones que fallan
+# quedan en ReleaseRetrier y se reintentan en segundo plano.
+#
+# Idas y vueltas por shard: el descuento de todos los productos es un solo
+# bulk_write, pero con el registro la transaccion suma el insert en
+# stock_reservations y el commit (3 en total; el inicio viaja con el primer
+# comando). El registro no puede ir en el mismo bulk_write porque esta en
+# otra coleccion (hasta MongoClient.bulk_write de pymongo 4.9 / MongoDB 8.0),
+# y es lo que hace idempotente la compensacion; por eso se acepta el costo.
+import threading
+from datetime import datetime
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import ConfigurationError, DuplicateKeyError, OperationFailure, PyMongoError
+
+from etags import VERSION_FIELD, bump_collection_version
+from shard_migration import NOT_MIGRATING
+
+STOCK_PROJECTION = {'name': 1, 'stock': 1, 'updated_at': 1, VERSION_FIELD: 1}
+RESERVATIONS_COLLECTION = 'stock_reservations'
+HELD, RELEASING, RELEASED, CONFIRMED, CANCELLED = 'held', 'releasing', 'released', 'confirmed', 'cancelled'
+# Codigos de MongoDB cuando el servidor no admite transacciones (standalone)
+_NO_TRANSACTIONS = (20, 263)
+
+
+class ReservationCancelled(Exception):
+    """La reserva ya se habia cancelado en este shard (llego tarde)"""
+
+
+class InsufficientStock(Exception):
+    """Alguno de los productos no tiene stock suficiente (o no existe)"""
+
+    def __init__(self, items):
+        self.items = items  # lista de {'_id', 'requested', 'available'}
+        super().__init__('Stock insuficiente para completar la reserva')
+
+
+def stock_filter(object_id, delta):
+    """Filtro que solo coincide si el ajuste deja el stock en cero o mas"""
+    query = {'_id': object_id, **NOT_MIGRATING}
+    if delta < 0:
+        query['stock'] = {'$gte': -delta}
+    return query
+
+
+def stock_update(delta, now):
+    return {'$inc': {'stock': delta, VERSION_FIELD: 1}, '$set': {'updated_at': now}}
+
+
+def adjust_stock(collection, object_id, delta, now):
+    """Aplica el ajuste y devuelve el producto actualizado, o None si no
+    existe o no hay stock suficiente"""
+    return collection.find_one_and_update(
+        stock_filter(object_id, delta), stock_update(delta, now),
+        projection=STOCK_PROJECTION, return_document=ReturnDocument.AFTER
+    )
+
+
+def _shortages(collection, items):
+    # Solo en el camino de error: que productos impidieron la reserva
+    quantities = dict(items)
+    available = {doc['_id']: doc.get('stock', 0) for doc in
+                 collection.find({'_id': {'$in': list(quantities)}}, {'stock': 1})}
+    return [{'_id': object_id, 'requested': quantity, 'available': available.get(object_id)}
+            for object_id, quantity in quantities.items()
+            if available.get(object_id, 0) < quantity]
+
+
+def ensure_reservation_indexes(shard, ttl_seconds):
+    # Los registros solo sirven para compensar: se borran pasado el plazo
+    shard.db[RESERVATIONS_COLLECTION].create_index('created_at', expireAfterSeconds=ttl_seconds)
+
+
+class ShardReservations:
+    """Reservas en un shard. Recuerda si el shard admite transacciones para
+    no intentarlo en cada peticion cuando es un servidor standalone."""
+
+    def __init__(self, shard):
+        self.shard = shard
+        self.transactions = True
+        self.records = shard.db[RESERVATIONS_COLLECTION]
+
+    def _record(self, reservation_id, items, now):
+        return {'_id': reservation_id, 'status': HELD, 'created_at': now,
+                'items': [{'_id': object_id, 'quantity': quantity} for object_id, quantity in items]}
+
+    def reserve(self, reservation_id, items, now):
+        """Descuenta [(object_id, cantidad)] de forma todo-o-nada en el shard.
+        Lanza InsufficientStock o ReservationCancelled sin descontar nada."""
+        reserved = False
+        if self.transactions:
+            try:
+                self._reserve_transaction(reservation_id, items, now)
+                reserved = True
+            except (ConfigurationError, OperationFailure) as e:
+                if isinstance(e, OperationFailure) and e.code not in _NO_TRANSACTIONS:
+                    raise
+                self.transactions = False
+        if not reserved:
+            self._reserve_each(reservation_id, items, now)
+        bump_collection_version(self.shard.db)
+
+    def _reserve_transaction(self, reservation_id, items, now):
+        collection = self.shard.collection
+        operations = [UpdateOne(stock_filter(object_id, -quantity), stock_update(-quantity, now))
+                      for object_id, quantity in items]
+
+        def callback(session):
+            # Primero el registro: si ya hay una marca de cancelacion, no se descuenta nada
+            try:
+                self.records.insert_one(self._record(reservation_id, items, now), session=session)
+            except DuplicateKeyError:
+                raise ReservationCancelled(reservation_id)
+            result = collection.bulk_write(operations, ordered=False, session=session)
+            if result.matched_count < len(operations):
+                # Salir con excepcion aborta la transaccion: nada se descuenta
+                raise InsufficientStock(_shortages(collection, items))
+
+        with self.shard.client.start_session() as session:
+            # with_transaction reintenta TransientTransactionError y
+            # UnknownTransactionCommitResult
+            session.with_transaction(callback)
+
+    def _reserve_each(self, reservation_id, items, now):
+        # Sin transacciones: un $inc condicional por producto y compensacion
+        # de los ya aplicados si alguno falla. El registro guarda los aplicados.
+        collection = self.shard.collection
+        record = self._record(reservation_id, [], now)
+        try:
+            self.records.insert_one(record)
+        except DuplicateKeyError:
+            raise ReservationCancelled(reservation_id)
+        for object_id, quantity in items:
+            result = collection.update_one(stock_filter(object_id, -quantity), stock_update(-quantity, now))
+            if not result.matched_count:
+                self.release(reservation_id, now)
+                raise InsufficientStock(_shortages(collection, items))
+            self.records.update_one({'_id': reservation_id},
+                                    {'$push': {'items': {'_id': object_id, 'quantity': quantity}}})
+
+    def confirm(self, reservation_id):
+        self.records.update_one({'_id': reservation_id, 'status': HELD}, {'$set': {'status': CONFIRMED}})
+
+    def release(self, reservation_id, now):
+        """Devuelve el stock de la reserva (compensacion). Idempotente: se
+        puede repetir sin devolver dos veces."""
+        while True:
+            if self._release_held(reservation_id, now):
+                return
+            # Sin registro 'held': dejar la marca para que una reserva tardia se aborte
+            result = self.records.update_one(
+                {'_id': reservation_id},
+                {'$setOnInsert': {'status': CANCELLED, 'created_at': now, 'items': []}},
+                upsert=True
+            )
+            if result.upserted_id is not None:
+                return
+            current = self.records.find_one({'_id': reservation_id}, {'status': 1})
+            if current is None or current['status'] != HELD:
+                # Ya devuelta o cancelada (o 'releasing' de un intento anterior)
+                if current is not None and current['status'] == RELEASING:
+                    self._finish_release(current['_id'], now)
+                return
+
+    def _release_held(self, reservation_id, now):
+        if self.transactions:
+            def callback(session):
+                record = self.records.find_one_and_update(
+                    {'_id': reservation_id, 'status': HELD}, {'$set': {'status': RELEASED, 'released_at': now}},
+                    session=session
+                )
+                if record is not None:
+                    self._return_stock(record['items'], now, session)
+                return record is not None
+            try:
+                with self.shard.client.start_session() as session:
+                    released = session.with_transaction(callback)
+            except (ConfigurationError, OperationFailure) as e:
+                if isinstance(e, OperationFailure) and e.code not in _NO_TRANSACTIONS:
+                    raise
+                self.transactions = False
+            else:
+                if released:
+                    bump_collection_version(self.shard.db)
+                return released
+        record = self.records.find_one_and_update(
+            {'_id': reservation_id, 'status': HELD}, {'$set': {'status': RELEASING}}
+        )
+        if record is None:
+            return False
+        self._finish_release(reservation_id, now, record['items'])
+        return True
+
+    def _finish_release(self, reservation_id, now, items=None):
+        if items is None:
+            items = self.records.find_one({'_id': reservation_id})['items']
+        self._return_stock(items, now)
+        self.records.update_one({'_id': reservation_id, 'status': RELEASING},
+                                {'$set': {'status': RELEASED, 'released_at': now}})
+        bump_collection_version(self.shard.db)
+
+    def _return_stock(self, items, now, session=None):
+        if items:
+            self.shard.collection.bulk_write(
+                [UpdateOne({'_id': item['_id']}, stock_update(item['quantity'], now)) for item in items],
+                ordered=False, session=session
+            )
+
+
+class ReleaseRetrier:
+    """Compensaciones que fallaron (shard caido): se reintentan cada
+    `interval` segundos hasta que el shard responda"""
+
+    def __init__(self, reservations, interval=10.0, on_released=None):
+        self.reservations = reservations  # nombre de shard -> ShardReservations
+        self.interval = interval
+        self.on_released = on_released
+        self.retried = 0
+        self._pending = {}  # (shard, reservation_id) -> ultimo error
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, shard_name, reservation_id, error):
+        with self._lock:
+            self._pending[(shard_name, reservation_id)] = str(error)
+
+    def retry(self):
+        with self._lock:
+            pending = list(self._pending)
+        for shard_name, reservation_id in pending:
+            try:
+                self.reservations[shard_name].release(reservation_id, datetime.utcnow())
+            except PyMongoError as e:
+                self.add(shard_name, reservation_id, e)
+                continue
+            with self._lock:
+                self._pending.pop((shard_name, reservation_id), None)
+            self.retried += 1
+            if self.on_released is not None:
+                self.on_released(shard_name, reservation_id)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.retry()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name='reservation-release')
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            pending = [{'shard': shard, 'reservation_id': str(rid), 'error': error}
+                       for (shard, rid), error in self._pending.items()]
+        return {'pending': pending, 'retried': self.retried}
@@ -0,0 +1,104 @@
+# Serializacion JSON de las respuestas
+# Con orjson (si esta instalado) las respuestas se codifican en C, con
+# ObjectId y fechas resueltos en la misma pasada. Sin orjson, o con
+# JSON_SERIALIZER=std, se usa el proveedor estandar de Flask extendido para
+# entender ObjectId. Las fechas conservan el formato HTTP que ya devolvia
+# jsonify salvo que se pida ISO 8601 (JSON_DATETIME_FORMAT=iso). Decimal y
+# Decimal128 se escriben como texto, igual que jsonify con Decimal.
+from datetime import date, datetime, timezone
+
+from bson import Decimal128, ObjectId
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional
+    orjson = None
+
+DATETIME_FORMATS = ('http', 'iso')
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def format_http_date(value):
+    """Mismo resultado que werkzeug.http.http_date para datetime, sin pasar
+    por email.utils (es el costo dominante al serializar listados)"""
+    if not isinstance(value, datetime):
+        return http_date(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return (f"{_DAYS[value.weekday()]}, {value.day:02d} {_MONTHS[value.month - 1]} {value.year:04d} "
+            f"{value.hour:02d}:{value.minute:02d}:{value.second:02d} GMT")
+
+
+def default(value, datetime_format='http'):
+    """Valor JSON de los tipos que json/orjson no conocen. Es el mismo para
+    los dos proveedores y para los flujos NDJSON (exportacion, busqueda).
+    Lanza TypeError si el tipo no se puede serializar."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, (datetime, date)):
+        return value.isoformat() if datetime_format == 'iso' else format_http_date(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    # Decimal y el resto de tipos que entiende jsonify
+    return DefaultJSONProvider.default(value)
+
+
+class StdJSONProvider(DefaultJSONProvider):
+    """Proveedor de Flask (json de la biblioteca estandar) con ObjectId"""
+
+    datetime_format = 'http'
+
+    def dumps(self, obj, **kwargs):
+        kwargs.setdefault('default', self._encode)
+        return super().dumps(obj, **kwargs)
+
+    def _encode(self, value):
+        return default(value, self.datetime_format)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Proveedor basado en orjson. Los tipos que orjson no conoce (ObjectId,
+    Decimal, Decimal128...) pasan por `default`; las fechas se codifican de
+    forma nativa (ISO 8601) o en formato HTTP."""
+
+    datetime_format = 'http'
+
+    @property
+    def _options(self):
+        # Las claves no se ordenan (sort_keys de Flask): el orden no cambia el JSON
+        if self.datetime_format == 'http':
+            return orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        return orjson.OPT_NON_STR_KEYS
+
+    def _encode(self, value):
+        # Con formato iso orjson codifica las fechas y no llegan aqui
+        return default(value, self.datetime_format)
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self._encode, option=self._options).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        # Bytes directos: se evita el paso intermedio por str
+        body = orjson.dumps(obj, default=self._encode, option=self._options)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def configure(app, serializer='orjson', datetime_format='http'):
+    """Instala el proveedor JSON indicado en la app. Devuelve el nombre del
+    serializador efectivo ('std' si orjson no esta disponible)."""
+    if datetime_format not in DATETIME_FORMATS:
+        raise ValueError(f"JSON_DATETIME_FORMAT desconocido: {datetime_format}")
+    provider = OrjsonProvider if serializer == 'orjson' and orjson is not None else StdJSONProvider
+    app.json_provider_class = provider
+    app.json = provider(app)
+    app.json.datetime_format = datetime_format
+    return 'orjson' if provider is OrjsonProvider else 'std'
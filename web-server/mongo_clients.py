@@ -0,0 +1,33 @@
+# Clientes MongoDB de los shards de productos
+# En el modo asincrono (app_async.py) la app Flask del mismo proceso no abre
+# pools propios: cada cliente de Motor envuelve un MongoClient de pymongo
+# (delegate) y la app Flask usa ese mismo MongoClient desde sus hilos. Asi
+# hay un solo pool por replica set, con los mismos listeners de metricas y
+# trazas, en lugar de uno por modo.
+from pymongo import MongoClient
+
+_async_factory = None
+# id(MongoClient) -> cliente asincrono que lo envuelve
+_async_clients = {}
+
+
+def use_async(factory):
+    """Los clientes creados despues seran factory(url, **opciones) y create()
+    devolvera su MongoClient. Se llama antes de importar app."""
+    global _async_factory
+    _async_factory = factory
+
+
+def create(url, **options):
+    """client_factory de ShardRouter: MongoClient, o el delegate de un
+    cliente asincrono si se llamo a use_async"""
+    if _async_factory is None:
+        return MongoClient(url, **options)
+    async_client = _async_factory(url, **options)
+    _async_clients[id(async_client.delegate)] = async_client
+    return async_client.delegate
+
+
+def async_client(client):
+    """Cliente asincrono que envuelve el MongoClient `client` (creado con create)"""
+    return _async_clients[id(client)]
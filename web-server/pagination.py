@@ -0,0 +1,177 @@
+# Paginacion por cursor sobre varios fragmentos (shards) de productos
+# Cada shard se consulta con un orden respaldado por indice y un limite; los
+# flujos ya ordenados se combinan con un k-way merge, de modo que solo se
+# materializa una pagina. El cursor guarda la posicion de cada shard para
+# continuar sin skip/offset.
+import base64, heapq, json
+
+from bson import json_util
+
+# Campos por los que se permite ordenar (todos tienen indice {campo, _id})
+SORT_FIELDS = ('name', 'price', 'stock', 'created_at', 'updated_at')
+DEFAULT_SORT = 'name'
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class InvalidCursor(ValueError):
+    """Cursor mal formado o que no corresponde a la consulta"""
+
+
+def parse_sort(value):
+    """'price' -> ('price', 1); '-price' -> ('price', -1)"""
+    value = (value or DEFAULT_SORT).strip()
+    direction = -1 if value.startswith('-') else 1
+    field = value.lstrip('-+')
+    if field not in SORT_FIELDS:
+        raise ValueError(f"Campo de orden no permitido: {field}. Opciones: {', '.join(SORT_FIELDS)}")
+    return field, direction
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    if value in (None, ''):
+        return default
+    limit = int(value)
+    if limit < 1:
+        raise ValueError('El parametro limit debe ser mayor que 0')
+    return min(limit, maximum)
+
+
+def encode_cursor(state):
+    raw = json_util.dumps(state, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        state = json_util.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise InvalidCursor('Cursor invalido')
+    if not isinstance(state, dict) or 'pos' not in state:
+        raise InvalidCursor('Cursor invalido')
+    return state
+
+
+def sort_spec(field, direction):
+    return [(field, direction), ('_id', direction)]
+
+
+def after_filter(field, direction, position):
+    """Filtro que reanuda un shard justo despues de (valor, _id).
+
+    MongoDB ordena los nulos (o el campo ausente) antes que cualquier valor
+    en orden ascendente y despues en descendente; `{campo: {$gt: None}}` no
+    coincide con nada, por eso los nulos se tratan aparte."""
+    value, last_id = position
+    op = '$gt' if direction == 1 else '$lt'
+    if value is None:
+        same = {field: None, '_id': {op: last_id}}
+        if direction == 1:
+            # Quedan los nulos con _id mayor y despues todos los valores
+            return {'$or': [same, {field: {'$ne': None}}]}
+        # Descendente: los nulos son el final, solo quedan los de _id menor
+        return same
+    clauses = [
+        {field: {op: value}},
+        {field: value, '_id': {op: last_id}}
+    ]
+    if direction == -1:
+        # Los nulos van despues de cualquier valor en orden descendente
+        clauses.append({field: None})
+    return {'$or': clauses}
+
+
+def _merge_key(field):
+    # (presente, valor, _id): los documentos sin el campo van primero como en MongoDB
+    def key(item):
+        doc = item[1]
+        value = doc.get(field)
+        return (value is not None, value if value is not None else 0, doc['_id'])
+    return key
+
+
+def _shard_stream(shard_name, cursor):
+    for doc in cursor:
+        yield shard_name, doc
+
+
+def prepare_queries(shards, sort_field, direction, cursor_state=None, base_filter=None, query_key=''):
+    """Valida el cursor y arma la consulta de cada shard.
+
+    Devuelve (sort_key, positions, [(nombre, coleccion, consulta)])."""
+    sort_key = f"{'-' if direction == -1 else ''}{sort_field}"
+    positions = {}
+    if cursor_state:
+        if cursor_state.get('sort') != sort_key:
+            raise InvalidCursor('El cursor corresponde a otro orden')
+        if cursor_state.get('q', '') != query_key:
+            raise InvalidCursor('El cursor corresponde a otros filtros')
+        positions = cursor_state.get('pos', {})
+
+    queries = []
+    for name, collection in shards:
+        query = dict(base_filter or {})
+        if positions.get(name):
+            query = {'$and': [query, after_filter(sort_field, direction, positions[name])]} if query \
+                else after_filter(sort_field, direction, positions[name])
+        queries.append((name, collection, query))
+    return sort_key, positions, queries
+
+
+def merge_page(batches, limit, sort_field, direction, sort_key, positions, query_key=''):
+    """Combina los lotes ya ordenados de cada shard (lista de (nombre,
+    documentos)) y devuelve (items, next_state)"""
+    streams = [_shard_stream(name, docs) for name, docs in batches]
+    merged = heapq.merge(*streams, key=_merge_key(sort_field), reverse=direction == -1)
+    items = []
+    has_more = False
+    for item in merged:
+        if len(items) == limit:
+            has_more = True
+            break
+        items.append(item)
+
+    if not has_more:
+        return items, None
+
+    new_positions = dict(positions)
+    for name, doc in items:
+        new_positions[name] = [doc.get(sort_field), doc['_id']]
+    state = {'sort': sort_key, 'pos': new_positions}
+    if query_key:
+        state['q'] = query_key
+    return items, state
+
+
+def fetch_page(shards, limit, sort_field, direction, cursor_state=None, base_filter=None,
+               projection=None, executor=None, query_key=''):
+    """Obtiene una pagina ordenada combinando todos los shards.
+
+    shards: lista de (nombre, coleccion)
+    executor: ScatterGather opcional para consultar los shards a la vez
+    query_key: huella de los filtros; el cursor solo es valido con los mismos
+    Devuelve (items, next_state, errors) donde items es una lista de
+    (shard, doc), next_state es None cuando no hay mas resultados y errors
+    indica los shards que no respondieron.
+    """
+    sort_key, positions, queries = prepare_queries(shards, sort_field, direction, cursor_state,
+                                                   base_filter, query_key)
+    cursors = []
+    for name, collection, query in queries:
+        # limit + 1 por shard basta para llenar la pagina y saber si hay mas
+        cursor = collection.find(query, projection).sort(sort_spec(sort_field, direction)) \
+            .limit(limit + 1).batch_size(limit + 1)
+        cursors.append((name, cursor))
+
+    errors = {}
+    if executor is not None:
+        # Cada shard devuelve como mucho limit + 1 documentos: se leen a la vez
+        gathered = executor.gather(cursors, list)
+        errors = gathered.errors
+        batches = [(name, gathered.results[name]) for name, _ in cursors if name in gathered.results]
+    else:
+        batches = cursors
+
+    items, state = merge_page(batches, limit, sort_field, direction, sort_key, positions, query_key)
+    return items, state, errors
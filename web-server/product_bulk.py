@@ -0,0 +1,208 @@
+# Importacion masiva de productos agrupada por shard
+# Las filas (arreglo JSON o NDJSON) se validan en una sola pasada, se
+# reparten segun el shard que les corresponde y cada shard recibe lotes
+# desordenados (insert_many / bulk_write con ordered=False) en paralelo.
+# El resultado se informa fila por fila, en el orden de entrada.
+import json
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from etags import VERSION_FIELD
+from product_ids import public_id
+from product_search import NAME_FIELD
+from shard_migration import MIGRATING_FIELD
+from shard_router import normalize_name
+
+DEFAULT_BATCH_SIZE = 1000
+REQUIRED_FIELDS = ('name', 'price', 'stock')
+
+
+class BulkRequestError(ValueError):
+    """El cuerpo de la peticion no se puede interpretar"""
+
+
+class BulkTooLarge(BulkRequestError):
+    """El lote supera el maximo de filas permitido"""
+
+
+def parse_rows(raw, ndjson=False, max_rows=None):
+    """Lista de filas a partir del cuerpo. En NDJSON una linea mal formada
+    se conserva como error de esa fila en lugar de rechazar todo el lote."""
+    if ndjson:
+        rows = []
+        for line in raw.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                rows.append(BulkRequestError(f"JSON invalido: {e}"))
+    else:
+        try:
+            rows = json.loads(raw or b'null')
+        except ValueError as e:
+            raise BulkRequestError(f"JSON invalido: {e}")
+        if isinstance(rows, dict):
+            rows = rows.get('products')
+        if not isinstance(rows, list):
+            raise BulkRequestError('Se esperaba un arreglo de productos')
+    if max_rows and len(rows) > max_rows:
+        raise BulkTooLarge(f"Demasiadas filas: {len(rows)} (maximo {max_rows})")
+    return rows
+
+
+def validate_name(name):
+    """Lanza ValueError si el nombre no es un texto con contenido"""
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError('El nombre del producto es requerido')
+    return name
+
+
+def validate_numbers(price, stock):
+    """(price, stock) convertidos; lanza ValueError si no son numericos"""
+    try:
+        return float(price), int(stock)
+    except (TypeError, ValueError):
+        raise ValueError('price y stock deben ser numericos')
+
+
+def validate_row(row, now):
+    """Documento listo para guardar a partir de una fila, con las mismas
+    reglas que create_product. Lanza ValueError si la fila no es valida."""
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError('Cada fila debe ser un objeto JSON')
+    for field in REQUIRED_FIELDS:
+        if field not in row:
+            raise ValueError(f"Campo requerido: {field}")
+    validate_name(row['name'])
+    price, stock = validate_numbers(row['price'], row['stock'])
+    return {
+        'name': row['name'],
+        'description': row.get('description', ''),
+        'price': price,
+        'stock': stock,
+        'category': row.get('category', 'General'),
+        'created_at': now,
+        'updated_at': now,
+        NAME_FIELD: normalize_name(row['name']),
+        VERSION_FIELD: 1
+    }
+
+
+def legacy_placements(router, documents):
+    """{nombre normalizado: shard} de los documentos cuyo nombre ya existe en
+    el shard donde lo guardaba el enrutado anterior a la normalizacion. Una
+    consulta por shard para todo el lote."""
+    keys_by_shard = {}
+    for doc in documents:
+        legacy = router.legacy_route(doc['name'])
+        if legacy is not None:
+            keys_by_shard.setdefault(legacy.name, (legacy, set()))[1].add(doc[NAME_FIELD])
+    placements = {}
+    for shard, keys in keys_by_shard.values():
+        for existing in shard.collection.find({NAME_FIELD: {'$in': list(keys)}}, {NAME_FIELD: 1}):
+            placements[existing[NAME_FIELD]] = shard
+    return placements
+
+
+def migrating_keys(shards, keys, batch_size=DEFAULT_BATCH_SIZE):
+    """Nombres normalizados de `keys` que algun shard tiene marcados en
+    migracion. Escribirlos ahora crearia una segunda copia en el destino."""
+    keys = list(keys)
+    found = set()
+    for shard in shards:
+        for start in range(0, len(keys), batch_size):
+            query = {NAME_FIELD: {'$in': keys[start:start + batch_size]}, MIGRATING_FIELD: {'$exists': True}}
+            found.update(doc[NAME_FIELD] for doc in shard.collection.find(query, {NAME_FIELD: 1}))
+    return found
+
+
+def _error(index, message):
+    return {'row': index, 'status': 'error', 'message': message}
+
+
+def unknown(index, shard_name, message):
+    """Fila enviada a un shard que no confirmo el resultado: pudo guardarse o no"""
+    return {'row': index, 'status': 'unknown', 'database': shard_name, 'message': message}
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def insert_rows(shard, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """Inserta (indice, documento) en un shard. Devuelve los resultados por fila."""
+    results = []
+    for chunk in _chunks(rows, batch_size):
+        documents = [doc for _, doc in chunk]
+        failed = {}
+        try:
+            shard.collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            failed = {error['index']: error.get('errmsg', 'Error de escritura')
+                      for error in e.details.get('writeErrors', [])}
+        except PyMongoError as e:
+            # Sin respuesta del servidor no se sabe que documentos del lote quedaron
+            results.extend(unknown(index, shard.name, str(e)) for index, _ in chunk)
+            continue
+        for position, (index, doc) in enumerate(chunk):
+            if position in failed:
+                results.append(_error(index, failed[position]))
+            else:
+                results.append({'row': index, 'status': 'created', 'database': shard.name,
+                                '_id': public_id(shard.name, doc['_id'])})
+    return results
+
+
+def upsert_rows(shard, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """Crea o actualiza (indice, documento) usando el nombre normalizado como
+    clave natural (indice unico por shard). Las claves marcadas en migracion
+    se descartan antes con migrating_keys(); si una marca aparece entre
+    medias, el indice unico rechaza la fila en lugar de duplicarla.
+    Devuelve los resultados por fila."""
+    results = []
+    for chunk in _chunks(rows, batch_size):
+        operations = []
+        for _, doc in chunk:
+            fields = {k: v for k, v in doc.items() if k not in ('created_at', VERSION_FIELD)}
+            operations.append(UpdateOne(
+                {NAME_FIELD: doc[NAME_FIELD], MIGRATING_FIELD: {'$exists': False}},
+                {'$set': fields, '$setOnInsert': {'created_at': doc['created_at']}, '$inc': {VERSION_FIELD: 1}},
+                upsert=True
+            ))
+        failed, upserted = {}, {}
+        try:
+            result = shard.collection.bulk_write(operations, ordered=False)
+            upserted = result.upserted_ids
+        except BulkWriteError as e:
+            failed = {error['index']: error.get('errmsg', 'Error de escritura')
+                      for error in e.details.get('writeErrors', [])}
+            upserted = {item['index']: item['_id'] for item in e.details.get('upserted', [])}
+        except PyMongoError as e:
+            results.extend(unknown(index, shard.name, str(e)) for index, _ in chunk)
+            continue
+        # Los documentos actualizados no devuelven su _id: una sola consulta por lote
+        updated_keys = [doc[NAME_FIELD] for position, (_, doc) in enumerate(chunk)
+                        if position not in failed and position not in upserted]
+        existing = {}
+        if updated_keys:
+            for doc in shard.collection.find({NAME_FIELD: {'$in': updated_keys}}, {NAME_FIELD: 1}):
+                existing.setdefault(doc[NAME_FIELD], doc['_id'])
+        for position, (index, doc) in enumerate(chunk):
+            if position in failed:
+                results.append(_error(index, failed[position]))
+                continue
+            object_id = upserted.get(position) or existing.get(doc[NAME_FIELD])
+            results.append({
+                'row': index,
+                'status': 'created' if position in upserted else 'updated',
+                'database': shard.name,
+                '_id': public_id(shard.name, object_id) if object_id else None
+            })
+    return results
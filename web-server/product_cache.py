@@ -0,0 +1,227 @@
+# Cache en memoria de lecturas de productos (LRU + TTL, limitada en bytes)
+# Guarda respuestas ya construidas de productos individuales y de paginas
+# del listado. Las escrituras de este web-server la invalidan directamente y
+# los change streams de cada shard la invalidan cuando escribe otra instancia.
+# Una lectura que se cruza con una invalidacion no puede reinstalar el valor
+# viejo: se toma token() antes de ir a MongoDB y put_* descarta el valor si
+# la clave se invalido despues.
+import threading, time
+from collections import OrderedDict
+
+import bson
+from pymongo.errors import ConnectionFailure, OperationFailure, PyMongoError
+
+# CappedPositionLost, ChangeStreamFatalError, ChangeStreamHistoryLost: el
+# token de reanudacion ya no esta en el oplog
+HISTORY_LOST_CODES = (136, 280, 286)
+
+
+def _estimate_size(value):
+    try:
+        return len(bson.encode({'v': value}))
+    except Exception:
+        return len(repr(value))
+
+
+class ProductCache:
+    PRODUCT, PAGE = 'product', 'page'
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, product_ttl=30.0, page_ttl=10.0):
+        self.max_bytes = max_bytes
+        self.ttl = {self.PRODUCT: product_ttl, self.PAGE: page_ttl}
+        self._entries = OrderedDict()  # (tipo, clave) -> (valor, tamano, expira)
+        self._page_keys = set()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Generaciones: cada invalidacion avanza _generation. Se recuerda la
+        # ultima de cada producto (solo durante la vida maxima de un token),
+        # la de las paginas (todas se invalidan juntas) y la del ultimo clear()
+        self._generation = 0
+        self._invalidated = OrderedDict()  # (tipo, clave) -> (generacion, instante)
+        self._pages_generation = 0
+        self._cleared_generation = 0
+        self._token_ttl = max(product_ttl, page_ttl)
+        self.stale_puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    # ---------- Operaciones basicas ----------
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _stale(self, key, token):
+        generation, taken = token
+        if time.monotonic() - taken > self._token_ttl:
+            # Lectura mas larga que la vida de las entradas: no vale la pena
+            return True
+        if self._cleared_generation > generation:
+            return True
+        if key[0] == self.PAGE:
+            return self._pages_generation > generation
+        return self._invalidated.get(key, (0, 0))[0] > generation
+
+    def _put(self, key, value, token=None):
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if token is not None and self._stale(key, token):
+                self.stale_puts += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl[key[0]])
+            self._bytes += size
+            if key[0] == self.PAGE:
+                self._page_keys.add(key)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        self._page_keys.discard(key)
+
+    # ---------- API ----------
+
+    def token(self):
+        """Se toma antes de leer de MongoDB y se pasa a put_product/put_page"""
+        with self._lock:
+            return self._generation, time.monotonic()
+
+    def get_product(self, object_id):
+        return self._get((self.PRODUCT, str(object_id)))
+
+    def put_product(self, object_id, value, token=None):
+        self._put((self.PRODUCT, str(object_id)), value, token)
+
+    def get_page(self, page_key):
+        return self._get((self.PAGE, page_key))
+
+    def put_page(self, page_key, value, token=None):
+        self._put((self.PAGE, page_key), value, token)
+
+    def invalidate(self, object_id=None):
+        """Invalida un producto (si se indica) y todas las paginas cacheadas,
+        ya que cualquier escritura puede cambiar su contenido"""
+        with self._lock:
+            self.invalidations += 1
+            self._generation += 1
+            self._pages_generation = self._generation
+            now = time.monotonic()
+            key = (self.PRODUCT, str(object_id))
+            if object_id is not None:
+                if key in self._entries:
+                    self._remove(key)
+                self._invalidated.pop(key, None)
+                self._invalidated[key] = (self._generation, now)
+            # Ningun token aceptado es mas viejo que _token_ttl
+            while self._invalidated:
+                oldest = next(iter(self._invalidated))
+                if now - self._invalidated[oldest][1] <= self._token_ttl:
+                    break
+                del self._invalidated[oldest]
+            for page_key in list(self._page_keys):
+                self._remove(page_key)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._cleared_generation = self._generation
+            self._invalidated.clear()
+            self._entries.clear()
+            self._page_keys.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            entries, size, pages = len(self._entries), self._bytes, len(self._page_keys)
+        total = self.hits + self.misses
+        return {
+            'entries': entries,
+            'page_entries': pages,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'stale_puts': self.stale_puts
+        }
+
+
+class ChangeStreamInvalidator:
+    """Un hilo por shard que escucha el change stream de la coleccion de
+    productos e invalida la cache ante cualquier cambio. Requiere replica
+    sets; si el shard no los soporta se reintenta con espera creciente."""
+
+    def __init__(self, cache, shards, retry_seconds=5.0, max_retry_seconds=300.0):
+        self.cache = cache
+        self.shards = shards
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self._stop = threading.Event()
+        self.status = {shard.name: 'disabled' for shard in shards}
+
+    def start(self):
+        for shard in self.shards:
+            self.status[shard.name] = 'starting'
+            threading.Thread(target=self._watch, args=(shard,), daemon=True,
+                             name=f"cache-watch-{shard.tag}").start()
+
+    def stop(self):
+        self._stop.set()
+
+    @staticmethod
+    def can_resume(error):
+        """Si el token de reanudacion sigue sirviendo tras `error`: errores de
+        red o con la etiqueta ResumableChangeStreamError, salvo que el
+        historial del oplog ya no lo contenga"""
+        if isinstance(error, OperationFailure) and error.code in HISTORY_LOST_CODES:
+            return False
+        return isinstance(error, ConnectionFailure) or error.has_error_label('ResumableChangeStreamError')
+
+    def _watch(self, shard):
+        resume_token = None
+        delay = self.retry_seconds
+        while not self._stop.is_set():
+            try:
+                with shard.collection.watch(resume_after=resume_token, max_await_time_ms=1000) as stream:
+                    self.status[shard.name] = 'watching'
+                    delay = self.retry_seconds
+                    while not self._stop.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is None:
+                            continue
+                        resume_token = stream.resume_token
+                        document_key = change.get('documentKey') or {}
+                        self.cache.invalidate(document_key.get('_id'))
+            except PyMongoError as e:
+                # Tras un corte los cambios intermedios pueden haberse perdido
+                self.cache.clear()
+                self.status[shard.name] = f"error: {e}"
+                if not self.can_resume(e):
+                    resume_token = None
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.max_retry_seconds)
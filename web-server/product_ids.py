@@ -0,0 +1,24 @@
+# IDs publicos de productos con el shard codificado
+# Formato: "<shard>-<ObjectId>" (p. ej. "db2-673a1b2c3d4e5f6a7b8c9d0e"). Con el
+# prefijo una busqueda por ID va directo al shard que contiene el producto;
+# los ObjectId sin prefijo (IDs antiguos) siguen funcionando buscando en
+# todos los shards.
+from bson import ObjectId
+from bson.errors import InvalidId
+
+SEPARATOR = '-'
+
+
+def public_id(shard, object_id):
+    return f"{shard.lower()}{SEPARATOR}{object_id}"
+
+
+def parse_public_id(value):
+    """Devuelve (shard, ObjectId). shard es None para IDs sin prefijo.
+    Lanza InvalidId si el ObjectId no es valido."""
+    if not value:
+        raise InvalidId('ID de producto vacio')
+    shard, sep, raw_id = value.rpartition(SEPARATOR)
+    if not sep:
+        return None, ObjectId(value)
+    return shard.lower(), ObjectId(raw_id)
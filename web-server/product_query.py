@@ -0,0 +1,95 @@
+# Filtros de productos que se empujan a cada shard como consultas indexadas
+# Tambien declara los indices compuestos que los respaldan y extrae del
+# explain() el plan ganador para detectar recorridos completos (COLLSCAN).
+import hashlib, json
+from datetime import datetime
+
+from pagination import SORT_FIELDS
+
+# Indices de productos en cada shard. Orden ESR (igualdad, orden, rango):
+# primero la categoria (igualdad), luego el campo de orden y el _id de desempate.
+PRODUCT_INDEXES = [
+    *[[(field, 1), ('_id', 1)] for field in SORT_FIELDS],
+    *[[('category', 1), (field, 1), ('_id', 1)] for field in SORT_FIELDS],
+]
+
+FILTER_PARAMS = ('category', 'min_price', 'max_price', 'stock_lt', 'updated_since')
+
+
+def _parse_datetime(value):
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError('updated_since debe ser una fecha ISO 8601')
+    # MongoDB guarda fechas UTC sin zona (datetime.utcnow en create_product)
+    if parsed.tzinfo is not None:
+        parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+    return parsed
+
+
+def _number(args, name, cast):
+    try:
+        return cast(args[name])
+    except (TypeError, ValueError):
+        raise ValueError(f"El parametro {name} debe ser numerico")
+
+
+def parse_filters(args):
+    """Convierte los parametros de la peticion en un filtro de MongoDB.
+    Lanza ValueError si algun valor no es valido."""
+    query = {}
+    if args.get('category'):
+        query['category'] = args['category']
+    price = {}
+    if args.get('min_price') not in (None, ''):
+        price['$gte'] = _number(args, 'min_price', float)
+    if args.get('max_price') not in (None, ''):
+        price['$lte'] = _number(args, 'max_price', float)
+    if price:
+        query['price'] = price
+    if args.get('stock_lt') not in (None, ''):
+        query['stock'] = {'$lt': _number(args, 'stock_lt', int)}
+    if args.get('updated_since'):
+        query['updated_at'] = {'$gte': _parse_datetime(args['updated_since'])}
+    return query
+
+
+def filter_key(args):
+    """Huella de los filtros para ligar un cursor de paginacion a su consulta"""
+    values = {name: args.get(name) for name in FILTER_PARAMS if args.get(name) not in (None, '')}
+    if not values:
+        return ''
+    raw = json.dumps(values, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()[:12]
+
+
+def _walk_plan(stage, found):
+    if not isinstance(stage, dict):
+        return
+    name = stage.get('stage')
+    if name:
+        found['stages'].append(name)
+        if name == 'IXSCAN' and stage.get('indexName'):
+            found['indexes'].append(stage['indexName'])
+    for key in ('inputStage', 'queryPlan'):
+        _walk_plan(stage.get(key), found)
+    for child in stage.get('inputStages', []):
+        _walk_plan(child, found)
+
+
+def summarize_explain(explain):
+    """Resumen del plan ganador y de las estadisticas de ejecucion"""
+    planner = explain.get('queryPlanner', {})
+    winning = planner.get('winningPlan', {})
+    found = {'stages': [], 'indexes': []}
+    _walk_plan(winning, found)
+    execution = explain.get('executionStats', {})
+    return {
+        'stages': found['stages'],
+        'indexes_used': found['indexes'],
+        'collection_scan': 'COLLSCAN' in found['stages'],
+        'n_returned': execution.get('nReturned'),
+        'keys_examined': execution.get('totalKeysExamined'),
+        'docs_examined': execution.get('totalDocsExamined'),
+        'execution_time_ms': execution.get('executionTimeMillis')
+    }
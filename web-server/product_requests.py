@@ -0,0 +1,156 @@
+# Reglas de las rutas de productos comunes a app.py (Flask) y app_async.py
+# Lectura y validacion de parametros, documento de alta y forma de las
+# respuestas. Cada app solo aporta la E/S (pool de hilos o event loop), de
+# modo que los dos modos responden igual a la misma peticion.
+import pagination
+import product_query
+import product_search
+from product_bulk import validate_name, validate_numbers, validate_row
+from product_ids import public_id
+from scatter_gather import ShardUnavailable
+from shard_router import normalize_name
+from shard_migration import NOT_MIGRATING, MIGRATING_FIELD, MIGRATING_SINCE_FIELD
+
+SEARCH_FORMATS = ('json', 'ndjson')
+# Campos internos que no se devuelven al cliente
+INTERNAL_FIELDS = (product_search.NAME_FIELD, MIGRATING_FIELD, MIGRATING_SINCE_FIELD)
+
+
+class ListingQuery:
+    """Parametros de GET /products. Lanza ValueError (o InvalidCursor) si
+    alguno no es valido."""
+
+    def __init__(self, args):
+        self.limit = pagination.parse_limit(args.get('limit'))
+        self.sort_field, self.direction = pagination.parse_sort(args.get('sort'))
+        self.after = args.get('after')
+        self.cursor_state = pagination.decode_cursor(self.after) if self.after else None
+        self.filters = product_query.parse_filters(args)
+        self.query_key = product_query.filter_key(args)
+        self.explain = args.get('explain', '').lower() == 'true'
+        # Clave de la pagina en la cache y en el ETag del listado
+        self.page_key = (self.limit, self.sort_field, self.direction, self.after or '', self.query_key)
+        self.base_filter = {**self.filters, **NOT_MIGRATING}
+
+
+class SearchQuery:
+    """Parametros de GET /products/search. Lanza ValueError si alguno no es valido."""
+
+    def __init__(self, args):
+        self.prefix = args.get('prefix', '')
+        self.output_format = args.get('format', 'json').lower()
+        if self.output_format not in SEARCH_FORMATS:
+            raise ValueError('Formato no soportado. Opciones: json, ndjson')
+        self.query = {**product_search.prefix_filter(self.prefix), **NOT_MIGRATING}
+        maximum = product_search.MAX_STREAM_LIMIT if self.output_format == 'ndjson' else pagination.MAX_LIMIT
+        self.limit = pagination.parse_limit(args.get('limit'), default=product_search.DEFAULT_LIMIT,
+                                            maximum=maximum)
+        self.after = args.get('after')
+        self.cursor_state = pagination.decode_cursor(self.after) if self.after else None
+        self.query_key = self.query[product_search.NAME_FIELD]['$gte']
+
+    def targets(self, shard_router, read_router):
+        """Con fragmentacion por rango solo se consultan los shards que pueden tener el prefijo"""
+        candidates = {shard.name for shard in shard_router.shards_for_prefix(self.prefix)}
+        return [(name, collection) for name, collection in read_router.targets('search_products')
+                if name in candidates]
+
+
+def require_any(targets, errors):
+    """Lanza ShardUnavailable si no respondio ninguno de los shards consultados"""
+    if errors and len(errors) >= len(targets):
+        raise ShardUnavailable(errors)
+
+
+def present_product(database, product):
+    """Producto listo para responder: sin campos internos y con el ID publico"""
+    for field in INTERNAL_FIELDS:
+        product.pop(field, None)
+    product['_id'] = public_id(database, product['_id'])
+    product['database'] = database
+    return product
+
+
+def page_body(items, next_state, errors, **extra):
+    """Cuerpo de una pagina del listado o de la busqueda"""
+    products = [present_product(database, product) for database, product in items]
+    return {
+        'count': len(products),
+        'products': products,
+        'next_cursor': pagination.encode_cursor(next_state) if next_state else None,
+        'has_more': next_state is not None,
+        **extra,
+        'partial': bool(errors),
+        'unavailable_shards': errors
+    }
+
+
+def explain_stats(plans, errors, query, sort_field, logger):
+    """Resumen por shard de los planes de explain(); los COLLSCAN se
+    registran en el log de la app"""
+    stats = {shard: product_query.summarize_explain(plan) for shard, plan in plans.items()}
+    for shard, summary in stats.items():
+        if summary['collection_scan']:
+            logger.warning("COLLSCAN en %s para el filtro %s ordenado por %s", shard, query, sort_field)
+    stats.update({shard: {'error': error} for shard, error in errors.items()})
+    return stats
+
+
+def new_product(data, now):
+    """Documento de un alta (mismas reglas que la importacion masiva).
+    Lanza ValueError si faltan campos o no son validos."""
+    return validate_row(data, now)
+
+
+def new_product_route(router, product_name):
+    """(shard, etiqueta, shard_anterior, consulta) de un alta. Si
+    shard_anterior no es None y la consulta encuentra el nombre en el (lo
+    guardo el enrutado anterior a la normalizacion), el alta va a ese shard
+    para no repartir la misma clave entre dos; el rebalanceador los mueve
+    juntos. Cada app solo ejecuta la consulta (count_documents)."""
+    shard, label = router.route(product_name)
+    legacy = router.legacy_route(product_name)
+    query = {product_search.NAME_FIELD: normalize_name(product_name)} if legacy is not None else None
+    return shard, label or shard.label, legacy, query
+
+
+def product_updates(data, now):
+    """Campos $set de PUT /products/<id> (solo los enviados), con las mismas
+    reglas que el alta. Lanza ValueError con el mensaje para el cliente."""
+    if not isinstance(data, dict):
+        raise ValueError('Se requiere un objeto JSON con los campos a actualizar')
+    updates = {'updated_at': now}
+    if 'name' in data:
+        updates['name'] = validate_name(data['name'])
+        updates[product_search.NAME_FIELD] = normalize_name(data['name'])
+    if 'description' in data:
+        updates['description'] = data['description']
+    if 'price' in data or 'stock' in data:
+        price, stock = validate_numbers(data.get('price', 0), data.get('stock', 0))
+        if 'price' in data:
+            updates['price'] = price
+        if 'stock' in data:
+            updates['stock'] = stock
+    if 'category' in data:
+        updates['category'] = data['category']
+    return updates
+
+
+def created_body(document, database, label):
+    """Respuesta de un alta a partir del documento insertado"""
+    product = present_product(database, dict(document))
+    product['created_at'] = product['created_at'].isoformat()
+    product['updated_at'] = product['updated_at'].isoformat()
+    product['database'] = label
+    return {'message': f'Producto creado exitosamente en {label}', 'product': product}
+
+
+def stock_delta(data):
+    """Delta de PATCH /products/<id>/stock. Lanza ValueError con el mensaje para el cliente."""
+    try:
+        delta = int((data or {})['delta'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('Campo requerido: delta (entero, negativo para descontar)')
+    if delta == 0:
+        raise ValueError('delta debe ser distinto de 0')
+    return delta
@@ -0,0 +1,101 @@
+# Busqueda de productos por prefijo del nombre
+# Cada producto guarda 'name_norm' (nombre sin acentos y en minusculas, la
+# misma forma que usa el enrutador) con un indice {name_norm, _id}. Un
+# prefijo se traduce en un rango [prefijo, sucesor) sobre ese indice y solo
+# se consultan los shards cuyo rango de nombres puede contener coincidencias.
+# Los resultados de cada shard llegan ordenados y se combinan en streaming.
+import heapq
+
+from pymongo import UpdateOne
+
+from pagination import after_filter
+from shard_router import normalize_name, prefix_upper_bound
+
+NAME_FIELD = 'name_norm'
+SEARCH_SORT = [(NAME_FIELD, 1), ('_id', 1)]
+SEARCH_INDEX = SEARCH_SORT
+# Un producto por nombre normalizado en cada shard (clave natural del upsert
+# masivo). Parcial: los documentos sin el campo aun no completado no chocan
+UNIQUE_NAME_INDEX = [(NAME_FIELD, 1)]
+UNIQUE_NAME_OPTIONS = {
+    'name': 'name_norm_unique',
+    'unique': True,
+    'partialFilterExpression': {NAME_FIELD: {'$type': 'string'}}
+}
+DEFAULT_LIMIT = 20
+MAX_STREAM_LIMIT = 5000
+
+
+def prefix_filter(prefix):
+    """Filtro de rango sobre el indice de nombres normalizados"""
+    key = normalize_name(prefix)
+    if not key:
+        raise ValueError('El parametro prefix es requerido')
+    return {NAME_FIELD: {'$gte': key, '$lt': prefix_upper_bound(key)}}
+
+
+def _merge_key(item):
+    doc = item[1]
+    return doc.get(NAME_FIELD) or '', doc['_id']
+
+
+def _shard_stream(name, collection, query, first_batch, batch_size, projection):
+    # Continua por rangos de (name_norm, _id) en lugar de mantener un cursor abierto
+    batch = first_batch
+    while batch:
+        # La posicion se toma antes de entregar los documentos (el consumidor los modifica)
+        position = (batch[-1].get(NAME_FIELD), batch[-1]['_id'])
+        for doc in batch:
+            yield name, doc
+        if len(batch) < batch_size:
+            return
+        resume = {'$and': [query, after_filter(NAME_FIELD, 1, position)]}
+        batch = list(collection.find(resume, projection).sort(SEARCH_SORT).limit(batch_size))
+
+
+def iter_matches(shards, query, limit, batch_size=DEFAULT_LIMIT, projection=None, executor=None):
+    """Genera (shard, documento) en orden de nombre normalizado combinando
+    los shards indicados; el primer lote de cada shard se pide a la vez.
+
+    Devuelve (generador, errores) donde errores son los shards que no
+    respondieron al primer lote.
+    """
+    batch_size = min(batch_size, limit)
+    if projection is not None:
+        projection = {**projection, NAME_FIELD: 1}
+
+    def first_batch(collection):
+        return list(collection.find(query, projection).sort(SEARCH_SORT).limit(batch_size))
+
+    if executor is not None:
+        gathered = executor.gather(shards, first_batch)
+        batches, errors = gathered.results, gathered.errors
+    else:
+        batches, errors = {name: first_batch(collection) for name, collection in shards}, {}
+
+    streams = [_shard_stream(name, collection, query, batches[name], batch_size, projection)
+               for name, collection in shards if name in batches]
+
+    def generate():
+        for count, item in enumerate(heapq.merge(*streams, key=_merge_key)):
+            if count == limit:
+                return
+            item[1].pop(NAME_FIELD, None)
+            yield item
+    return generate(), errors
+
+
+def backfill_names(collection, batch_size=500):
+    """Completa 'name_norm' en los productos creados antes de existir el
+    campo. Devuelve la cantidad de documentos actualizados."""
+    updated = 0
+    while True:
+        batch = list(collection.find({NAME_FIELD: {'$exists': False}}, {'name': 1}).limit(batch_size))
+        if not batch:
+            return updated
+        result = collection.bulk_write([
+            UpdateOne({'_id': doc['_id'], NAME_FIELD: {'$exists': False}},
+                      {'$set': {NAME_FIELD: normalize_name(doc.get('name'))}})
+            for doc in batch
+        ], ordered=False)
+        updated += result.modified_count
@@ -0,0 +1,57 @@
+# Enrutamiento de lecturas a los secundarios de cada replica set
+# Los endpoints de solo lectura que toleran datos algo atrasados (listados,
+# busqueda, exportacion) leen con secondaryPreferred y un maxStalenessSeconds
+# acotado; el resto, incluidas las lecturas que siguen a una escritura,
+# permanece en el primario.
+import threading
+from collections import defaultdict
+
+from pymongo.read_preferences import SecondaryPreferred
+
+# maxStalenessSeconds minimo que acepta MongoDB
+MIN_MAX_STALENESS = 90
+DEFAULT_SECONDARY_ENDPOINTS = ('list_products', 'search_products', 'export_products')
+
+
+class ReadRouter:
+    def __init__(self, router, secondary_endpoints=DEFAULT_SECONDARY_ENDPOINTS,
+                 max_staleness=MIN_MAX_STALENESS):
+        self.router = router
+        self.secondary_endpoints = set(secondary_endpoints)
+        self.max_staleness = max(int(max_staleness), MIN_MAX_STALENESS)
+        secondary = SecondaryPreferred(max_staleness=self.max_staleness)
+        self._primary = router.targets()
+        self._secondary_by_tag = {
+            shard.tag: shard.collection.with_options(read_preference=secondary)
+            for shard in router.shards
+        }
+        self._secondary = [(shard.name, self._secondary_by_tag[shard.tag]) for shard in router.shards]
+        self._counts = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def mode_for(self, endpoint):
+        return 'secondaryPreferred' if endpoint in self.secondary_endpoints else 'primary'
+
+    def targets(self, endpoint):
+        """(nombre, coleccion) de cada shard con la preferencia de lectura
+        que corresponde al endpoint"""
+        mode = self.mode_for(endpoint)
+        with self._lock:
+            self._counts[endpoint][mode] += 1
+        return self._secondary if mode == 'secondaryPreferred' else self._primary
+
+    def collection(self, endpoint, shard):
+        """Coleccion de un shard concreto segun el endpoint"""
+        mode = self.mode_for(endpoint)
+        with self._lock:
+            self._counts[endpoint][mode] += 1
+        return self._secondary_by_tag[shard.tag] if mode == 'secondaryPreferred' else shard.collection
+
+    def stats(self):
+        with self._lock:
+            decisions = {endpoint: dict(modes) for endpoint, modes in self._counts.items()}
+        return {
+            'secondary_endpoints': sorted(self.secondary_endpoints),
+            'max_staleness_seconds': self.max_staleness,
+            'decisions': decisions
+        }
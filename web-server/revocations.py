@@ -0,0 +1,87 @@
+# Lista de tokens revocados en el web-server
+# Con verificacion local (y con la cache de tokens) un token revocado en el
+# auth-server seguiria aceptandose hasta su 'exp'. Un hilo consulta
+# /auth/revocations de forma incremental y aplica las entradas a la misma
+# Denylist que usa el auth-server (token_revocation): jti revocados y
+# revocaciones por usuario (tokens emitidos antes de cierto instante, con
+# milisegundos), comprobadas por peticion sin consultar la base.
+import math, threading, time
+
+import requests
+
+from auth_client import CircuitOpenError, AuthClientBusy
+from token_revocation.denylist import KIND_USER, Denylist, access_token_ttl
+
+
+class RevocationList(Denylist):
+    """Denylist del web-server con revocacion local inmediata"""
+
+    def __init__(self, max_token_ttl=None, **options):
+        super().__init__(**options)
+        # Una revocacion por usuario dura lo que el token mas largo emitido
+        # antes (ACCESS_TOKEN_TTL, la misma vigencia que usa el auth-server)
+        self.max_token_ttl = access_token_ttl() if max_token_ttl is None else max_token_ttl
+
+    def revoke_user(self, username):
+        """Revocacion local inmediata (la del auth-server llega al sincronizar)"""
+        now = time.time()
+        # Primer milisegundo posterior: los tokens emitidos hasta ahora tienen iat menor
+        self.add(KIND_USER, username, int(now) + self.max_token_ttl, (math.floor(now * 1000) + 1) / 1000)
+
+
+class RevocationSync:
+    """Hilo que trae las revocaciones nuevas del auth-server"""
+
+    def __init__(self, auth_client, revocation_list, internal_key=None, poll_seconds=5.0):
+        self.auth_client = auth_client
+        self.revocations = revocation_list
+        self.internal_key = internal_key
+        self.poll_seconds = poll_seconds
+        self._cursor = None
+        self._stop = threading.Event()
+        self.status = 'disabled'
+        self.last_sync = None
+
+    def start(self):
+        self.status = 'starting'
+        threading.Thread(target=self._poll, daemon=True, name='revocation-sync').start()
+
+    def stop(self):
+        self._stop.set()
+
+    def headers(self):
+        return {'X-Internal-Key': self.internal_key} if self.internal_key else {}
+
+    def sync(self):
+        headers = self.headers()
+        params = {'since': self._cursor} if self._cursor else {}
+        while True:
+            response = self.auth_client.get('/auth/revocations', params=params, headers=headers)
+            if response.status_code != 200:
+                raise requests.RequestException(f'/auth/revocations respondio {response.status_code}')
+            data = response.json()
+            for entry in data.get('revocations', []):
+                self.revocations.add(entry['kind'], entry['value'], entry['expires_at'], entry.get('not_before'))
+            self._cursor = data.get('cursor') or self._cursor
+            if not data.get('has_more'):
+                break
+            params = {'after': self._cursor}
+        self.revocations.prune(int(time.time()))
+        self.last_sync = time.time()
+
+    def _poll(self):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+                self.status = 'synced'
+            except (CircuitOpenError, AuthClientBusy, requests.RequestException, ValueError) as e:
+                self.status = f"error: {e}"
+            self._stop.wait(self.poll_seconds)
+
+    def stats(self):
+        return {
+            'status': self.status,
+            'last_sync': self.last_sync,
+            'poll_seconds': self.poll_seconds,
+            **self.revocations.stats()
+        }
@@ -0,0 +1,144 @@
+# Ejecucion concurrente (scatter-gather) de operaciones sobre los shards
+# Envia la misma operacion a todos los shards a la vez con un pool de hilos
+# acotado, con timeout por shard y reporte de resultados parciales cuando un
+# replica set no responde. El plazo de cada shard cuenta desde que un hilo
+# empieza a ejecutarlo (no desde que se encola) y se aplica tambien en el
+# servidor con pymongo.timeout (maxTimeMS): una operacion abandonada no se
+# queda ocupando un hilo del pool.
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import pymongo
+
+from observability import tracing
+
+
+class ShardUnavailable(Exception):
+    """Uno o mas shards no respondieron y el resultado no es concluyente"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        shards = ', '.join(sorted(errors))
+        super().__init__(f"Shards no disponibles: {shards}")
+
+
+class GatherResult:
+    """Resultado de una operacion scatter-gather"""
+
+    def __init__(self):
+        self.results = {}  # shard -> valor devuelto
+        self.errors = {}  # shard -> mensaje de error o timeout
+        self.elapsed = {}  # shard -> segundos
+
+    @property
+    def partial(self):
+        return bool(self.errors)
+
+    def report(self):
+        """Resumen para incluir en las respuestas cuando faltan shards"""
+        return {
+            'partial': self.partial,
+            'unavailable_shards': self.errors
+        }
+
+
+class _Task:
+    """Estado de la operacion de un shard dentro del pool"""
+
+    def __init__(self, name):
+        self.name = name
+        self.submitted = time.monotonic()
+        self.started = None  # momento en que un hilo la toma; None si sigue en cola
+
+    def deadline(self, timeout, queue_timeout):
+        if self.started is None:
+            return self.submitted + queue_timeout
+        return self.started + timeout
+
+
+class ScatterGather:
+    def __init__(self, max_workers=16, timeout=5.0, queue_timeout=None):
+        self.timeout = timeout
+        # Espera maxima en cola hasta que un hilo libre tome la operacion
+        self.queue_timeout = queue_timeout if queue_timeout is not None else timeout
+        self.queue_timeouts = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='shard')
+
+    @staticmethod
+    def _call(task, fn, target, timeout):
+        task.started = time.monotonic()
+        # pymongo.timeout limita cada comando (maxTimeMS) y la espera de red
+        # al tiempo que le queda a este shard
+        with tracing.span(f"shard {task.name}", shard=task.name), pymongo.timeout(timeout):
+            return fn(target)
+
+    def _submit(self, targets, fn, timeout):
+        futures = {}
+        for name, target in targets:
+            task = _Task(name)
+            # Cada hilo recibe una copia del contexto (traza de la peticion)
+            futures[self._executor.submit(tracing.run_in_context(self._call), task, fn, target, timeout)] = task
+        return futures
+
+    @staticmethod
+    def _collect(future, task, result):
+        result.elapsed[task.name] = round(time.monotonic() - (task.started or task.submitted), 4)
+        try:
+            result.results[task.name] = future.result()
+        except Exception as e:
+            result.errors[task.name] = str(e)
+
+    def _expire(self, future, task, result):
+        if future.cancel():
+            # Nunca llego a ejecutarse: el pool esta saturado
+            self.queue_timeouts += 1
+        result.elapsed[task.name] = round(time.monotonic() - (task.started or task.submitted), 4)
+        result.errors[task.name] = 'timeout'
+
+    def _wait(self, futures, result, timeout, predicate=None):
+        """Recoge resultados hasta que respondan todos los shards o venza el
+        plazo de cada uno. Con `predicate` se detiene en el primer acierto y
+        devuelve su shard."""
+        pending = set(futures)
+        while pending:
+            now = time.monotonic()
+            next_deadline = min(futures[future].deadline(timeout, self.queue_timeout) for future in pending)
+            done, pending = wait(pending, timeout=max(0, next_deadline - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                task = futures[future]
+                self._collect(future, task, result)
+                if predicate is not None and task.name in result.results and predicate(result.results[task.name]):
+                    # Los shards restantes que no empezaron se cancelan; los
+                    # que ya corren terminan solos dentro de su plazo
+                    for other in pending:
+                        other.cancel()
+                    return task.name
+            now = time.monotonic()
+            for future in [f for f in pending if futures[f].deadline(timeout, self.queue_timeout) <= now]:
+                pending.discard(future)
+                self._expire(future, futures[future], result)
+        return None
+
+    def gather(self, targets, fn, timeout=None):
+        """Ejecuta fn(target) en todos los shards y espera todos los
+        resultados. targets: lista de (nombre, objetivo)"""
+        timeout = timeout or self.timeout
+        result = GatherResult()
+        self._wait(self._submit(targets, fn, timeout), result, timeout)
+        return result
+
+    def first(self, targets, fn, predicate=lambda value: value is not None, timeout=None):
+        """Ejecuta fn(target) en todos los shards y devuelve en cuanto uno
+        produzca un valor que cumpla `predicate`.
+
+        Devuelve (shard, valor, GatherResult); shard es None si ninguno
+        respondio con un acierto."""
+        timeout = timeout or self.timeout
+        result = GatherResult()
+        shard = self._wait(self._submit(targets, fn, timeout), result, timeout, predicate)
+        if shard is None:
+            return None, None, result
+        return shard, result.results[shard], result
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
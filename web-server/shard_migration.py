@@ -0,0 +1,287 @@
+# Migracion en linea de productos entre shards
+# Cuando un producto cambia de nombre y cruza un limite de rango, o cuando
+# cambia el mapa de shards, el documento se mueve a su shard correcto con
+# los pasos copiar -> verificar -> borrar. Mientras dura la migracion el
+# original queda marcado con '_migrating_to' (los listados lo omiten) y al
+# terminar se deja una redireccion en el shard de origen para que los IDs
+# publicos antiguos sigan resolviendo. La marca lleva la hora de inicio
+# ('_migrating_since'): si el proceso muere a mitad de una migracion,
+# recover_stale_migrations la termina (la copia ya esta en el destino) o la
+# deshace (no llego a copiarse) cuando la marca es mas antigua que un plazo.
+import threading, time
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from etags import VERSION_FIELD, bump_collection_version
+
+REDIRECTS_COLLECTION = 'product_redirects'
+MIGRATING_FIELD = '_migrating_to'
+MIGRATING_SINCE_FIELD = '_migrating_since'
+# Filtro para excluir de los listados las copias en migracion
+NOT_MIGRATING = {MIGRATING_FIELD: {'$exists': False}}
+
+
+class MigrationError(Exception):
+    """La copia no pudo completarse; el producto sigue en su shard original"""
+
+
+def ensure_redirect_indexes(shard, ttl_seconds):
+    shard.db[REDIRECTS_COLLECTION].create_index('created_at', expireAfterSeconds=ttl_seconds)
+    # Solo los documentos marcados entran en el indice: la recuperacion no recorre el shard
+    shard.collection.create_index(MIGRATING_FIELD, sparse=True)
+
+
+def find_redirect(router, shard, object_id):
+    """Shard al que se movio un producto (None si no hay redireccion)"""
+    redirect = shard.db[REDIRECTS_COLLECTION].find_one({'_id': object_id})
+    if not redirect:
+        return None
+    return router.get(redirect['moved_to'])
+
+
+def relocate(source, target, object_id, updates=None, expected=None):
+    """Mueve un producto de `source` a `target` aplicando `updates`.
+
+    `expected` son condiciones adicionales sobre el original (p. ej. la
+    version para If-Match). Devuelve el documento ya guardado en el destino,
+    o None si el producto no existe en el origen o no cumple `expected`.
+    Lanza MigrationError si la copia falla; en ese caso el original se
+    restaura sin marca.
+    """
+    # 1. Aplicar los cambios y marcar el original como "en migracion"
+    document = source.collection.find_one_and_update(
+        {**(expected or {}), '_id': object_id, MIGRATING_FIELD: {'$exists': False}},
+        {'$set': {**(updates or {}), MIGRATING_FIELD: target.name, MIGRATING_SINCE_FIELD: datetime.utcnow()},
+         '$inc': {VERSION_FIELD: 1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if document is None:
+        return None
+    document.pop(MIGRATING_FIELD)
+    document.pop(MIGRATING_SINCE_FIELD)
+
+    try:
+        # 2. Copiar al destino con el mismo _id (idempotente si se reintenta)
+        target.collection.replace_one({'_id': object_id}, document, upsert=True)
+        # 3. Verificar la copia antes de borrar el original
+        copy = target.collection.find_one({'_id': object_id})
+        if copy != document:
+            raise MigrationError(f"La copia en {target.name} no coincide con el original")
+    except Exception as e:
+        target.collection.delete_one({'_id': object_id, MIGRATING_FIELD: {'$exists': False}})
+        source.collection.update_one({'_id': object_id}, {'$unset': {MIGRATING_FIELD: '', MIGRATING_SINCE_FIELD: ''}})
+        if isinstance(e, (MigrationError, DuplicateKeyError)):
+            # Nombre ya usado en el destino: el llamador lo informa como conflicto
+            raise
+        raise MigrationError(f"Error al copiar el producto a {target.name}: {e}")
+
+    # 4. Redireccion para los IDs publicos antiguos y borrado del original
+    _finish(source, target, object_id)
+    return document
+
+
+def _write_redirect(source, target, object_id):
+    source.db[REDIRECTS_COLLECTION].replace_one(
+        {'_id': object_id},
+        {'_id': object_id, 'moved_to': target.name, 'created_at': datetime.utcnow()},
+        upsert=True
+    )
+
+
+def _finish(source, target, object_id):
+    _write_redirect(source, target, object_id)
+    source.collection.delete_one({'_id': object_id, MIGRATING_FIELD: target.name})
+    bump_collection_version(target.db)
+    bump_collection_version(source.db)
+
+
+def recover_stale_migrations(router, max_age_seconds, on_change=None):
+    """Termina o deshace las migraciones cuya marca tiene mas de
+    `max_age_seconds` (el proceso que las hacia murio a mitad).
+
+    Si la copia ya existe en el destino la migracion se completa (la copia
+    es visible y pudo recibir escrituras); si no, se quita la marca y el
+    producto vuelve a su shard. Las marcas sin hora (versiones anteriores)
+    se consideran antiguas. on_change(object_id) se llama por cada producto
+    recuperado. Devuelve {'finished': n, 'rolled_back': n, 'errors': [...]}."""
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age_seconds)
+    report = {'finished': 0, 'rolled_back': 0, 'errors': []}
+    stale = {MIGRATING_FIELD: {'$exists': True}, '$or': [
+        {MIGRATING_SINCE_FIELD: {'$lt': cutoff}},
+        {MIGRATING_SINCE_FIELD: {'$exists': False}}
+    ]}
+    for source in router.shards:
+        try:
+            marked = list(source.collection.find(stale, {MIGRATING_FIELD: 1, MIGRATING_SINCE_FIELD: 1}))
+        except Exception as e:
+            report['errors'].append({'shard': source.name, 'error': str(e)})
+            continue
+        for doc in marked:
+            object_id = doc['_id']
+            # La misma marca que se leyo: no tocar una migracion reiniciada despues
+            marker = {'_id': object_id, MIGRATING_FIELD: doc[MIGRATING_FIELD],
+                      MIGRATING_SINCE_FIELD: doc.get(MIGRATING_SINCE_FIELD, {'$exists': False})}
+            target = router.get(doc[MIGRATING_FIELD])
+            try:
+                if target is not None and target is not source and \
+                        target.collection.count_documents({'_id': object_id}, limit=1):
+                    _write_redirect(source, target, object_id)
+                    if source.collection.delete_one(marker).deleted_count:
+                        report['finished'] += 1
+                    bump_collection_version(target.db)
+                else:
+                    if source.collection.update_one(
+                            marker, {'$unset': {MIGRATING_FIELD: '', MIGRATING_SINCE_FIELD: ''}}).modified_count:
+                        report['rolled_back'] += 1
+                bump_collection_version(source.db)
+                if on_change is not None:
+                    on_change(object_id)
+            except Exception as e:
+                report['errors'].append({'shard': source.name, '_id': str(object_id), 'error': str(e)})
+    return report
+
+
+class MigrationSweeper:
+    """Ejecuta recover_stale_migrations al arrancar y cada `interval`
+    segundos en un hilo en segundo plano"""
+
+    def __init__(self, router, max_age_seconds=300, interval=60, on_change=None):
+        self.router = router
+        self.max_age_seconds = max_age_seconds
+        self.interval = interval
+        self.on_change = on_change
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sweep(self):
+        self.last_report = {**recover_stale_migrations(self.router, self.max_age_seconds, self.on_change),
+                            'at': datetime.utcnow().isoformat()}
+        if self.last_report['finished'] or self.last_report['rolled_back']:
+            print(f"Migraciones interrumpidas: {self.last_report['finished']} completadas, "
+                  f"{self.last_report['rolled_back']} deshechas")
+        return self.last_report
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error al recuperar migraciones interrumpidas: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name='migration-sweeper')
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+class Rebalancer:
+    """Redistribuye en segundo plano los productos que no estan en el shard
+    que les corresponde segun el mapa actual (p. ej. tras agregar un shard o
+    marcar uno como "drain"). Trabaja por lotes con pausas para no saturar
+    los replica sets."""
+
+    def __init__(self, router, on_moved=None, max_marker_age=300):
+        self.router = router
+        # on_moved(object_id) tras cada producto movido (p. ej. invalidar la cache)
+        self.on_moved = on_moved
+        self.max_marker_age = max_marker_age
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.status = {'running': False}
+
+    def start(self, batch_size=200, pause=0.5, dry_run=False):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return False
+            self._stop.clear()
+            self.status = {
+                'running': True,
+                'dry_run': dry_run,
+                'batch_size': batch_size,
+                'pause': pause,
+                'started_at': datetime.utcnow().isoformat(),
+                'finished_at': None,
+                'current_shard': None,
+                'scanned': 0,
+                'misplaced': 0,
+                'moved': 0,
+                'errors': []
+            }
+            self._thread = threading.Thread(
+                target=self._run, args=(batch_size, pause, dry_run), daemon=True, name='rebalancer'
+            )
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, batch_size, pause, dry_run):
+        try:
+            if not dry_run:
+                # Los productos con marcas huerfanas no se podrian mover
+                try:
+                    self.status['recovered'] = recover_stale_migrations(self.router, self.max_marker_age,
+                                                                        self.on_moved)
+                except Exception as e:
+                    self._error({'stage': 'recover', 'error': str(e)})
+            for shard in self.router.shards:
+                if self._stop.is_set():
+                    break
+                self.status['current_shard'] = shard.name
+                try:
+                    self._rebalance_shard(shard, batch_size, pause, dry_run)
+                except Exception as e:
+                    # Shard no disponible: se informa y se sigue con los demas
+                    self._error({'shard': shard.name, 'error': str(e)})
+        finally:
+            self.status['running'] = False
+            self.status['current_shard'] = None
+            self.status['stopped'] = self._stop.is_set()
+            self.status['finished_at'] = datetime.utcnow().isoformat()
+
+    def _rebalance_shard(self, shard, batch_size, pause, dry_run):
+        last_id = None
+        while not self._stop.is_set():
+            # Recorrido por rangos de _id: los borrados no desplazan el recorrido
+            query = {'_id': {'$gt': last_id}} if last_id is not None else {}
+            batch = list(shard.collection.find(query, {'name': 1}).sort('_id', 1).limit(batch_size))
+            if not batch:
+                return
+            last_id = batch[-1]['_id']
+            for doc in batch:
+                self.status['scanned'] += 1
+                try:
+                    target, _ = self.router.route(doc.get('name'))
+                except ValueError:
+                    continue
+                if target is shard:
+                    continue
+                self.status['misplaced'] += 1
+                if dry_run:
+                    continue
+                try:
+                    if relocate(shard, target, doc['_id']) is not None:
+                        self.status['moved'] += 1
+                        if self.on_moved is not None:
+                            self.on_moved(doc['_id'])
+                except MigrationError as e:
+                    self._error({'_id': str(doc['_id']), 'error': str(e)})
+                except DuplicateKeyError:
+                    # Otro producto ya usa ese nombre en el destino: queda donde esta
+                    self._error({'_id': str(doc['_id']),
+                                 'error': f"Ya existe un producto con ese nombre en {target.name}"})
+            time.sleep(pause)
+
+    def _error(self, error):
+        self.status['errors'].append(error)
+        del self.status['errors'][:-50]
@@ -0,0 +1,235 @@
+# Enrutador de productos entre N shards (replica sets) configurables
+# El mapa de shards se carga de SHARD_MAP_FILE o SHARD_MAP (JSON). Si no se
+# configura, se usa el esquema original: DB1_URL (A-M) y DB2_URL (N-Z).
+#
+# Formato del mapa:
+# {
+#   "strategy": "range",            # "range" o "hash"
+#   "default": "DB1",               # shard para nombres que no empiezan por letra
+#   "shards": [
+#     {"name": "DB1", "url": "mongodb://...", "range": ["a", "n"], "label": "DB1 (A-M)"},
+#     {"name": "DB2", "url": "mongodb://...", "range": ["n", null]},
+#     {"name": "DB0", "url": "mongodb://...", "drain": true}
+#   ]
+# }
+# Los rangos comparan el nombre normalizado: limite inferior incluido,
+# superior excluido (null = sin limite). Un shard con "drain" no recibe
+# productos nuevos y el rebalanceador mueve los que tenga.
+#
+# "legacy_routing" (activo por defecto en el esquema DB1_URL/DB2_URL) indica
+# que puede haber productos guardados con el enrutado anterior a la
+# normalizacion: la primera letra tal cual y todo lo que no era A-Z en el
+# shard por defecto ("Ñame" y "Óleo" quedaron en DB1; ahora van a DB2).
+# Mientras este activo, las busquedas y las escrituras por nombre consultan
+# tambien ese shard. POST /admin/rebalance mueve esos productos a su shard
+# actual; despues se puede desactivar con LEGACY_ROUTING=False.
+import hashlib, json, os, unicodedata
+
+from pymongo import MongoClient
+
+
+def normalize_name(name):
+    """Forma canonica de un nombre para enrutar y buscar: sin acentos ni
+    diacriticos ("Ñame" -> "name", "Ábaco" -> "abaco") y en minusculas"""
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return unicodedata.normalize('NFC', stripped).casefold().strip()
+
+
+def prefix_upper_bound(prefix):
+    """Menor cadena mayor que todas las que empiezan por `prefix`"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class Shard:
+    def __init__(self, name, url, client, database='products_db', collection='products',
+                 lower=None, upper=None, label=None, weight=1.0, draining=False):
+        self.name = name
+        self.tag = name.lower()
+        self.url = url
+        self.client = client
+        self.db = client[database]
+        self.collection = self.db[collection]
+        self.lower = lower
+        self.upper = upper
+        self.weight = weight
+        # Un shard en "drain" sigue atendiendo lecturas pero no recibe productos nuevos
+        self.draining = draining
+        self.label = label or self._default_label()
+
+    def _default_label(self):
+        if self.lower is None and self.upper is None:
+            return self.name
+        lower = (self.lower or '').upper()
+        upper = self.upper.upper() if self.upper else '...'
+        return f"{self.name} [{lower}, {upper})"
+
+    def contains(self, key):
+        if self.lower is not None and key < self.lower:
+            return False
+        if self.upper is not None and key >= self.upper:
+            return False
+        return True
+
+    def __repr__(self):
+        return f"Shard({self.name!r})"
+
+
+class ShardRouter:
+    STRATEGIES = ('range', 'hash')
+
+    def __init__(self, shards, strategy='range', default=None, legacy_routing=False):
+        if not shards:
+            raise ValueError('El mapa de shards esta vacio')
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Estrategia de fragmentacion desconocida: {strategy}")
+        self.shards = shards
+        self.strategy = strategy
+        self.by_tag = {shard.tag: shard for shard in shards}
+        if len(self.by_tag) != len(shards):
+            raise ValueError('Los nombres de shard deben ser unicos')
+        self.default = self.by_tag[default.lower()] if default else shards[0]
+        self.writable = [shard for shard in shards if not shard.draining]
+        if not self.writable or self.default.draining:
+            raise ValueError('El shard por defecto no puede estar en drain')
+        # El enrutado anterior solo existio con rangos
+        self.legacy_routing = legacy_routing and strategy == 'range'
+
+    # ---------- Carga de configuracion ----------
+
+    @classmethod
+    def from_config(cls, config, client_factory=MongoClient, listeners_for=None, **client_options):
+        """listeners_for(nombre): event_listeners propios del cliente de cada shard"""
+        shards = []
+        for entry in config['shards']:
+            lower, upper = (entry.get('range') or [None, None])
+            options = {**client_options, **entry.get('client_options', {})}
+            if listeners_for is not None:
+                options['event_listeners'] = listeners_for(entry['name'])
+            shards.append(Shard(
+                entry['name'],
+                entry['url'],
+                client_factory(entry['url'], **options),
+                database=entry.get('database', 'products_db'),
+                collection=entry.get('collection', 'products'),
+                lower=normalize_name(lower) if lower else None,
+                upper=normalize_name(upper) if upper else None,
+                label=entry.get('label'),
+                weight=float(entry.get('weight', 1.0)),
+                draining=bool(entry.get('drain', False))
+            ))
+        legacy = os.getenv('LEGACY_ROUTING', '').lower()
+        legacy_routing = legacy == 'true' if legacy else bool(config.get('legacy_routing', False))
+        return cls(shards, config.get('strategy', 'range'), config.get('default'), legacy_routing)
+
+    @staticmethod
+    def load_config():
+        path = os.getenv('SHARD_MAP_FILE')
+        if path:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        if os.getenv('SHARD_MAP'):
+            return json.loads(os.getenv('SHARD_MAP'))
+        # Esquema original de dos shards
+        return {
+            'strategy': 'range',
+            'default': 'DB1',
+            'legacy_routing': True,
+            'shards': [
+                {'name': 'DB1', 'url': os.getenv('DB1_URL'), 'range': ['a', 'n'], 'label': 'DB1 (A-M)'},
+                {'name': 'DB2', 'url': os.getenv('DB2_URL'), 'range': ['n', None], 'label': 'DB2 (N-Z)'}
+            ]
+        }
+
+    @classmethod
+    def from_env(cls, client_factory=MongoClient, listeners_for=None, **client_options):
+        return cls.from_config(cls.load_config(), client_factory, listeners_for, **client_options)
+
+    def with_clients(self, client_for):
+        """Mismo mapa de shards con el cliente client_for(shard) en cada uno
+        (p. ej. el cliente asincrono que comparte el pool del original)"""
+        shards = [Shard(shard.name, shard.url, client_for(shard), database=shard.db.name,
+                        collection=shard.collection.name, lower=shard.lower, upper=shard.upper,
+                        label=shard.label, weight=shard.weight, draining=shard.draining)
+                  for shard in self.shards]
+        return type(self)(shards, self.strategy, self.default.name, self.legacy_routing)
+
+    # ---------- Enrutamiento ----------
+
+    def route(self, product_name):
+        """Devuelve (shard, etiqueta) donde debe guardarse un producto"""
+        if not product_name or not product_name.strip():
+            raise ValueError("El nombre del producto es requerido")
+        key = normalize_name(product_name)
+        if self.strategy == 'hash':
+            return self._route_hash(key), None
+        if not key[:1].isalpha():
+            # Numeros y simbolos van al shard por defecto
+            return self.default, f"{self.default.name} (default)"
+        for shard in self.writable:
+            if shard.contains(key):
+                return shard, None
+        return self.default, f"{self.default.name} (default)"
+
+    def legacy_route(self, product_name):
+        """Shard donde el enrutado anterior a la normalizacion guardaba el
+        producto, si es distinto del actual; None si coinciden"""
+        if not self.legacy_routing:
+            return None
+        first = (product_name or '')[:1].upper()
+        if 'A' <= first <= 'Z':
+            # Primera letra ASCII: el rango de entonces es el de ahora
+            return None
+        shard, _ = self.route(product_name)
+        return None if shard is self.default else self.default
+
+    def _route_hash(self, key):
+        # Rendezvous hashing: al agregar un shard solo se mueve ~1/N de los productos
+        def score(shard):
+            digest = hashlib.md5(f"{shard.tag}:{key}".encode('utf-8')).digest()
+            return int.from_bytes(digest[:8], 'big') * shard.weight
+        return max(self.writable, key=score)
+
+    def shards_for_prefix(self, prefix):
+        """Shards que pueden contener productos cuyo nombre normalizado
+        empieza por `prefix`. Con rangos se descartan los shards cuyo rango no
+        se solapa con [prefix, sucesor(prefix)); con hash se consultan todos."""
+        key = normalize_name(prefix)
+        if self.strategy == 'hash' or not key:
+            return list(self.shards)
+        upper = prefix_upper_bound(key)
+        selected = []
+        for shard in self.shards:
+            # Los shards en drain no tienen rango pero aun pueden tener productos
+            if shard.draining:
+                selected.append(shard)
+            elif (shard.upper is None or key < shard.upper) and (shard.lower is None or shard.lower < upper):
+                selected.append(shard)
+        if (self.legacy_routing or not key[:1].isalpha()) and self.default not in selected:
+            # Tambien los nombres con acento inicial que guardo el enrutado anterior
+            selected.append(self.default)
+        return selected
+
+    def get(self, tag):
+        """Shard por nombre/prefijo de ID (None si no existe)"""
+        return self.by_tag.get((tag or '').lower())
+
+    def targets(self):
+        """Lista de (nombre, coleccion) para consultas sobre todos los shards"""
+        return [(shard.name, shard.collection) for shard in self.shards]
+
+    def describe(self):
+        if self.strategy == 'hash':
+            return {shard.label: 'Productos asignados por hash del nombre normalizado'
+                    for shard in self.shards}
+        described = {}
+        for shard in self.shards:
+            lower = shard.lower.upper() if shard.lower else 'el inicio'
+            upper = f"hasta antes de {shard.upper.upper()}" if shard.upper else 'hasta el final'
+            described[shard.label] = f"Productos cuyo nombre normalizado va desde {lower} {upper}"
+        described['default'] = f"Nombres que no empiezan por letra: {self.default.name}"
+        return described
+
+    def close(self):
+        for shard in self.shards:
+            shard.client.close()
@@ -7,7 +7,12 @@ if [ ! -d "venv" ]; then
 fi
 #Activar entorno virtual
 source venv/bin/activate
-#instalar dependencias dentro del entorno virtual
-pip install -r requirements.txt
-#ejecutar la aplicacion
-python3 app.py
\ No newline at end of file
+#instalar dependencias dentro del entorno virtual y ejecutar la aplicacion
+#(SERVER_MODE=async: event loop con Hypercorn)
+if [ "${SERVER_MODE:-flask}" = "async" ]; then
+    pip install -r requirements-async.txt
+    hypercorn app_async:asgi_app --bind 0.0.0.0:${PORT:-3000} --workers ${HYPERCORN_WORKERS:-1}
+else
+    pip install -r requirements.txt
+    python3 app.py
+fi
\ No newline at end of file
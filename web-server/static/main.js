@@ -26,7 +26,7 @@ async function loadConfig() {
 }
 
 // Cargar configuración al inicio
-loadConfig();
+const configReady = loadConfig();
 
 // Para compatibilidad con código existente
 const API_BASE = ""; // mismo dominio
@@ -81,13 +81,64 @@ function formatCurrency(value) {
 document.addEventListener("DOMContentLoaded", () => {
   const logoutBtn = document.getElementById("logoutBtn");
   if (logoutBtn) {
-    logoutBtn.onclick = () => {
+    logoutBtn.onclick = async () => {
+      // Revocar el token y la sesión en el servidor antes de olvidarlos
+      try {
+        await fetch(`${getAuthURL()}/auth/logout`, {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+            Authorization: `Bearer ${localStorage.getItem("token")}`,
+          },
+          body: JSON.stringify({
+            refresh_token: localStorage.getItem("refreshToken"),
+          }),
+        });
+      } catch (err) {
+        console.warn("⚠ No se pudo cerrar la sesión en el servidor");
+      }
       localStorage.removeItem("token");
+      localStorage.removeItem("refreshToken");
       window.location.href = "/login";
     };
   }
 });
 
+// Milisegundos que le quedan al token de acceso (0 si no se puede leer)
+function tokenExpiresIn(token) {
+  try {
+    const payload = token.split(".")[1].replace(/-/g, "+").replace(/_/g, "/");
+    return JSON.parse(atob(payload)).exp * 1000 - Date.now();
+  } catch (err) {
+    return 0;
+  }
+}
+
+// Renovar el token de acceso con el refresh token antes de que expire
+async function renewSession() {
+  const token = localStorage.getItem("token");
+  const refreshToken = localStorage.getItem("refreshToken");
+  if (!token || !refreshToken || tokenExpiresIn(token) > 2 * 60 * 1000) return;
+
+  try {
+    const res = await fetch(`${getAuthURL()}/auth/refresh`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ refresh_token: refreshToken }),
+    });
+    if (!res.ok) return;
+
+    const data = await res.json();
+    localStorage.setItem("token", data.token);
+    localStorage.setItem("refreshToken", data.refresh_token);
+  } catch (err) {
+    console.warn("⚠ No se pudo renovar la sesión");
+  }
+}
+
+configReady.then(renewSession);
+setInterval(renewSession, 60 * 1000);
+
 // Login
 const loginForm = document.getElementById("loginForm");
 if (loginForm) {
@@ -118,6 +169,7 @@ if (loginForm) {
       }
 
       localStorage.setItem("token", data.token);
+      localStorage.setItem("refreshToken", data.refresh_token);
       window.location.href = "/dashboard";
     } catch (err) {
       errorText.textContent =
@@ -222,7 +274,11 @@ if (registerForm) {
 // ======================
 // PRODUCTOS - DASHBOARD
 // ======================
-async function loadProducts() {
+// Cursor de la siguiente página del listado (null cuando no hay más)
+let productsCursor = null;
+
+// Cargar una página de productos; con append=true se agrega a la tabla
+async function loadProducts(append = false) {
   const tbody = document.getElementById("productsTable");
   if (!tbody) return;
 
@@ -230,9 +286,13 @@ async function loadProducts() {
   const loadingSpinner = document.getElementById("loadingSpinner");
   const productsContainer = document.getElementById("productsContainer");
   const emptyState = document.getElementById("emptyState");
+  const loadMore = document.getElementById("loadMoreProducts");
 
   try {
-    const res = await fetch("/products", {
+    // Solo se pide una página; el resto bajo demanda con "Cargar más"
+    const params = new URLSearchParams({ limit: 50 });
+    if (append && productsCursor) params.set("after", productsCursor);
+    const res = await fetch(`/products?${params}`, {
       headers: { Authorization: `Bearer ${token}` },
     });
 
@@ -243,18 +303,21 @@ async function loadProducts() {
       return;
     }
 
+    productsCursor = data.next_cursor;
+    if (loadMore) loadMore.classList.toggle("d-none", !productsCursor);
+
     // Ocultar spinner
     if (loadingSpinner) loadingSpinner.classList.add("d-none");
 
     // Mostrar tabla o estado vacío
-    if (data.products.length === 0) {
+    if (!append && data.products.length === 0) {
       if (emptyState) emptyState.classList.remove("d-none");
       if (productsContainer) productsContainer.classList.add("d-none");
     } else {
       if (emptyState) emptyState.classList.add("d-none");
       if (productsContainer) productsContainer.classList.remove("d-none");
 
-      tbody.innerHTML = "";
+      if (!append) tbody.innerHTML = "";
 
       data.products.forEach((p) => {
         const stockBadge =
@@ -470,7 +533,11 @@ if (editProductForm) {
 // ======================
 // USUARIOS - LISTAR
 // ======================
-async function loadUsers() {
+// Cursor de la siguiente página del directorio (null cuando no hay más)
+let usersCursor = null;
+
+// Cargar una página de usuarios; con append=true se agrega a la tabla
+async function loadUsers(append = false) {
   const tbody = document.getElementById("usersTable");
   if (!tbody) return;
 
@@ -478,9 +545,13 @@ async function loadUsers() {
   const loadingSpinner = document.getElementById("loadingUsersSpinner");
   const usersContainer = document.getElementById("usersContainer");
   const emptyState = document.getElementById("emptyUsersState");
+  const loadMore = document.getElementById("loadMoreUsers");
 
   try {
-    const res = await fetch("/users", {
+    // Solo se pide una página; el resto bajo demanda con "Cargar más"
+    const params = new URLSearchParams({ limit: 50 });
+    if (append && usersCursor) params.set("after", usersCursor);
+    const res = await fetch(`/users?${params}`, {
       headers: { Authorization: `Bearer ${token}` },
     });
 
@@ -491,18 +562,21 @@ async function loadUsers() {
       return;
     }
 
+    usersCursor = data.next_cursor;
+    if (loadMore) loadMore.classList.toggle("d-none", !usersCursor);
+
     // Ocultar spinner
     if (loadingSpinner) loadingSpinner.classList.add("d-none");
 
     // Mostrar tabla o estado vacío
-    if (data.users.length === 0) {
+    if (!append && data.users.length === 0) {
       if (emptyState) emptyState.classList.remove("d-none");
       if (usersContainer) usersContainer.classList.add("d-none");
     } else {
       if (emptyState) emptyState.classList.add("d-none");
       if (usersContainer) usersContainer.classList.remove("d-none");
 
-      tbody.innerHTML = "";
+      if (!append) tbody.innerHTML = "";
 
       data.users.forEach((u) => {
         tbody.innerHTML += `
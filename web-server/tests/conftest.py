@@ -0,0 +1,46 @@
+# Las pruebas no tienen servidores MongoDB: los clientes que crea la app son
+# de mongomock. Debe aplicarse antes de importar shard_router/user_directory.
+import os
+import types
+
+import mongomock
+import pymongo
+import pytest
+
+pymongo.MongoClient = mongomock.MongoClient
+if not hasattr(mongomock.MongoClient, 'topology_description'):
+    # MongoMetrics.watch() consulta los miembros del replica set
+    mongomock.MongoClient.topology_description = property(
+        lambda self: types.SimpleNamespace(server_descriptions=lambda: {}))
+
+
+@pytest.fixture(scope='session')
+def web():
+    """Modulo app con dos shards en memoria y sin auth-server"""
+    os.environ.update(DB1_URL='mongodb://db1', DB2_URL='mongodb://db2', DB3_URL='mongodb://db3',
+                      AUTH_VERIFY_MODE='remote', AUTH_SERVER_URL='http://127.0.0.1:9',
+                      CACHE_CHANGE_STREAMS='False', METRICS_ENABLED='False', TRACING_ENABLED='False')
+    import app
+    return app
+
+
+@pytest.fixture
+def shards(web):
+    """Shards vacios para cada prueba"""
+    for shard in web.shard_router.shards:
+        for name in shard.db.list_collection_names():
+            shard.db.drop_collection(name)
+    web.product_cache.clear()
+    return {shard.name: shard for shard in web.shard_router.shards}
+
+
+@pytest.fixture
+def call(web, monkeypatch):
+    """Despacha una peticion autenticada por la app y devuelve la respuesta"""
+    monkeypatch.setattr(web.token_verifier, 'verify', lambda token: {'username': 'tester'})
+
+    def call(method, path, headers=None, **kwargs):
+        headers = {'Authorization': 'Bearer prueba', **(headers or {})}
+        with web.app.test_request_context(path, method=method, headers=headers, **kwargs):
+            return web.app.full_dispatch_request()
+    return call
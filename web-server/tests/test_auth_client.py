@@ -0,0 +1,158 @@
+import threading
+
+import pytest
+import requests
+
+import auth_client
+from auth_client import AuthClient, AuthClientBusy, CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(auth_client.time, 'monotonic', fake)
+    return fake
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def make_client(outcomes, **kwargs):
+    """AuthClient cuya sesion devuelve (o lanza) los resultados indicados"""
+    client = AuthClient('http://auth.test', **kwargs)
+    pending = list(outcomes)
+
+    def fake_request(method, url, timeout=None, **_):
+        outcome = pending.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+    client.session.request = fake_request
+    return client
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+
+
+def test_breaker_half_open_allows_single_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_breaker_probe_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+
+
+def test_breaker_probe_success_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_release_probe_returns_the_half_open_slot(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
+
+
+def test_release_probe_is_noop_when_closed(clock):
+    breaker = CircuitBreaker()
+    breaker.release_probe()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_client_fails_fast_while_open(clock):
+    client = make_client([requests.ConnectionError('down')], failure_threshold=1, reset_timeout=30)
+    with pytest.raises(requests.ConnectionError):
+        client.get('/auth/keys')
+    with pytest.raises(CircuitOpenError):
+        client.get('/auth/keys')
+    assert client.failures_total == 1
+
+
+def test_client_4xx_is_not_a_failure(clock):
+    client = make_client([401, 401, 401], failure_threshold=2)
+    for _ in range(3):
+        assert client.post('/auth/verify').status_code == 401
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_open_half_open_busy_then_recovery(clock):
+    client = make_client([requests.ConnectionError('down'), 200],
+                         failure_threshold=1, reset_timeout=30, max_concurrency=1, acquire_timeout=0.01)
+    with pytest.raises(requests.ConnectionError):
+        client.get('/auth/keys')
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 30
+    # Todos los cupos ocupados: la prueba de half-open no llega a enviarse
+    assert client._slots.acquire(timeout=0)
+    with pytest.raises(AuthClientBusy):
+        client.get('/auth/keys')
+    assert client.busy_rejections == 1
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    client._slots.release()
+
+    # El turno de prueba se devolvio: la siguiente peticion cierra el circuito
+    assert client.get('/auth/keys').status_code == 200
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_unexpected_error_releases_probe(clock):
+    client = make_client([requests.ConnectionError('down'), RuntimeError('bug'), 200],
+                         failure_threshold=1, reset_timeout=30)
+    with pytest.raises(requests.ConnectionError):
+        client.get('/auth/keys')
+    clock.now += 30
+    with pytest.raises(RuntimeError):
+        client.get('/auth/keys')
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    assert client.get('/auth/keys').status_code == 200
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_concurrency_slots_are_released(clock):
+    client = make_client([200] * 20, max_concurrency=2)
+    threads = [threading.Thread(target=client.get, args=('/auth/keys',)) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert client.requests_total == 20
+    assert client.stats()['concurrency']['in_flight'] == 0
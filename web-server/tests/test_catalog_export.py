@@ -0,0 +1,58 @@
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import mongomock
+import pytest
+from bson import Decimal128
+
+import catalog_export
+from shard_migration import MIGRATING_FIELD, NOT_MIGRATING
+
+NOW = datetime(2026, 1, 1, 8, 30)
+
+
+@pytest.fixture
+def shards():
+    client = mongomock.MongoClient()
+    db1, db2 = client.db1.products, client.db2.products
+    db1.insert_many([{'name': f'Arroz {i}', 'price': i, 'stock': 1, 'created_at': NOW} for i in range(3)])
+    db2.insert_one({'name': 'Pan', 'price': 2, 'stock': 5, 'created_at': NOW})
+    db2.insert_one({'name': 'Pera', 'price': 1, 'stock': 5, MIGRATING_FIELD: 'DB1'})
+    return [('DB1', db1), ('DB2', db2)]
+
+
+def test_parse_fields():
+    assert catalog_export.parse_fields(None) == list(catalog_export.EXPORT_FIELDS)
+    assert catalog_export.parse_fields(' name, price ') == ['name', 'price']
+    with pytest.raises(ValueError, match='password'):
+        catalog_export.parse_fields('name,password')
+
+
+def test_ndjson_chunks_by_batch_and_projects_fields(shards):
+    chunks = list(catalog_export.iter_ndjson(shards, ['name', 'created_at'], batch_size=2, query=NOT_MIGRATING))
+    assert [chunk.count('\n') for chunk in chunks] == [2, 2]
+    rows = [json.loads(line) for line in ''.join(chunks).splitlines()]
+    assert [row['name'] for row in rows] == ['Arroz 0', 'Arroz 1', 'Arroz 2', 'Pan']
+    assert rows[0]['_id'].startswith('db1-') and rows[-1]['database'] == 'DB2'
+    assert rows[0]['created_at'] == NOW.isoformat() and 'price' not in rows[0]
+
+
+def test_csv_has_header_once_and_every_row(shards):
+    chunks = list(catalog_export.iter_csv(shards, ['name', 'price'], batch_size=3))
+    assert len(chunks) == 2
+    rows = list(csv.reader(io.StringIO(''.join(chunks))))
+    assert rows[0] == ['_id', 'name', 'price', 'database']
+    assert len(rows) == 6 and rows[-1][1:] == ['Pera', '1', 'DB2']
+
+
+def test_export_encodes_decimal_prices():
+    collection = mongomock.MongoClient().db1.products
+    collection.insert_one({'name': 'Café', 'price': Decimal128('19.90'), 'stock': 1, 'created_at': NOW})
+    line, = ''.join(catalog_export.iter_ndjson([('DB1', collection)], ['name', 'price', 'created_at'])).splitlines()
+    assert json.loads(line)['price'] == '19.90' and json.loads(line)['created_at'] == NOW.isoformat()
+    assert catalog_export.ndjson_line('DB1', {'_id': 1, 'cost': Decimal('7.25')}).endswith('"cost": "7.25", "database": "DB1"}')
+    rows = list(csv.reader(io.StringIO(''.join(catalog_export.iter_csv([('DB1', collection)], ['price'])))))
+    assert rows[1][1] == '19.90'
@@ -0,0 +1,68 @@
+import gzip
+
+from flask import Flask, Response
+from werkzeug.http import parse_etags
+
+import etags
+from compression import Compressor
+
+
+def test_strip_coding_only_removes_known_encodings():
+    assert etags.strip_coding('abc-gzip') == 'abc'
+    assert etags.strip_coding('abc-br') == 'abc'
+    assert etags.strip_coding('abc-zstd') == 'abc-zstd'
+
+
+def test_none_match_accepts_coded_and_weak_tags():
+    assert etags.none_match(parse_etags('"abc-gzip"'), 'abc')
+    assert etags.none_match(parse_etags('W/"abc"'), 'abc')
+    assert etags.none_match(parse_etags('*'), 'abc')
+    assert not etags.none_match(parse_etags('"abd-gzip"'), 'abc')
+
+
+def test_match_is_strong_but_ignores_coding():
+    assert etags.match(parse_etags('"abc-br"'), 'abc')
+    assert not etags.match(parse_etags('W/"abc"'), 'abc')
+
+
+def _compressed(headers, status=200):
+    app = Flask(__name__)
+    compressor = Compressor(min_size=10, encodings=('gzip',))
+    with app.test_request_context('/', headers=headers):
+        response = Response(b'x' * 100 if status == 200 else b'', status=status, mimetype='application/json')
+        response.set_etag('abc')
+        return compressor.after_request(response)
+
+
+def test_compressed_response_gets_coded_etag():
+    response = _compressed({'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.get_etag() == ('abc-gzip', False)
+    assert gzip.decompress(response.get_data()) == b'x' * 100
+
+
+def test_identity_response_keeps_etag():
+    assert _compressed({'Accept-Encoding': 'identity'}).get_etag() == ('abc', False)
+
+
+def test_not_modified_repeats_the_coded_etag():
+    response = _compressed({'Accept-Encoding': 'gzip', 'If-None-Match': '"abc-gzip"'}, status=304)
+    assert response.get_etag() == ('abc-gzip', False)
+
+
+def test_product_revalidates_with_coded_etag(shards, call):
+    created = call('POST', '/products', json={'name': 'Arroz', 'price': 2.5, 'stock': 3,
+                                              'description': 'x' * 2000})
+    product_id = created.get_json()['product']['_id']
+    first = call('GET', f'/products/{product_id}', headers={'Accept-Encoding': 'gzip'})
+    etag, weak = first.get_etag()
+    assert first.headers['Content-Encoding'] == 'gzip' and etag.endswith('-gzip') and not weak
+
+    again = call('GET', f'/products/{product_id}',
+                 headers={'Accept-Encoding': 'gzip', 'If-None-Match': f'"{etag}"'})
+    assert again.status_code == 304 and again.get_etag() == (etag, False)
+
+    stale = call('PUT', f'/products/{product_id}', json={'price': 3}, headers={'If-Match': f'"{etag}"'})
+    assert stale.status_code == 200
+    conflict = call('PUT', f'/products/{product_id}', json={'price': 4}, headers={'If-Match': f'"{etag}"'})
+    assert conflict.status_code == 412
@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import pytest
+
+from observability import health_probe
+from observability.health_probe import HealthProber
+
+
+def _fail():
+    raise RuntimeError('sin respuesta')
+
+
+def test_snapshot_is_not_ready_before_the_first_probe():
+    snapshot = HealthProber().add_check('DB1', lambda: None).snapshot()
+    assert snapshot['stale'] and not snapshot['ready'] and snapshot['checks'] == {}
+
+
+def test_only_required_checks_decide_readiness():
+    prober = HealthProber().add_check('DB1', lambda: {'primary': 'db1:27017'}).add_check('DB3', _fail, required=False)
+    prober.probe()
+    snapshot = prober.snapshot()
+    assert snapshot['ready'] and not snapshot['stale']
+    assert snapshot['checks']['DB1']['detail'] == {'primary': 'db1:27017'}
+    assert snapshot['checks']['DB3'] == {'ok': False, 'error': 'sin respuesta', 'required': False,
+                                         'latency_ms': snapshot['checks']['DB3']['latency_ms']}
+
+    prober.add_check('auth-server', _fail)
+    prober.probe()
+    assert not prober.snapshot()['ready']
+
+
+def test_old_snapshots_are_stale(monkeypatch):
+    prober = HealthProber(interval=1).add_check('DB1', lambda: None)
+    prober.probe()
+    now = health_probe.time.time()
+    monkeypatch.setattr(health_probe.time, 'time', lambda: now + 10)
+    snapshot = prober.snapshot()
+    assert snapshot['stale'] and not snapshot['ready']
+
+
+def test_describe_topology_reports_members_and_primary():
+    servers = {
+        ('db1-a', 27017): SimpleNamespace(server_type_name='RSPrimary', round_trip_time=0.0012, error=None),
+        ('db1-b', 27017): SimpleNamespace(server_type_name='Unknown', round_trip_time=None, error='timeout')
+    }
+    client = SimpleNamespace(topology_description=SimpleNamespace(
+        server_descriptions=lambda: servers, replica_set_name='rs1', topology_type_name='ReplicaSetWithPrimary'))
+    topology = health_probe.describe_topology(client)
+    assert topology['primary'] == 'db1-a:27017' and topology['replica_set'] == 'rs1'
+    assert topology['members'][0]['rtt_ms'] == 1.2
+    assert topology['members'][1] == {'address': 'db1-b:27017', 'type': 'Unknown', 'rtt_ms': None, 'error': 'timeout'}
+
+
+@pytest.mark.parametrize('ok, status', [(True, 200), (False, 503)])
+def test_ready_endpoint_answers_from_the_snapshot(web, call, monkeypatch, ok, status):
+    prober = HealthProber().add_check('DB1', lambda: None if ok else _fail())
+    prober.probe()
+    monkeypatch.setattr(web, 'health_prober', prober)
+    response = call('GET', '/health/ready')
+    assert response.status_code == status and response.get_json()['checks']['DB1']['ok'] is ok
@@ -0,0 +1,126 @@
+from datetime import datetime
+
+import mongomock
+import pytest
+from bson import ObjectId
+from pymongo.errors import AutoReconnect
+
+import inventory
+from inventory import (CANCELLED, CONFIRMED, HELD, RELEASED, InsufficientStock, ReleaseRetrier,
+                       ReservationCancelled, ShardReservations)
+from shard_router import ShardRouter
+
+CONFIG = {'strategy': 'range', 'default': 'DB1',
+          'shards': [{'name': 'DB1', 'url': 'mongodb://db1', 'range': ['a', None]}]}
+NOW = datetime(2026, 1, 1)
+
+
+class FakeSession:
+    """Sesion para mongomock: se evalua como falsa para que mongomock acepte
+    el parametro session, y cuenta los reintentos de with_transaction"""
+
+    def __init__(self):
+        self.transactions = 0
+
+    def __bool__(self):
+        return False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def with_transaction(self, callback):
+        self.transactions += 1
+        return callback(self)
+
+
+@pytest.fixture
+def shard():
+    return ShardRouter.from_config(CONFIG, client_factory=lambda url, **_: mongomock.MongoClient()).get('DB1')
+
+
+@pytest.fixture
+def reservations(shard):
+    reservations = ShardReservations(shard)
+    reservations.transactions = False
+    return reservations
+
+
+def _products(shard, *stocks):
+    return [shard.collection.insert_one({'name': f'p{i}', 'stock': stock}).inserted_id
+            for i, stock in enumerate(stocks)]
+
+
+def test_reserve_uses_with_transaction(shard, monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(shard.client, 'start_session', lambda: session, raising=False)
+    a, = _products(shard, 5)
+    rid = ObjectId()
+    ShardReservations(shard).reserve(rid, [(a, 2)], NOW)
+    assert session.transactions == 1
+    assert shard.collection.find_one({'_id': a})['stock'] == 3
+    assert shard.db[inventory.RESERVATIONS_COLLECTION].find_one({'_id': rid})['status'] == HELD
+
+
+def test_reserve_without_transactions_compensates_partial(shard, reservations):
+    a, b = _products(shard, 5, 1)
+    rid = ObjectId()
+    with pytest.raises(InsufficientStock) as e:
+        reservations.reserve(rid, [(a, 2), (b, 3)], NOW)
+    assert [item['_id'] for item in e.value.items] == [b]
+    assert shard.collection.find_one({'_id': a})['stock'] == 5
+    assert shard.db[inventory.RESERVATIONS_COLLECTION].find_one({'_id': rid})['status'] == RELEASED
+
+
+def test_release_is_idempotent(shard, reservations):
+    a, = _products(shard, 5)
+    rid = ObjectId()
+    reservations.reserve(rid, [(a, 2)], NOW)
+    reservations.release(rid, NOW)
+    reservations.release(rid, NOW)
+    assert shard.collection.find_one({'_id': a})['stock'] == 5
+
+
+def test_release_before_late_reserve_cancels_it(shard, reservations):
+    # El shard no respondio a tiempo: la compensacion llega antes que la reserva
+    a, = _products(shard, 5)
+    rid = ObjectId()
+    reservations.release(rid, NOW)
+    assert shard.db[inventory.RESERVATIONS_COLLECTION].find_one({'_id': rid})['status'] == CANCELLED
+    with pytest.raises(ReservationCancelled):
+        reservations.reserve(rid, [(a, 2)], NOW)
+    assert shard.collection.find_one({'_id': a})['stock'] == 5
+
+
+def test_confirm_keeps_stock_reserved(shard, reservations):
+    a, = _products(shard, 5)
+    rid = ObjectId()
+    reservations.reserve(rid, [(a, 2)], NOW)
+    reservations.confirm(rid)
+    reservations.release(rid, NOW)
+    assert shard.db[inventory.RESERVATIONS_COLLECTION].find_one({'_id': rid})['status'] == CONFIRMED
+    assert shard.collection.find_one({'_id': a})['stock'] == 3
+
+
+def test_retrier_keeps_failed_release_until_it_succeeds(shard, reservations, monkeypatch):
+    a, = _products(shard, 5)
+    rid = ObjectId()
+    reservations.reserve(rid, [(a, 2)], NOW)
+    released = []
+    retrier = ReleaseRetrier({'DB1': reservations}, on_released=lambda *key: released.append(key))
+    retrier.add('DB1', rid, 'sin primario')
+
+    original = reservations.release
+    def broken(*args):
+        raise AutoReconnect('sin primario')
+    monkeypatch.setattr(reservations, 'release', broken)
+    retrier.retry()
+    assert [item['reservation_id'] for item in retrier.stats()['pending']] == [str(rid)]
+
+    monkeypatch.setattr(reservations, 'release', original)
+    retrier.retry()
+    assert retrier.stats() == {'pending': [], 'retried': 1}
+    assert released == [('DB1', rid)]
+    assert shard.collection.find_one({'_id': a})['stock'] == 5
@@ -0,0 +1,39 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from bson import Decimal128, ObjectId
+from flask import Flask
+
+import json_provider
+
+DOC = {
+    '_id': ObjectId('65a1b2c3d4e5f60718293a4b'),
+    'price': Decimal('19.90'),
+    'cost': Decimal128('7.25'),
+    'created_at': datetime(2026, 1, 2, 3, 4, 5)
+}
+EXPECTED = {
+    '_id': '65a1b2c3d4e5f60718293a4b',
+    'price': '19.90',
+    'cost': '7.25',
+    'created_at': 'Fri, 02 Jan 2026 03:04:05 GMT'
+}
+
+
+@pytest.mark.parametrize('serializer', ['orjson', 'std'])
+def test_bson_and_decimal_values(serializer):
+    app = Flask(__name__)
+    json_provider.configure(app, serializer)
+    with app.app_context():
+        assert json.loads(app.json.response(DOC).get_data()) == EXPECTED
+        assert json.loads(app.json.dumps(DOC)) == EXPECTED
+
+
+@pytest.mark.skipif(json_provider.orjson is None, reason='orjson no instalado')
+def test_orjson_rejects_unknown_types():
+    app = Flask(__name__)
+    json_provider.configure(app, 'orjson')
+    with pytest.raises(TypeError):
+        app.json.dumps({'value': object()})
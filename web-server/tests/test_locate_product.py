@@ -0,0 +1,31 @@
+from bson import ObjectId
+
+from shard_migration import REDIRECTS_COLLECTION
+
+from product_ids import public_id
+
+
+def test_tagged_id_found_in_its_shard(web, shards):
+    object_id = shards['DB1'].collection.insert_one({'name': 'Arroz'}).inserted_id
+    name, _, product = web.locate_product(public_id('DB1', object_id))
+    assert name == 'DB1' and product['name'] == 'Arroz'
+
+
+def test_tagged_id_follows_redirect(web, shards):
+    object_id = ObjectId()
+    shards['DB2'].collection.insert_one({'_id': object_id, 'name': 'Zanahoria'})
+    shards['DB1'].db[REDIRECTS_COLLECTION].insert_one({'_id': object_id, 'moved_to': 'DB2'})
+    name, _, product = web.locate_product(public_id('DB1', object_id))
+    assert name == 'DB2' and product['_id'] == object_id
+
+
+def test_tagged_id_without_redirect_falls_back_to_all_shards(web, shards):
+    # Redireccion expirada: el prefijo apunta a DB1 pero el producto vive en DB2
+    object_id = ObjectId()
+    shards['DB2'].collection.insert_one({'_id': object_id, 'name': 'Zanahoria'})
+    name, _, product = web.locate_product(public_id('DB1', object_id))
+    assert name == 'DB2' and product['name'] == 'Zanahoria'
+
+
+def test_missing_product(web, shards):
+    assert web.locate_product(public_id('DB1', ObjectId())) == (None, None, None)
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import pytest
+
+from observability import metrics
+
+
+def _command(address, name='find', micros=2000):
+    return SimpleNamespace(connection_id=address, command_name=name, duration_micros=micros)
+
+
+def test_clients_sharing_an_address_keep_their_own_names():
+    registry = metrics.Registry()
+    mongo = metrics.MongoMetrics(registry)
+    shared = ('mongo.local', 27017)
+    db1, db3 = mongo.listener('DB1'), mongo.listener('DB3')
+    db1.succeeded(_command(shared))
+    db3.failed(_command(shared, 'insert'))
+    db1.connection_checked_out(SimpleNamespace(address=shared))
+    db3.connection_created(SimpleNamespace(address=shared))
+
+    output = registry.render()
+    assert 'mongo_command_duration_seconds_count{database="DB1",command="find"} 1' in output
+    assert 'mongo_command_failures_total{database="DB3",command="insert"} 1' in output
+    assert 'mongo_pool_checked_out{database="DB1",address="mongo.local:27017"} 1' in output
+    assert 'mongo_pool_open_connections{database="DB3",address="mongo.local:27017"} 1' in output
+
+
+def test_members_discovered_later_are_labelled_from_the_first_event():
+    registry = metrics.Registry()
+    mongo = metrics.MongoMetrics(registry)
+    listener = mongo.listener('DB2')
+    # Miembro que el driver descubre despues de crear el cliente
+    listener.succeeded(_command(('db2-secundario', 27018)))
+    assert 'mongo_command_duration_seconds_count{database="DB2",command="find"} 1' in registry.render()
+    assert 'db2-secundario:27018",command' not in registry.render()
+
+
+def test_pool_gauges_add_up_clients_of_the_same_shard():
+    mongo = metrics.MongoMetrics(metrics.Registry())
+    address = ('db1', 27017)
+    for listener in (mongo.listener('DB1'), mongo.listener('DB1')):
+        listener.connection_checked_out(SimpleNamespace(address=address))
+    assert mongo._gauge('checked_out') == {('DB1', 'db1:27017'): 2}
+
+
+@pytest.mark.parametrize('path', ['/stats/cache', '/stats/read-routing', '/stats/tracing',
+                                  '/stats/auth-client', '/stats/reservations'])
+def test_stats_require_authentication(web, call, path):
+    with web.app.test_request_context(path):
+        assert web.app.full_dispatch_request().status_code == 401
+    assert call('GET', path).status_code == 200
@@ -0,0 +1,74 @@
+import mongomock
+import pytest
+
+import pagination
+
+
+def make_shards(docs_by_shard):
+    client = mongomock.MongoClient()
+    shards = []
+    for name, docs in docs_by_shard.items():
+        collection = client[name].products
+        if docs:
+            collection.insert_many(docs)
+        shards.append((name, collection))
+    return shards
+
+
+def walk(shards, field, direction, limit):
+    """Recorre todas las paginas y devuelve los _id en el orden recibido"""
+    seen, state = [], None
+    for _ in range(100):
+        items, state, errors = pagination.fetch_page(shards, limit, field, direction, cursor_state=state)
+        assert errors == {}
+        seen.extend(doc['_id'] for _, doc in items)
+        if state is None:
+            return seen
+        # El cursor viaja codificado entre peticiones
+        state = pagination.decode_cursor(pagination.encode_cursor(state))
+    pytest.fail('La paginacion no termino')
+
+
+DOCS = {
+    'db1': [{'_id': 1, 'price': None}, {'_id': 2, 'price': 5}, {'_id': 3},
+            {'_id': 4, 'price': 5}, {'_id': 5, 'price': 1}],
+    'db2': [{'_id': 6}, {'_id': 7, 'price': 3}, {'_id': 8, 'price': None}, {'_id': 9, 'price': 9}],
+}
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 50])
+def test_ascending_pages_include_null_sort_values_first(limit):
+    assert walk(make_shards(DOCS), 'price', 1, limit) == [1, 3, 6, 8, 5, 7, 2, 4, 9]
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 50])
+def test_descending_pages_include_null_sort_values_last(limit):
+    assert walk(make_shards(DOCS), 'price', -1, limit) == [9, 4, 2, 7, 5, 8, 6, 3, 1]
+
+
+def test_after_filter_with_null_value_ascending():
+    shards = make_shards(DOCS)
+    query = pagination.after_filter('price', 1, [None, 3])
+    found = sorted(doc['_id'] for _, coll in shards for doc in coll.find(query))
+    assert found == [2, 4, 5, 6, 7, 8, 9]
+
+
+def test_after_filter_with_null_value_descending():
+    shards = make_shards(DOCS)
+    query = pagination.after_filter('price', -1, [None, 6])
+    found = sorted(doc['_id'] for _, coll in shards for doc in coll.find(query))
+    assert found == [1, 3]
+
+
+def test_after_filter_descending_keeps_null_values_after_non_null():
+    shards = make_shards(DOCS)
+    query = pagination.after_filter('price', -1, [5, 2])
+    found = sorted(doc['_id'] for _, coll in shards for doc in coll.find(query))
+    assert found == [1, 3, 5, 6, 7, 8]
+
+
+def test_cursor_for_other_sort_is_rejected():
+    shards = make_shards(DOCS)
+    _, state, _ = pagination.fetch_page(shards, 2, 'price', 1)
+    with pytest.raises(pagination.InvalidCursor):
+        pagination.fetch_page(shards, 2, 'price', -1, cursor_state=state)
@@ -0,0 +1,102 @@
+import json
+import time
+
+import mongomock
+import pytest
+from pymongo.errors import AutoReconnect
+
+import product_bulk
+import product_search
+from shard_migration import MIGRATING_FIELD
+
+
+class FakeShard:
+    def __init__(self, name='DB1'):
+        self.name = name
+        self.collection = mongomock.MongoClient().products_db.products
+        self.collection.create_index(product_search.UNIQUE_NAME_INDEX, **product_search.UNIQUE_NAME_OPTIONS)
+
+
+def rows(*names):
+    now = product_bulk.datetime.utcnow()
+    return [(index, product_bulk.validate_row({'name': name, 'price': 1, 'stock': 1}, now))
+            for index, name in enumerate(names)]
+
+
+def test_too_many_rows_is_its_own_error_type():
+    with pytest.raises(product_bulk.BulkTooLarge) as raised:
+        product_bulk.parse_rows(json.dumps([{}] * 3).encode(), max_rows=2)
+    assert isinstance(raised.value, product_bulk.BulkRequestError)
+    with pytest.raises(product_bulk.BulkRequestError) as raised:
+        product_bulk.parse_rows(b'{')
+    assert not isinstance(raised.value, product_bulk.BulkTooLarge)
+
+
+def test_upsert_creates_then_updates_by_normalized_name():
+    shard = FakeShard()
+    first = product_bulk.upsert_rows(shard, rows('Ñame', 'Arroz'))
+    assert [r['status'] for r in first] == ['created', 'created']
+    second = product_bulk.upsert_rows(shard, rows('ÑAME'))
+    assert second[0]['status'] == 'updated'
+    assert second[0]['_id'] == first[0]['_id']
+    assert shard.collection.count_documents({}) == 2
+
+
+def test_upsert_never_duplicates_a_migrating_product():
+    shard = FakeShard()
+    shard.collection.insert_one({'name': 'Arroz', product_search.NAME_FIELD: 'arroz', MIGRATING_FIELD: 'DB2'})
+    result = product_bulk.upsert_rows(shard, rows('Arroz'))
+    assert result[0]['status'] == 'error'
+    assert shard.collection.count_documents({product_search.NAME_FIELD: 'arroz'}) == 1
+
+
+def test_migrating_keys_checks_every_shard():
+    source, target = FakeShard('DB1'), FakeShard('DB2')
+    source.collection.insert_one({'name': 'Zanahoria', product_search.NAME_FIELD: 'zanahoria',
+                                  MIGRATING_FIELD: 'DB2'})
+    target.collection.insert_one({'name': 'Naranja', product_search.NAME_FIELD: 'naranja'})
+    assert product_bulk.migrating_keys([source, target], ['zanahoria', 'naranja', 'pera']) == {'zanahoria'}
+
+
+@pytest.mark.parametrize('writer, method', [
+    (product_bulk.insert_rows, 'insert_many'), (product_bulk.upsert_rows, 'bulk_write')
+])
+def test_batch_without_server_answer_is_unknown(monkeypatch, writer, method):
+    shard = FakeShard()
+
+    def lost(*args, **kwargs):
+        raise AutoReconnect('conexion perdida')
+    monkeypatch.setattr(shard.collection, method, lost)
+    result = writer(shard, rows('Arroz', 'Pera'), batch_size=1)
+    assert [r['status'] for r in result] == ['unknown', 'unknown']
+
+
+def test_bulk_route_reports_rows_of_timed_out_shard_as_unknown(web, shards, call, monkeypatch):
+    insert_rows = product_bulk.insert_rows
+
+    def slow_writer(shard, documents, batch_size):
+        if shard.name == 'DB2':
+            time.sleep(0.5)
+        return insert_rows(shard, documents, batch_size)
+    monkeypatch.setattr(product_bulk, 'insert_rows', slow_writer)
+    monkeypatch.setattr(web, 'BULK_TIMEOUT', 0.2)
+    body = [{'name': 'Arroz', 'price': 1, 'stock': 1}, {'name': 'Zanahoria', 'price': 1, 'stock': 1}]
+    response = call('POST', '/products/bulk', json=body)
+    data = response.get_json()
+    assert response.status_code == 200
+    assert [r['status'] for r in data['results']] == ['created', 'unknown']
+    assert data['summary'] == {'created': 1, 'updated': 0, 'error': 0, 'unknown': 1}
+
+
+def test_bulk_route_rejects_oversized_batch_with_413(web, call, monkeypatch):
+    monkeypatch.setattr(web, 'BULK_MAX_ROWS', 1)
+    response = call('POST', '/products/bulk', json=[{}, {}])
+    assert response.status_code == 413
+
+
+def test_create_with_existing_normalized_name_is_a_conflict(web, shards, call):
+    shards['DB1'].collection.create_index(product_search.UNIQUE_NAME_INDEX, **product_search.UNIQUE_NAME_OPTIONS)
+    product = {'name': 'Arroz', 'price': 1, 'stock': 1}
+    assert call('POST', '/products', json=product).status_code == 201
+    response = call('POST', '/products', json={**product, 'name': 'ARROZ '})
+    assert response.status_code == 409
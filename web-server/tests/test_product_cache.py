@@ -0,0 +1,79 @@
+import time
+
+from pymongo.errors import AutoReconnect, OperationFailure
+
+from product_cache import ChangeStreamInvalidator, ProductCache
+
+
+def test_put_after_invalidation_of_same_key_is_discarded():
+    cache = ProductCache()
+    token = cache.token()
+    # Otra peticion escribe el producto mientras esta lectura va a MongoDB
+    cache.invalidate('p1')
+    cache.put_product('p1', {'name': 'viejo'}, token)
+    assert cache.get_product('p1') is None
+    assert cache.stats()['stale_puts'] == 1
+
+
+def test_invalidation_of_other_key_does_not_block_put():
+    cache = ProductCache()
+    token = cache.token()
+    cache.invalidate('p2')
+    cache.put_product('p1', {'name': 'actual'}, token)
+    assert cache.get_product('p1') == {'name': 'actual'}
+
+
+def test_put_with_token_taken_after_invalidation_is_kept():
+    cache = ProductCache()
+    cache.invalidate('p1')
+    token = cache.token()
+    cache.put_product('p1', {'name': 'nuevo'}, token)
+    assert cache.get_product('p1') == {'name': 'nuevo'}
+
+
+def test_any_invalidation_discards_pages_read_before_it():
+    cache = ProductCache()
+    token = cache.token()
+    cache.invalidate('p9')
+    cache.put_page('k', ['pagina'], token)
+    assert cache.get_page('k') is None
+
+
+def test_clear_discards_every_outstanding_read():
+    cache = ProductCache()
+    token = cache.token()
+    cache.clear()
+    cache.put_product('p1', {'name': 'viejo'}, token)
+    assert cache.get_product('p1') is None
+
+
+def test_tokens_older_than_the_ttl_are_rejected(monkeypatch):
+    cache = ProductCache(product_ttl=1, page_ttl=1)
+    token = cache.token()
+    later = time.monotonic() + 2
+    monkeypatch.setattr('product_cache.time.monotonic', lambda: later)
+    cache.put_product('p1', {'name': 'lento'}, token)
+    assert cache.stats()['entries'] == 0
+
+
+def test_invalidation_history_is_bounded(monkeypatch):
+    cache = ProductCache(product_ttl=1, page_ttl=1)
+    now = [100.0]
+    monkeypatch.setattr('product_cache.time.monotonic', lambda: now[0])
+    for i in range(50):
+        cache.invalidate(f'p{i}')
+    now[0] += 5
+    cache.invalidate('ultimo')
+    assert list(cache._invalidated) == [(ProductCache.PRODUCT, 'ultimo')]
+
+
+def test_change_stream_resume_decision_uses_error_labels_and_codes():
+    resumable = OperationFailure('primario cambiado', code=91,
+                                 details={'errorLabels': ['ResumableChangeStreamError']})
+    assert ChangeStreamInvalidator.can_resume(resumable)
+    assert ChangeStreamInvalidator.can_resume(AutoReconnect('sin conexion'))
+    history_lost = OperationFailure('resume token no encontrado', code=286,
+                                    details={'errorLabels': ['NonResumableChangeStreamError']})
+    assert not ChangeStreamInvalidator.can_resume(history_lost)
+    # El texto del mensaje ya no decide
+    assert not ChangeStreamInvalidator.can_resume(OperationFailure('cannot resume stream', code=2))
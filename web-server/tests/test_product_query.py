@@ -0,0 +1,38 @@
+import logging
+
+import pytest
+
+import pagination
+import product_query
+
+
+@pytest.mark.parametrize('field', pagination.SORT_FIELDS)
+def test_every_sort_field_has_a_category_index(field):
+    # Filtro por categoria (igualdad) + orden: ESR sin ordenar en memoria
+    assert [('category', 1), (field, 1), ('_id', 1)] in product_query.PRODUCT_INDEXES
+
+
+class FakeCursor:
+    def sort(self, spec):
+        return self
+
+    def limit(self, limit):
+        return self
+
+    def explain(self):
+        return {'queryPlanner': {'winningPlan': {'stage': 'COLLSCAN'}}}
+
+
+class FakeCollection:
+    def find(self, query):
+        return FakeCursor()
+
+
+def test_collscan_is_reported_through_the_app_logger(web, caplog):
+    targets = [('DB1', FakeCollection()), ('DB2', FakeCollection())]
+    with caplog.at_level(logging.WARNING, logger=web.app.logger.name):
+        stats = web.explain_product_query(targets, {'stock': {'$lt': 5}}, 'price', 1, 10)
+    assert all(summary['collection_scan'] for summary in stats.values())
+    messages = sorted(r.getMessage() for r in caplog.records if r.name == web.app.logger.name)
+    assert messages == [f"COLLSCAN en {shard} para el filtro {{'stock': {{'$lt': 5}}}} ordenado por price"
+                        for shard in ('DB1', 'DB2')]
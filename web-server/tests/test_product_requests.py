@@ -0,0 +1,87 @@
+import threading
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from werkzeug.datastructures import MultiDict
+
+import product_requests
+from product_search import NAME_FIELD
+from scatter_gather import ShardUnavailable
+from shard_migration import MIGRATING_FIELD
+
+NOW = datetime(2026, 1, 1)
+
+
+def test_listing_query_builds_page_key_and_filter():
+    listing = product_requests.ListingQuery(MultiDict({'limit': '10', 'sort': '-price', 'category': 'Frutas'}))
+    assert (listing.limit, listing.sort_field, listing.direction) == (10, 'price', -1)
+    assert listing.base_filter['category'] == 'Frutas' and MIGRATING_FIELD in listing.base_filter
+    assert listing.page_key == (10, 'price', -1, '', listing.query_key)
+    assert not listing.explain
+
+
+def test_search_query_rejects_unknown_format_and_missing_prefix():
+    with pytest.raises(ValueError, match='Formato no soportado'):
+        product_requests.SearchQuery(MultiDict({'prefix': 'ar', 'format': 'xml'}))
+    with pytest.raises(ValueError, match='prefix'):
+        product_requests.SearchQuery(MultiDict({}))
+
+
+def test_require_any_only_fails_when_every_shard_failed():
+    targets = [('DB1', None), ('DB2', None)]
+    product_requests.require_any(targets, {'DB1': 'timeout'})
+    with pytest.raises(ShardUnavailable):
+        product_requests.require_any(targets, {'DB1': 'timeout', 'DB2': 'timeout'})
+
+
+def test_present_product_hides_internal_fields():
+    object_id = ObjectId()
+    product = product_requests.present_product('DB2', {'_id': object_id, NAME_FIELD: 'arroz',
+                                                        MIGRATING_FIELD: 'DB1', 'name': 'Arroz'})
+    assert product == {'_id': f'db2-{object_id}', 'name': 'Arroz', 'database': 'DB2'}
+
+
+def test_new_product_and_created_body():
+    with pytest.raises(ValueError, match='Campo requerido: stock'):
+        product_requests.new_product({'name': 'Arroz', 'price': 1}, NOW)
+    with pytest.raises(ValueError):
+        product_requests.new_product(None, NOW)
+    document = product_requests.new_product({'name': 'Ñame', 'price': '2', 'stock': 3}, NOW)
+    document['_id'] = ObjectId()
+    body = product_requests.created_body(document, 'DB2', 'DB2 (N-Z)')
+    assert body['message'] == 'Producto creado exitosamente en DB2 (N-Z)'
+    assert NAME_FIELD not in body['product'] and body['product']['created_at'] == NOW.isoformat()
+    assert NAME_FIELD in document
+
+
+@pytest.mark.parametrize('data', [None, {}, {'delta': 'x'}, {'delta': 0}])
+def test_stock_delta_rejects_invalid(data):
+    with pytest.raises(ValueError):
+        product_requests.stock_delta(data)
+
+
+def test_importing_app_starts_no_background_threads(web):
+    names = {thread.name for thread in threading.enumerate()}
+    assert not names & {'reservation-release', 'trace-export'}
+    assert not web._background_started
+
+
+@pytest.mark.parametrize('data', [None, [], {'name': ''}, {'name': '   '}, {'name': None}, {'price': 'x'}])
+def test_product_updates_rejects_invalid(data):
+    with pytest.raises(ValueError):
+        product_requests.product_updates(data, NOW)
+
+
+def test_product_updates_only_sets_sent_fields():
+    updates = product_requests.product_updates({'name': 'Ñame', 'stock': '4'}, NOW)
+    assert updates == {'updated_at': NOW, 'name': 'Ñame', NAME_FIELD: 'name', 'stock': 4}
+
+
+@pytest.mark.parametrize('body', [{'name': ''}, {'name': None}, {'price': 'caro'}])
+def test_update_with_invalid_fields_is_a_bad_request(shards, call, body):
+    created = call('POST', '/products', json={'name': 'Arroz', 'price': 2.5, 'stock': 3})
+    product_id = created.get_json()['product']['_id']
+    response = call('PUT', f'/products/{product_id}', json=body)
+    assert response.status_code == 400
+    assert call('GET', f'/products/{product_id}').get_json()['name'] == 'Arroz'
@@ -0,0 +1,57 @@
+import mongomock
+import pytest
+
+import product_search
+from product_search import NAME_FIELD
+from shard_router import ShardRouter, normalize_name
+
+NAMES = {'DB1': ['Arroz', 'Ají', 'Avena', 'Azúcar', 'Café'], 'DB2': ['Aceite', 'Pan', 'Aguacate']}
+
+
+@pytest.fixture
+def shards():
+    client = mongomock.MongoClient()
+    targets = []
+    for shard, names in NAMES.items():
+        collection = client[shard].products
+        collection.insert_many([{'name': name, NAME_FIELD: normalize_name(name)} for name in names])
+        targets.append((shard, collection))
+    return targets
+
+
+def test_prefix_filter_is_a_range_on_the_normalized_name():
+    assert product_search.prefix_filter('Ají') == {NAME_FIELD: {'$gte': 'aji', '$lt': 'ajj'}}
+    with pytest.raises(ValueError):
+        product_search.prefix_filter('  ')
+
+
+def test_matches_are_merged_in_name_order_across_batches(shards):
+    matches, errors = product_search.iter_matches(shards, product_search.prefix_filter('a'), limit=10, batch_size=2)
+    found = [(shard, doc['name']) for shard, doc in matches]
+    assert found == [('DB2', 'Aceite'), ('DB2', 'Aguacate'), ('DB1', 'Ají'), ('DB1', 'Arroz'),
+                     ('DB1', 'Avena'), ('DB1', 'Azúcar')]
+    assert errors == {}
+
+
+def test_matches_stop_at_the_limit_and_hide_the_internal_field(shards):
+    matches, _ = product_search.iter_matches(shards, product_search.prefix_filter('a'), limit=3, batch_size=2)
+    docs = [doc for _, doc in matches]
+    assert len(docs) == 3 and all(NAME_FIELD not in doc for doc in docs)
+
+
+def test_backfill_names_only_touches_missing_values():
+    collection = mongomock.MongoClient().db.products
+    collection.insert_many([{'name': 'Ñame'}, {'name': 'Pan', NAME_FIELD: 'pan'}])
+    assert product_search.backfill_names(collection, batch_size=1) == 1
+    assert collection.find_one({'name': 'Ñame'})[NAME_FIELD] == 'name'
+
+
+def test_prefix_pruning_skips_shards_outside_the_range():
+    router = ShardRouter.from_config({
+        'strategy': 'range', 'default': 'DB1',
+        'shards': [{'name': 'DB1', 'url': 'mongodb://db1', 'range': ['a', 'n']},
+                   {'name': 'DB2', 'url': 'mongodb://db2', 'range': ['n', None]}]
+    }, client_factory=lambda url, **_: mongomock.MongoClient())
+    assert [shard.name for shard in router.shards_for_prefix('pa')] == ['DB2']
+    assert [shard.name for shard in router.shards_for_prefix('Ár')] == ['DB1']
+    assert [shard.name for shard in router.shards_for_prefix('')] == ['DB1', 'DB2']
@@ -0,0 +1,45 @@
+import mongomock
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+from read_routing import MIN_MAX_STALENESS, ReadRouter
+from shard_router import ShardRouter
+
+CONFIG = {
+    'strategy': 'range',
+    'default': 'DB1',
+    'shards': [
+        {'name': 'DB1', 'url': 'mongodb://db1', 'range': ['a', 'n']},
+        {'name': 'DB2', 'url': 'mongodb://db2', 'range': ['n', None]}
+    ]
+}
+
+
+def make_reader(**kwargs):
+    router = ShardRouter.from_config(CONFIG, client_factory=lambda url, **_: mongomock.MongoClient())
+    return router, ReadRouter(router, **kwargs)
+
+
+def test_tolerant_endpoints_read_from_secondaries_with_bounded_staleness():
+    router, reader = make_reader(max_staleness=120)
+    targets = reader.targets('list_products')
+    assert [name for name, _ in targets] == ['DB1', 'DB2']
+    preference = targets[0][1].read_preference
+    assert isinstance(preference, SecondaryPreferred) and preference.max_staleness == 120
+
+
+def test_other_endpoints_stay_on_the_primary():
+    router, reader = make_reader()
+    assert isinstance(reader.targets('get_product')[0][1].read_preference, Primary)
+    shard = router.get('DB2')
+    assert reader.collection('update_product', shard) is shard.collection
+    assert isinstance(reader.collection('search_products', shard).read_preference, SecondaryPreferred)
+
+
+def test_staleness_is_raised_to_the_mongodb_minimum_and_decisions_are_counted():
+    _, reader = make_reader(max_staleness=10, secondary_endpoints=['export_products'])
+    assert reader.max_staleness == MIN_MAX_STALENESS
+    reader.targets('export_products')
+    reader.targets('export_products')
+    reader.targets('list_products')
+    assert reader.stats()['decisions'] == {'export_products': {'secondaryPreferred': 2},
+                                           'list_products': {'primary': 1}}
@@ -0,0 +1,49 @@
+import pytest
+
+from revocations import RevocationList
+from token_revocation.denylist import KIND_TOKEN, KIND_USER
+
+NOT_BEFORE = 1767268800.501  # revocado en 1767268800.500x
+
+
+@pytest.mark.parametrize('iat, revoked', [
+    (1767268799, True),        # segundo anterior
+    (1767268800, True),        # token antiguo con iat en segundos enteros
+    (1767268800.5, True),      # mismo milisegundo
+    (1767268800.501, False),   # milisegundo siguiente
+    (1767268800.9, False),     # mismo segundo, despues
+    (1767268801, False),       # segundo siguiente
+])
+def test_user_revocation_boundary(iat, revoked):
+    revocations = RevocationList()
+    revocations.add(KIND_USER, 'johndoe', 2e9, NOT_BEFORE)
+    assert revocations.is_revoked({'username': 'johndoe', 'iat': iat}) is revoked
+
+
+def test_local_revoke_user_spares_later_tokens(monkeypatch):
+    revocations = RevocationList()
+    monkeypatch.setattr('revocations.time.time', lambda: 1767268800.5004)
+    revocations.revoke_user('johndoe')
+    assert revocations.is_revoked({'username': 'johndoe', 'iat': 1767268800.5})
+    assert not revocations.is_revoked({'username': 'johndoe', 'iat': 1767268800.501})
+    assert revocations.is_revoked({'username': 'johndoe'})
+
+
+def test_local_revoke_user_lasts_the_shared_access_token_ttl(monkeypatch):
+    monkeypatch.setenv('ACCESS_TOKEN_TTL', '900')
+    revocations = RevocationList()
+    monkeypatch.setattr('revocations.time.time', lambda: 1767268800.5)
+    revocations.revoke_user('johndoe')
+    revocations.prune(1767268800 + 899)
+    assert revocations.is_revoked({'username': 'johndoe', 'iat': 1767268800})
+    revocations.prune(1767268800 + 900)
+    assert not revocations.is_revoked({'username': 'johndoe', 'iat': 1767268800})
+
+
+def test_token_revocation_and_prune():
+    revocations = RevocationList()
+    revocations.add(KIND_TOKEN, 'abc', 100)
+    assert revocations.is_revoked({'jti': 'abc', 'iat': 1e10})
+    revocations.prune(100)
+    assert not revocations.is_revoked({'jti': 'abc'})
+
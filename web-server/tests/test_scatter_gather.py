@@ -0,0 +1,67 @@
+import threading
+import time
+
+from pymongo import _csot
+
+from scatter_gather import ScatterGather
+
+
+def sleeper(seconds):
+    def fn(target):
+        time.sleep(seconds)
+        return target
+    return fn
+
+
+def test_deadline_counts_from_execution_start():
+    # Con un solo hilo el segundo shard espera en cola al primero; su plazo
+    # no debe consumirse mientras tanto
+    executor = ScatterGather(max_workers=1, timeout=0.5, queue_timeout=2)
+    result = executor.gather([('DB1', 1), ('DB2', 2)], sleeper(0.3))
+    assert result.errors == {}
+    assert result.results == {'DB1': 1, 'DB2': 2}
+    executor.shutdown()
+
+
+def test_running_shard_times_out():
+    executor = ScatterGather(max_workers=2, timeout=0.2)
+    result = executor.gather([('DB1', 1)], sleeper(0.6))
+    assert result.errors == {'DB1': 'timeout'}
+    executor.shutdown()
+
+
+def test_queued_shard_is_cancelled_without_running():
+    ran = []
+    blocker = threading.Event()
+
+    def fn(target):
+        ran.append(target)
+        if target == 1:
+            blocker.wait(1)
+        return target
+
+    executor = ScatterGather(max_workers=1, timeout=2, queue_timeout=0.1)
+    result = executor.gather([('DB1', 1), ('DB2', 2)], fn, timeout=0.3)
+    blocker.set()
+    assert result.errors == {'DB1': 'timeout', 'DB2': 'timeout'}
+    assert executor.queue_timeouts == 1
+    time.sleep(0.1)
+    assert ran == [1]
+    executor.shutdown()
+
+
+def test_operations_run_with_the_shard_budget_as_driver_timeout():
+    seen = {}
+    executor = ScatterGather(timeout=0.75)
+    executor.gather([('DB1', 1)], lambda target: seen.setdefault('remaining', _csot.remaining()))
+    assert 0 < seen['remaining'] <= 0.75
+    executor.shutdown()
+
+
+def test_first_returns_first_hit_and_reports_misses():
+    executor = ScatterGather(timeout=1)
+    shard, value, result = executor.first([('DB1', None), ('DB2', 'x')], lambda target: target)
+    assert (shard, value) == ('DB2', 'x')
+    shard, value, result = executor.first([('DB1', None)], lambda target: target)
+    assert shard is None and not result.partial
+    executor.shutdown()
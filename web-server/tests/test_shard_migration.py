@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+
+from shard_migration import (MIGRATING_FIELD, MIGRATING_SINCE_FIELD, REDIRECTS_COLLECTION, MigrationError,
+                             Rebalancer, find_redirect, recover_stale_migrations, relocate)
+import product_search
+from product_search import NAME_FIELD
+from shard_router import ShardRouter
+
+CONFIG = {
+    'strategy': 'range',
+    'default': 'DB1',
+    'shards': [
+        {'name': 'DB1', 'url': 'mongodb://db1', 'range': ['a', 'n']},
+        {'name': 'DB2', 'url': 'mongodb://db2', 'range': ['n', None]}
+    ]
+}
+
+
+@pytest.fixture
+def router():
+    return ShardRouter.from_config(CONFIG, client_factory=lambda url, **_: mongomock.MongoClient())
+
+
+def test_relocate_moves_document_and_leaves_redirect(router):
+    db1, db2 = router.get('DB1'), router.get('DB2')
+    object_id = db1.collection.insert_one({'name': 'Arroz', 'version': 1}).inserted_id
+    moved = relocate(db1, db2, object_id, {'name': 'Zanahoria'})
+    assert moved['name'] == 'Zanahoria' and MIGRATING_SINCE_FIELD not in moved
+    assert db1.collection.count_documents({}) == 0
+    assert db2.collection.find_one({'_id': object_id}) == moved
+    assert find_redirect(router, db1, object_id) is db2
+
+
+def test_relocate_rolls_back_marker_when_copy_fails(router, monkeypatch):
+    db1, db2 = router.get('DB1'), router.get('DB2')
+    object_id = db1.collection.insert_one({'name': 'Arroz'}).inserted_id
+
+    def broken(*args, **kwargs):
+        raise RuntimeError('sin primario')
+    monkeypatch.setattr(db2.collection, 'replace_one', broken)
+    with pytest.raises(MigrationError):
+        relocate(db1, db2, object_id, {'name': 'Zanahoria'})
+    doc = db1.collection.find_one({'_id': object_id})
+    assert MIGRATING_FIELD not in doc and MIGRATING_SINCE_FIELD not in doc
+
+
+def mark(shard, doc, target, age_seconds):
+    shard.collection.insert_one({**doc, MIGRATING_FIELD: target,
+                                 MIGRATING_SINCE_FIELD: datetime.utcnow() - timedelta(seconds=age_seconds)})
+
+
+def test_recovery_finishes_migration_whose_copy_exists(router):
+    db1, db2 = router.get('DB1'), router.get('DB2')
+    # El proceso murio despues de copiar y antes de borrar el original
+    mark(db1, {'_id': 1, 'name': 'Zanahoria'}, 'DB2', 600)
+    db2.collection.insert_one({'_id': 1, 'name': 'Zanahoria'})
+    changed = []
+    report = recover_stale_migrations(router, 300, changed.append)
+    assert (report['finished'], report['rolled_back']) == (1, 0)
+    assert db1.collection.count_documents({}) == 0
+    assert find_redirect(router, db1, 1) is db2
+    assert changed == [1]
+
+
+def test_recovery_rolls_back_migration_without_copy(router):
+    db1 = router.get('DB1')
+    mark(db1, {'_id': 1, 'name': 'Zanahoria'}, 'DB2', 600)
+    report = recover_stale_migrations(router, 300)
+    assert (report['finished'], report['rolled_back']) == (0, 1)
+    doc = db1.collection.find_one({'_id': 1})
+    assert MIGRATING_FIELD not in doc and MIGRATING_SINCE_FIELD not in doc
+    assert db1.db[REDIRECTS_COLLECTION].count_documents({}) == 0
+
+
+def test_recovery_leaves_recent_markers_alone(router):
+    db1 = router.get('DB1')
+    mark(db1, {'_id': 1, 'name': 'Zanahoria'}, 'DB2', 5)
+    assert recover_stale_migrations(router, 300) == {'finished': 0, 'rolled_back': 0, 'errors': []}
+    assert db1.collection.find_one({'_id': 1})[MIGRATING_FIELD] == 'DB2'
+
+
+def test_recovery_treats_markers_without_timestamp_as_stale(router):
+    db1 = router.get('DB1')
+    db1.collection.insert_one({'_id': 1, 'name': 'Zanahoria', MIGRATING_FIELD: 'DB2'})
+    assert recover_stale_migrations(router, 300)['rolled_back'] == 1
+
+
+def test_rebalancer_recovers_orphans_and_reports_moves(router):
+    db1, db2 = router.get('DB1'), router.get('DB2')
+    # Marca huerfana: sin recuperacion el rebalanceador no podria moverlo
+    mark(db1, {'_id': 1, 'name': 'Zanahoria'}, 'DB2', 600)
+    db1.collection.insert_one({'_id': 2, 'name': 'Arroz'})
+    moved = []
+    rebalancer = Rebalancer(router, on_moved=moved.append)
+    rebalancer.start(pause=0)
+    rebalancer._thread.join(5)
+    assert rebalancer.status['recovered']['rolled_back'] == 1
+    # Se invalida al deshacer la marca y otra vez al moverlo
+    assert rebalancer.status['moved'] == 1 and moved == [1, 1]
+    assert db2.collection.find_one({'_id': 1})['name'] == 'Zanahoria'
+    assert [doc['_id'] for doc in db1.collection.find()] == [2]
+
+
+def test_rebalancer_reports_name_collisions_and_keeps_going():
+    router = ShardRouter.from_config(CONFIG, client_factory=lambda url, **_: mongomock.MongoClient())
+    for shard in router.shards:
+        shard.collection.create_index(product_search.UNIQUE_NAME_INDEX, **product_search.UNIQUE_NAME_OPTIONS)
+    db1, db2 = router.get('DB1'), router.get('DB2')
+    name_id = db1.collection.insert_one({'name': 'Ñame', NAME_FIELD: 'name'}).inserted_id
+    zeta_id = db1.collection.insert_one({'name': 'Zeta', NAME_FIELD: 'zeta'}).inserted_id
+    db2.collection.insert_one({'name': 'Name', NAME_FIELD: 'name'})
+
+    rebalancer = Rebalancer(router)
+    rebalancer.start(pause=0)
+    rebalancer._thread.join(5)
+    assert not rebalancer.status['running'] and rebalancer.status['moved'] == 1
+    assert rebalancer.status['errors'] == [{'_id': str(name_id), 'error': 'Ya existe un producto con ese nombre en DB2'}]
+    assert db2.collection.count_documents({'_id': zeta_id}) == 1
+    assert db1.collection.find_one({'_id': name_id}).get(MIGRATING_FIELD) is None
+
+
+def test_rebalancer_reports_recovery_failures(router, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError('sin primario')
+    monkeypatch.setattr('shard_migration.recover_stale_migrations', broken)
+    rebalancer = Rebalancer(router)
+    rebalancer.start(pause=0)
+    rebalancer._thread.join(5)
+    assert rebalancer.status['errors'] == [{'stage': 'recover', 'error': 'sin primario'}]
+    assert not rebalancer.status['running'] and rebalancer.status['finished_at']
@@ -0,0 +1,120 @@
+import mongomock
+import pytest
+
+import mongo_clients
+import product_bulk
+import product_requests
+from product_search import NAME_FIELD
+from shard_router import ShardRouter, normalize_name
+
+TWO_SHARDS = {
+    'strategy': 'range',
+    'default': 'DB1',
+    'shards': [
+        {'name': 'DB1', 'url': 'mongodb://db1', 'range': ['a', 'n']},
+        {'name': 'DB2', 'url': 'mongodb://db2', 'range': ['n', None]}
+    ]
+}
+
+
+def make_router(config=TWO_SHARDS, **overrides):
+    return ShardRouter.from_config({**config, **overrides}, client_factory=lambda url, **_: mongomock.MongoClient())
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('Ñame', 'name'), ('Ábaco', 'abaco'), ('  Óleo ', 'oleo'), ('STRASSE', 'strasse'), ('', '')
+])
+def test_normalize_name(name, expected):
+    assert normalize_name(name) == expected
+
+
+@pytest.mark.parametrize('name, shard', [
+    ('Arroz', 'DB1'), ('manzana', 'DB1'), ('Naranja', 'DB2'), ('Ñame', 'DB2'), ('Óleo', 'DB2'),
+    ('Ábaco', 'DB1'), ('7up', 'DB1')
+])
+def test_route_uses_normalized_name(name, shard):
+    assert make_router().route(name)[0].name == shard
+
+
+def test_route_rejects_empty_name():
+    with pytest.raises(ValueError):
+        make_router().route('  ')
+
+
+@pytest.mark.parametrize('name, legacy', [
+    # Antes se comparaba la primera letra tal cual: lo que no era A-Z iba a DB1
+    ('Ñame', 'DB1'), ('Óleo', 'DB1'), (' Zapato', 'DB1'),
+    # Mismo shard con ambos enrutados
+    ('Ábaco', None), ('Naranja', None), ('arroz', None), ('7up', None)
+])
+def test_legacy_route_only_for_keys_whose_shard_changed(name, legacy):
+    shard = make_router(legacy_routing=True).legacy_route(name)
+    assert (shard.name if shard else None) == legacy
+
+
+def test_legacy_route_disabled_by_default_for_custom_maps(monkeypatch):
+    monkeypatch.delenv('LEGACY_ROUTING', raising=False)
+    assert make_router().legacy_route('Ñame') is None
+    assert make_router(strategy='hash', legacy_routing=True).legacy_route('Ñame') is None
+
+
+def test_legacy_routing_env_overrides_map(monkeypatch):
+    monkeypatch.setenv('LEGACY_ROUTING', 'False')
+    assert make_router(legacy_routing=True).legacy_route('Ñame') is None
+
+
+def test_prefix_pruning_keeps_legacy_default_shard():
+    assert [s.name for s in make_router().shards_for_prefix('na')] == ['DB2']
+    assert [s.name for s in make_router(legacy_routing=True).shards_for_prefix('na')] == ['DB2', 'DB1']
+    assert [s.name for s in make_router(legacy_routing=True).shards_for_prefix('ab')] == ['DB1']
+
+
+def test_bulk_rows_follow_names_stored_by_legacy_routing():
+    router = make_router(legacy_routing=True)
+    db1 = router.get('DB1')
+    db1.collection.insert_one({'name': 'Ñame', NAME_FIELD: 'name'})
+    documents = [{'name': 'ñame', NAME_FIELD: 'name'}, {'name': 'Óleo', NAME_FIELD: 'oleo'},
+                 {'name': 'Naranja', NAME_FIELD: 'naranja'}]
+    assert product_bulk.legacy_placements(router, documents) == {'name': db1}
+
+
+def test_new_product_route_asks_for_legacy_check_only_when_needed():
+    router = make_router(legacy_routing=True)
+    shard, label, legacy, query = product_requests.new_product_route(router, 'Ñame')
+    assert (shard.name, label, legacy.name, query) == ('DB2', shard.label, 'DB1', {NAME_FIELD: 'name'})
+    assert product_requests.new_product_route(router, 'Naranja')[2:] == (None, None)
+
+
+def test_create_reuses_shard_of_legacy_name(web, shards):
+    assert web.shard_router.legacy_routing
+    assert web.get_database_for_new_product('Ñame')[0].name == 'DB2'
+    shards['DB1'].collection.insert_one({'name': 'Ñame', NAME_FIELD: 'name'})
+    assert web.get_database_for_new_product('ÑAME')[0].name == 'DB1'
+
+
+def test_with_clients_keeps_the_map_and_swaps_clients():
+    router = make_router(legacy_routing=True)
+    clients = {shard.name: mongomock.MongoClient() for shard in router.shards}
+    copy = router.with_clients(lambda shard: clients[shard.name])
+    assert [(s.name, s.label, s.lower, s.upper) for s in copy.shards] == \
+        [(s.name, s.label, s.lower, s.upper) for s in router.shards]
+    assert copy.get('DB2').client is clients['DB2'] and copy.legacy_routing
+    assert copy.route('Naranja')[0].name == 'DB2'
+
+
+def test_mongo_clients_share_the_async_client_pool(monkeypatch):
+    class FakeAsyncClient:
+        def __init__(self, url, **options):
+            self.delegate = mongomock.MongoClient(url, **options)
+
+        def __getitem__(self, name):
+            return self.delegate[name]
+
+    monkeypatch.setattr(mongo_clients, '_async_factory', None)
+    monkeypatch.setattr(mongo_clients, '_async_clients', {})
+    assert isinstance(mongo_clients.create('mongodb://db1'), mongomock.MongoClient)
+    mongo_clients.use_async(FakeAsyncClient)
+    router = ShardRouter.from_config(TWO_SHARDS, client_factory=mongo_clients.create)
+    async_router = router.with_clients(lambda shard: mongo_clients.async_client(shard.client))
+    for shard, async_shard in zip(router.shards, async_router.shards):
+        assert async_shard.client.delegate is shard.client
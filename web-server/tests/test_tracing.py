@@ -0,0 +1,100 @@
+import asyncio
+import contextvars
+from types import SimpleNamespace
+
+from flask import Flask
+
+from auth_client import AuthClient
+from observability import tracing
+
+INCOMING = '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01'
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, record):
+        self.spans.append(record)
+
+    def stats(self):
+        return {'exported': len(self.spans)}
+
+
+class FakeG(SimpleNamespace):
+    """g de Quart: atributos con get() y pop()"""
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def pop(self, name, default=None):
+        return self.__dict__.pop(name, default)
+
+
+def _tracer():
+    return tracing.Tracer('web-server', exporter=ListExporter(), slow_ms=None)
+
+
+def test_flask_hooks_continue_the_incoming_trace():
+    tracer = _tracer()
+    app = Flask(__name__)
+    tracer.init_app(app)
+
+    @app.get('/ping')
+    def ping():
+        with tracing.span('trabajo'):
+            return 'ok'
+
+    with app.test_request_context('/ping', headers={'traceparent': INCOMING}):
+        response = app.full_dispatch_request()
+    assert response.headers['X-Trace-Id'] == '0af7651916cd43dd8448eb211c80319c'
+    work, root = tracer.exporter.spans
+    assert root['parent_id'] == 'b7ad6b7169203331' and root['attributes']['route'] == '/ping'
+    assert work['parent_id'] == root['span_id']
+    assert tracing.current_span() is None
+
+
+def test_auth_client_sends_the_traceparent_of_its_client_span():
+    tracer = _tracer()
+    client = AuthClient('http://auth.test')
+    sent = {}
+
+    def fake_request(method, url, timeout=None, headers=None, **_):
+        sent.update(headers)
+        return SimpleNamespace(status_code=200)
+
+    client.session.request = fake_request
+    root = tracer.root('GET /products')
+    token = tracing._current.set(root)
+    try:
+        client.request('POST', '/auth/verify')
+    finally:
+        tracing._current.reset(token)
+    call, = tracer.exporter.spans
+    assert call['kind'] == 'client' and call['parent_id'] == root.span_id
+    assert call['attributes']['status'] == 200
+    assert sent['traceparent'] == f"00-{root.trace_id}-{call['span_id']}-01"
+
+
+def test_async_spans_keep_their_parent_across_tasks():
+    tracer = _tracer()
+
+    async def shard(name):
+        with tracing.span(f"shard {name}", shard=name):
+            await asyncio.sleep(0)
+            return tracing.inject()['traceparent']
+
+    async def handler():
+        g = FakeG()
+        tracer._open(SimpleNamespace(method='GET', path='/products', headers={}), g)
+        parents = await asyncio.gather(shard('DB1'), shard('DB2'))
+        root = g.trace_span
+        # Quart puede cerrar la peticion desde otro contexto: no debe fallar
+        contextvars.Context().run(tracer._close, g, None)
+        return root, parents
+
+    root, parents = asyncio.run(handler())
+    shards = [span for span in tracer.exporter.spans if span['name'].startswith('shard')]
+    assert {span['parent_id'] for span in shards} == {root.span_id}
+    assert sorted(parents) == sorted(f"00-{root.trace_id}-{span['span_id']}-01" for span in shards)
+    assert tracer.exporter.spans[-1]['span_id'] == root.span_id
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+import pytest
+
+from user_directory import UserDirectory
+
+
+@pytest.fixture
+def directory():
+    directory = UserDirectory('mongodb://db3')
+    directory.collection.insert_many([
+        {'username': name, 'email': f'{name}@example.com', 'password': b'hash', 'created_at': datetime(2026, 1, 1)}
+        for name in ['ana', 'andres', 'beto', 'Ana', 'anibal']
+    ])
+    yield directory
+    directory.collection.drop()
+    directory.close()
+
+
+def test_pages_follow_username_order_without_passwords(directory):
+    first, state = directory.page(limit=2)
+    assert [user['username'] for user in first] == ['Ana', 'ana']
+    assert set(first[0]) == {'_id', 'username', 'email', 'created_at'}
+    second, state = directory.page(limit=2, cursor_state=state)
+    third, state = directory.page(limit=2, cursor_state=state)
+    assert [user['username'] for user in second + third] == ['andres', 'anibal', 'beto']
+    assert state is None
+
+
+def test_prefix_is_case_sensitive(directory):
+    users, state = directory.page(prefix='an')
+    assert [user['username'] for user in users] == ['ana', 'andres', 'anibal'] and state is None
+
+
+def test_delete(directory):
+    assert directory.delete('beto') == 1
+    assert directory.delete('beto') == 0
@@ -0,0 +1,239 @@
+# Verificacion local de tokens JWT en el web-server
+# Evita una llamada HTTP al auth-server por cada peticion protegida: las
+# claves se descargan de /auth/keys al iniciar y se refrescan al rotar.
+import hashlib, threading, time
+from collections import OrderedDict
+
+import jwt
+import requests
+
+from revocations import RevocationList
+
+
+class InvalidToken(Exception):
+    """El token no es valido o ya expiro"""
+
+
+class VerifierUnavailable(Exception):
+    """No fue posible verificar el token (auth-server caido, sin claves...)"""
+
+
+class TokenCache:
+    """Cache LRU acotada de tokens ya verificados, indexada por el digest
+    del token y que respeta el 'exp' de cada uno"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # digest -> (claims, exp)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, exp = entry
+            if exp is not None and exp <= time.time():
+                del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return claims
+
+    def put(self, digest, claims):
+        exp = claims.get('exp')
+        with self._lock:
+            self._entries[digest] = (claims, exp)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard_where(self, predicate):
+        """Elimina las entradas cuyos claims cumplan la condicion"""
+        with self._lock:
+            stale = [d for d, (claims, _) in self._entries.items() if predicate(claims)]
+            for d in stale:
+                del self._entries[d]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            'size': size,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class TokenVerifier:
+    """Valida tokens JWT en proceso.
+
+    Modos:
+    - 'local': valida la firma con las claves de /auth/keys. Si no hay
+      claves disponibles y fallback=True, consulta /auth/verify.
+    - 'remote': siempre consulta /auth/verify (comportamiento original).
+    """
+
+    def __init__(self, auth_client, mode='local', internal_key=None,
+                 cache_size=10000, refresh_seconds=300, min_refresh_interval=10,
+                 leeway=0, fallback=True, revocations=None):
+        self.auth_client = auth_client
+        self.mode = mode
+        self.internal_key = internal_key
+        self.refresh_seconds = refresh_seconds
+        self.min_refresh_interval = min_refresh_interval
+        self.leeway = leeway
+        self.fallback = fallback
+        self.cache = TokenCache(cache_size)
+        # Revocaciones sincronizadas desde el auth-server (tambien aplican a la cache)
+        self.revocations = revocations or RevocationList()
+        self._algorithm = None
+        self._keys = {}  # kid -> clave de verificacion
+        self._active_kid = None
+        self._loaded_at = 0.0
+        self._last_attempt = 0.0
+        self._keys_lock = threading.Lock()
+
+    # ---------- Claves ----------
+
+    def _refresh_due(self, force, now):
+        """None si las claves actuales sirven; si no, True cuando toca
+        intentar la descarga (se limita la frecuencia de intentos)"""
+        if not force and self._keys and now - self._loaded_at < self.refresh_seconds:
+            return None
+        # Limitar la frecuencia de descargas (kid desconocido, auth-server caido)
+        if now - self._last_attempt < self.min_refresh_interval and self._last_attempt:
+            return False
+        self._last_attempt = now
+        return True
+
+    def _keys_headers(self):
+        return {'X-Internal-Key': self.internal_key} if self.internal_key else {}
+
+    def _apply_keys(self, data, now):
+        self._algorithm = data['algorithm']
+        self._keys = {k['kid']: k['key'] for k in data.get('keys', [])}
+        self._active_kid = data.get('active_kid')
+        self._loaded_at = now
+        if data.get('max_age'):
+            self.refresh_seconds = min(self.refresh_seconds, int(data['max_age']))
+
+    def refresh_keys(self, force=False):
+        """Descarga las claves del auth-server. Devuelve True si hay claves
+        utilizables despues del intento."""
+        now = time.monotonic()
+        with self._keys_lock:
+            due = self._refresh_due(force, now)
+            if due is None:
+                return True
+            if not due:
+                return bool(self._keys)
+            try:
+                response = self.auth_client.get('/auth/keys', headers=self._keys_headers())
+                if response.status_code != 200:
+                    return bool(self._keys)
+                data = response.json()
+            except (requests.RequestException, ValueError):
+                return bool(self._keys)
+            self._apply_keys(data, now)
+            return bool(self._keys)
+
+    def _key_for(self, kid):
+        if not self.refresh_keys():
+            raise VerifierUnavailable('Claves de verificacion no disponibles')
+        key = self._keys.get(kid if kid is not None else self._active_kid)
+        if key is None and kid is not None:
+            # kid desconocido: probablemente el auth-server roto la clave
+            self.refresh_keys(force=True)
+            key = self._keys.get(kid)
+        if key is None:
+            raise InvalidToken('Clave de firma desconocida')
+        return key
+
+    # ---------- Verificacion ----------
+
+    def verify(self, token):
+        """Devuelve los claims del token o lanza InvalidToken /
+        VerifierUnavailable"""
+        digest = TokenCache.digest(token)
+        claims = self.cache.get(digest)
+        if claims is None:
+            if self.mode == 'local':
+                try:
+                    claims = self._verify_local(token)
+                except VerifierUnavailable:
+                    if not self.fallback:
+                        raise
+                    claims = self._verify_remote(token)
+            else:
+                claims = self._verify_remote(token)
+            self.cache.put(digest, claims)
+
+        self.check_revoked(claims)
+        return claims
+
+    def check_revoked(self, claims):
+        if self.revocations.is_revoked(claims):
+            raise InvalidToken('Token revocado')
+
+    def _verify_local(self, token):
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+            key = self._key_for(kid)
+            return self._decode(token, key)
+        except jwt.InvalidTokenError as e:
+            raise InvalidToken(str(e))
+
+    def _decode(self, token, key):
+        return jwt.decode(token, key, algorithms=[self._algorithm], leeway=self.leeway)
+
+    def _verify_remote(self, token):
+        try:
+            response = self.auth_client.post(
+                '/auth/verify',
+                headers={'Authorization': f'Bearer {token}'}
+            )
+        except requests.RequestException as e:
+            raise VerifierUnavailable(str(e))
+        return self._remote_claims(token, response.status_code)
+
+    @staticmethod
+    def _remote_claims(token, status_code):
+        if status_code != 200:
+            raise InvalidToken('Token invalido o expirado')
+        # El auth-server ya valido la firma: solo se leen los claims para
+        # conocer el 'exp' y respetarlo en la cache
+        try:
+            return jwt.decode(token, options={'verify_signature': False})
+        except jwt.InvalidTokenError as e:
+            raise InvalidToken(str(e))
+
+    def invalidate_user(self, username):
+        """Descarta de la cache los tokens de un usuario"""
+        return self.cache.discard_where(lambda claims: claims.get('username') == username)
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'algorithm': self._algorithm,
+            'keys_loaded': len(self._keys),
+            'active_kid': self._active_kid,
+            'cache': self.cache.stats(),
+            'revocations': self.revocations.stats()
+        }
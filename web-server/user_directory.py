@@ -0,0 +1,43 @@
+# Directorio de usuarios (auth_db.users en DB3) para el panel de administracion
+# Un unico cliente compartido por todas las peticiones (pool de conexiones).
+# El listado se pagina por cursor sobre (username, _id), admite busqueda por
+# prefijo del nombre de usuario y solo trae los campos que muestra el panel.
+from pymongo import MongoClient
+
+import pagination
+from shard_router import prefix_upper_bound
+
+USERS_DATABASE = 'auth_db'
+USERS_COLLECTION = 'users'
+USER_PROJECTION = {'username': 1, 'email': 1, 'created_at': 1}
+SORT_FIELD = 'username'
+# Nombre del origen en los cursores (no es un shard de productos)
+SOURCE = 'DB3'
+DEFAULT_LIMIT = 50
+
+
+class UserDirectory:
+    def __init__(self, url, **client_options):
+        self.url = url
+        self.client = MongoClient(url, **client_options)
+        self.collection = self.client[USERS_DATABASE][USERS_COLLECTION]
+
+    @staticmethod
+    def prefix_filter(prefix):
+        """Rango [prefijo, sucesor) sobre username (distingue mayusculas)"""
+        return {SORT_FIELD: {'$gte': prefix, '$lt': prefix_upper_bound(prefix)}} if prefix else {}
+
+    def page(self, limit=DEFAULT_LIMIT, cursor_state=None, prefix=''):
+        """Devuelve (usuarios, next_state). El cursor solo es valido con el
+        mismo prefijo."""
+        items, next_state, _ = pagination.fetch_page(
+            [(SOURCE, self.collection)], limit, SORT_FIELD, 1, cursor_state,
+            base_filter=self.prefix_filter(prefix), projection=USER_PROJECTION, query_key=prefix
+        )
+        return [doc for _, doc in items], next_state
+
+    def delete(self, username):
+        return self.collection.delete_one({'username': username}).deleted_count
+
+    def close(self):
+        self.client.close()